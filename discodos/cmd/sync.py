@@ -10,6 +10,7 @@ from socket import gaierror
 import logging
 from discodos.utils import ask_user
 from discodos.config import Config
+from discodos.model.database import Database
 # import asyncio
 # from codetiming import Timer
 import argparse
@@ -171,6 +172,18 @@ class Sync(object):
         times_tuple = (mod_epoch, mod_epoch)
         return times_tuple
 
+    def _checkpoint_discobase(self):
+        """Writes back the WAL journal into the DiscoBASE file.
+
+        The uploaded file has to contain all changes, and no stale WAL file
+        must be left over to be applied to a restored DiscoBASE.
+        """
+        if not self.discobase.exists():
+            return
+        db = Database(db_file=self.discobase)
+        db.checkpoint()
+        db.db_conn.close()
+
     def _touch_to_backupdate(self, restore_filenamestr):
         downloaded_file = self.discobase # ignore vscode error here
         mod_acc_times = self._get_times_tuple(restore_filenamestr)
@@ -290,6 +303,7 @@ class Dropbox_sync(Sync):
             log.info(err)
 
     def backup(self):
+        self._checkpoint_discobase()
         bak_file_name = self._get_fileobj_mtime(self.discobase)
         full_bak_path = '{}/{}'.format(self.backuppath, bak_file_name)
         copy_file_path = '{}/{}'.format(self.backuppath, self.discobase.name)
@@ -394,6 +408,7 @@ class Dropbox_sync(Sync):
         overwrite = ask_user("Download backup and overwrite local file {} (y/N)? ".format(
               self.discobase))
         if overwrite.lower() == 'y':
+            self._checkpoint_discobase()
             self.dbx.files_download_to_file(self.discobase, full_bak_path,
                   restore_file.rev)
             self._touch_to_backupdate(restore_file.name)
@@ -433,6 +448,7 @@ class Webdav_sync(Sync):
         return mod_server_str
 
     def backup(self):
+        self._checkpoint_discobase()
         # check file stats on local machine
         bak_file_name = self._get_fileobj_mtime(self.discobase)
         print("Uploading as {} to {}".format(bak_file_name, self.url))
@@ -495,6 +511,7 @@ class Webdav_sync(Sync):
         overwrite = ask_user("Download backup and overwrite local file {} (n)? ".format(
             self.discobase))
         if overwrite.lower() == 'y':
+            self._checkpoint_discobase()
             self.client.download_sync(remote_path='{}'.format(restore_filename),
                                       local_path='{}'.format(self.discobase))
             self._touch_to_backupdate(restore_filename)
@@ -43,8 +43,19 @@ log = logging.getLogger('discodos')
 @click.option(
     "--db", "db_file", type=str, default=None,
     help="""Override configured DiscoBASE file.""")
+@click.option(
+    "--no-cache", "no_cache", is_flag=True,
+    help="""Bypass the Discogs, MusicBrainz and AcousticBrainz caches
+    (*_cache.db next to the DiscoBASE). Nothing is read from or written to
+    them.""")
+@click.option(
+    "--refresh", "refresh_cache", is_flag=True,
+    help="""Treat all entries in the Discogs, MusicBrainz and AcousticBrainz
+    caches as expired. Every response is revalidated or downloaded again and
+    the caches are updated.""")
 @click.pass_context
-def main_cmd(context, verbose_count, offline_mode, tui, db_file):
+def main_cmd(context, verbose_count, offline_mode, tui, db_file, no_cache,
+             refresh_cache):
     conf = Config()
     if tui is not None:
         conf.enable_tui = tui
@@ -52,6 +63,10 @@ def main_cmd(context, verbose_count, offline_mode, tui, db_file):
         conf.discobase = db_file
     log.handlers[0].setLevel(conf.log_level)  # set configured console log lvl
     context.obj = helper.User(conf, verbose_count, offline_mode)
+    if no_cache:
+        context.obj.CACHE_MODE = "off"
+    elif refresh_cache:
+        context.obj.CACHE_MODE = "refresh"
 
 
 # Add commands
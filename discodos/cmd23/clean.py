@@ -15,9 +15,15 @@ def clean_group():
 @click.option(
     "--resume", "-r", "offset", metavar='OFFSET',
     type=int, default=0,
-    help='''Resumes at the given offset position (expects a number).''')
+    help='''Resumes at the given offset position: The number of listings to skip,
+    usually the number of listings processed already.''')
+@click.option(
+    "--continue", "-c", "resume_job", is_flag=True,
+    help='''Continues where the last unfinished run stopped, as recorded in
+    the DiscoBASE job journal. Works even after a crash or reboot. OFFSET is
+    ignored.''')
 @click.pass_obj
-def clean_sales_cmd(helper, offset):
+def clean_sales_cmd(helper, offset, resume_job):
     """Clean up the DiscoBASE sales inventory.
 
     Remove entries from the DiscoBASE sales inventory when they have been removed from
@@ -34,7 +40,7 @@ def clean_sales_cmd(helper, offset):
         user.conf.discobase, user.conf.musicbrainz_user,
         user.conf.musicbrainz_password)
 
-    coll_ctrl.cleanup_sales_inventory(offset=offset)
+    coll_ctrl.cleanup_sales_inventory(offset=offset, resume=resume_job)
 
 
 @clean_group.command(name='releases')
@@ -34,6 +34,8 @@ class User():
         # General
         self.WANTS_ONLINE = False if offline else True
         self.DID_NOT_PROVIDE_COMMAND = False
+        self.DB_PROFILE = "default"  # SQLite PRAGMA profile, see Database
+        self.CACHE_MODE = "use"  # Discogs and *Brainz caches: use, refresh, off
         # Search
         self.WANTS_TO_LIST_ALL_RELEASES = False
         self.WANTS_TO_SEARCH_FOR_RELEASE = False
@@ -66,6 +68,8 @@ class User():
         self.BRAINZ_SEARCH_DETAIL = 1
         self.BRAINZ_FORCE_UPDATE = False
         self.BRAINZ_SKIP_UNMATCHED = False
+        self.BRAINZ_RETRY_FAILED = False
+        self.BRAINZ_LOCAL_MB = False  # Match against the local MusicBrainz index
         self.WANTS_MUSICBRAINZ_MIX_TRACKLIST = False
         # Search & Update
         self.WANTS_TO_SEARCH_AND_UPDATE_DISCOGS = False
@@ -82,6 +86,7 @@ class User():
         # Misc
         self.WANTS_TO_SEARCH_AND_EDIT_TRACK = False
         self.RESUME_OFFSET = 0
+        self.RESUME_JOB = False  # Continue an unfinished job from the journal
         self.WANTS_TO_LAUNCH_SETUP = False
         self.WANTS_TO_FORCE_UPGRADE_SCHEMA = False
         self.MIX_SORT = False
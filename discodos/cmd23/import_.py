@@ -21,6 +21,9 @@ def import_group():
     * tracks
     * brainz
 
+    To use key and BPM from an offline AcousticBrainz data dump, run
+    "acousticbrainz-dump" after "brainz" and re-run "brainz".
+
     For single item imports use:
 
     \b
@@ -38,8 +41,17 @@ def import_group():
 
 
 @import_group.command(name='basic')
+@click.option(
+    "--incremental", "-i", is_flag=True,
+    help='''only imports collection items added since the last import and checks
+    for removed ones if the number of items changed unexpectedly. Changes to older
+    items (notes, folder, rating) are picked up by regular imports only.''')
+@click.option(
+    "--continue", "-c", "resume_job", is_flag=True,
+    help='''continues where the last unfinished run stopped, as recorded in
+    the DiscoBASE job journal. Works even after a crash or reboot.''')
 @click.pass_obj
-def import_basic_cmd(helper ):
+def import_basic_cmd(helper, incremental, resume_job):
     """Initially imports Discogs release and user collection data.
 
     A basic subset of the details of all releases in the user's Discogs collection is
@@ -66,6 +78,8 @@ def import_basic_cmd(helper ):
     def update_user_interaction_helper(user):
         log.debug("Entered collection and details import mode.")
         user.WANTS_TO_IMPORT_COLLECTION = True
+        user.DB_PROFILE = "bulk_import"
+        user.RESUME_JOB = resume_job
         return user
 
     user = update_user_interaction_helper(helper)
@@ -76,16 +90,34 @@ def import_basic_cmd(helper ):
         user.conf.musicbrainz_password)
 
     if user.WANTS_TO_IMPORT_COLLECTION:
-        coll_ctrl.import_collection()
+        if incremental:
+            coll_ctrl.import_collection_incremental()
+        else:
+            coll_ctrl.import_collection(resume=user.RESUME_JOB)
 
 
 @import_group.command(name='tracks')
 @click.option(
     "--resume", "--offset", "-r", "import_offset", metavar='OFFSET',
     type=int, default=0,
-    help='''resumes the import at the given offset position (expects a number).''')
+    help='''resumes the import at the given offset position: The number of
+    releases to skip, usually the number of releases processed already.''')
+@click.option(
+    "--continue", "-c", "resume_job", is_flag=True,
+    help='''continues where the last unfinished run stopped, as recorded in
+    the DiscoBASE job journal. Works even after a crash or reboot. OFFSET is
+    ignored.''')
+@click.option(
+    "--workers", "-w", "workers", metavar='NUMBER',
+    type=click.IntRange(min=1), default=4, show_default=True,
+    help='''number of releases fetched from Discogs concurrently. The Discogs rate
+    limit is respected nevertheless, 1 fetches one release after another.''')
+@click.option(
+    "--incremental", "-i", is_flag=True,
+    help='''only imports collection items added since the last import, including
+    their tracks. See "dsc import basic -h".''')
 @click.pass_obj
-def import_tracks_cmd(helper, import_offset):
+def import_tracks_cmd(helper, import_offset, resume_job, workers, incremental):
     """Imports tracks and if not yet available releases from Discogs collection
 
     Is synonym to "dsc search all -u"
@@ -96,8 +128,10 @@ def import_tracks_cmd(helper, import_offset):
     def update_user_interaction_helper(user):
         log.debug("Entered brainz import mode.")
         user.WANTS_TO_IMPORT_COLLECTION_WITH_TRACKS = True
+        user.DB_PROFILE = "bulk_import"
         if import_offset > 0:
             user.RESUME_OFFSET = import_offset
+        user.RESUME_JOB = resume_job
         return user
 
     user = update_user_interaction_helper(helper)
@@ -107,10 +141,14 @@ def import_tracks_cmd(helper, import_offset):
         user.conf.discobase, user.conf.musicbrainz_user,
         user.conf.musicbrainz_password)
 
-    if user.WANTS_TO_IMPORT_COLLECTION_WITH_TRACKS:
+    if user.WANTS_TO_IMPORT_COLLECTION_WITH_TRACKS and incremental:
+        coll_ctrl.import_collection_incremental(tracks=True, workers=workers)
+    elif user.WANTS_TO_IMPORT_COLLECTION_WITH_TRACKS:
         coll_ctrl.import_collection(
             tracks=True,
             offset=user.RESUME_OFFSET,
+            workers=workers,
+            resume=user.RESUME_JOB,
         )
 
 
@@ -121,10 +159,16 @@ def import_tracks_cmd(helper, import_offset):
 @click.option(
     "--resume", "--offset", "-r", "import_offset", metavar='OFFSET',
     type=int, default=0,
-    help='''resumes the brainz matching process at the given offset position (expects a
-    number). By default, tracks containing key and BPM already will be skipped. On a
-    re-run using this option, the total number might be different already since the
-    count of tracks without key and BPM might have changed.''')
+    help='''resumes the brainz matching process at the given offset position: The
+    number of tracks to skip, usually the number of tracks processed already. By
+    default, tracks containing key and BPM already will be skipped. On a re-run using
+    this option, the total number might be different already since the count of tracks
+    without key and BPM might have changed. Prefer --continue.''')
+@click.option(
+    "--continue", "-c", "resume_job", is_flag=True,
+    help='''continues where the last unfinished run stopped, as recorded in
+    the DiscoBASE job journal. Works even after a crash or reboot. OFFSET is
+    ignored.''')
 @click.option(
     "--force-brainz", "-f", "import_brainz_force", is_flag=True,
     help=''' on MusicBrainz updates (-z, -zz), also tracks
@@ -137,9 +181,20 @@ def import_tracks_cmd(helper, import_offset):
     where matched with MusicBrainz successfully (have a MusicBrainz Recording
     ID already saved in the DiscoBASE), are tried to be matched and updated.
     ''')
+@click.option(
+    "--retry-failed", "-t", "import_brainz_retry_failed", is_flag=True,
+    help='''tracks that failed to match on previous runs are skipped for a
+    while, the longer the more often they failed. This option tries to match
+    them anyway.''')
+@click.option(
+    "--local-mb", "-l", "import_brainz_local_mb", is_flag=True,
+    help='''matches with the local MusicBrainz index imported via "dsc import
+    musicbrainz-dump" instead of asking MusicBrainz. Much quicker, but only
+    releases contained in the index can be matched.''')
 @click.pass_obj
-def import_brainz_cmd(helper, quick, import_offset, import_brainz_force,
-                      import_brainz_skip_unmatched):
+def import_brainz_cmd(helper, quick, import_offset, resume_job, import_brainz_force,
+                      import_brainz_skip_unmatched, import_brainz_retry_failed,
+                      import_brainz_local_mb):
     """Tries to match collection with MusicBrainz and add additional details.
 
     Details are MusicBrainz album and recording ID's and if available key and BPM from
@@ -161,6 +216,7 @@ def import_brainz_cmd(helper, quick, import_offset, import_brainz_force,
     def update_user_interaction_helper(user):
         log.debug("Entered brainz import mode.")
         user.WANTS_TO_IMPORT_COLLECTION_WITH_BRAINZ = True
+        user.DB_PROFILE = "bulk_import"
         user.BRAINZ_SEARCH_DETAIL = 1
         if not quick:
             user.BRAINZ_SEARCH_DETAIL = 2
@@ -168,8 +224,13 @@ def import_brainz_cmd(helper, quick, import_offset, import_brainz_force,
             user.BRAINZ_FORCE_UPDATE = True
         if import_brainz_skip_unmatched:
             user.BRAINZ_SKIP_UNMATCHED = True
+        if import_brainz_retry_failed:
+            user.BRAINZ_RETRY_FAILED = True
+        if import_brainz_local_mb:
+            user.BRAINZ_LOCAL_MB = True
         if import_offset > 0:
             user.RESUME_OFFSET = import_offset
+        user.RESUME_JOB = resume_job
         return user
 
     user = update_user_interaction_helper(helper)
@@ -184,7 +245,65 @@ def import_brainz_cmd(helper, quick, import_offset, import_brainz_force,
             detail=user.BRAINZ_SEARCH_DETAIL,
             offset=user.RESUME_OFFSET,
             force=user.BRAINZ_FORCE_UPDATE,
-            skip_unmatched=user.BRAINZ_SKIP_UNMATCHED)
+            skip_unmatched=user.BRAINZ_SKIP_UNMATCHED,
+            resume=user.RESUME_JOB,
+            retry_failed=user.BRAINZ_RETRY_FAILED)
+
+
+@import_group.command(name='acousticbrainz-dump')
+@click.argument(
+    'dump_file', metavar='PATH',
+    type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.pass_obj
+def import_acousticbrainz_dump_cmd(helper, dump_file):
+    """Imports key and BPM from an AcousticBrainz data dump.
+
+    Expects low-level data as JSON lines (one document per line), optionally
+    compressed (.gz, .bz2, .xz). Only recordings already matched to tracks in
+    the DiscoBASE are kept. "import brainz" uses them instead of asking
+    AcousticBrainz.
+    """
+    def update_user_interaction_helper(user):
+        log.debug("Entered import AcousticBrainz dump mode.")
+        user.WANTS_ONLINE = False  # Works offline
+        user.DB_PROFILE = "bulk_import"
+        return user
+
+    user = update_user_interaction_helper(helper)
+    coll_ctrl = CollectionControlCommandline(
+        False, user, user.conf.discogs_token, user.conf.discogs_appid,
+        user.conf.discobase, user.conf.musicbrainz_user,
+        user.conf.musicbrainz_password)
+
+    coll_ctrl.import_acousticbrainz_dump(dump_file)
+
+
+@import_group.command(name='musicbrainz-dump')
+@click.argument(
+    'dump_file', metavar='PATH',
+    type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.pass_obj
+def import_musicbrainz_dump_cmd(helper, dump_file):
+    """Imports releases from a MusicBrainz JSON data dump.
+
+    Expects the release dump (release.tar.xz) or the extracted mbdump/release
+    file (JSON lines, optionally compressed). Only releases linking to or
+    sharing a catalog number with releases in the DiscoBASE are kept in the
+    local MusicBrainz index. "import brainz --local-mb" matches against it.
+    """
+    def update_user_interaction_helper(user):
+        log.debug("Entered import MusicBrainz dump mode.")
+        user.WANTS_ONLINE = False  # Works offline
+        user.DB_PROFILE = "bulk_import"
+        return user
+
+    user = update_user_interaction_helper(helper)
+    coll_ctrl = CollectionControlCommandline(
+        False, user, user.conf.discogs_token, user.conf.discogs_appid,
+        user.conf.discobase, user.conf.musicbrainz_user,
+        user.conf.musicbrainz_password)
+
+    coll_ctrl.import_musicbrainz_dump(dump_file)
 
 
 @import_group.command(name='release')
@@ -274,6 +393,7 @@ def import_sales_cmd(helper, light):
 
     def update_user_interaction_helper(user):
         log.debug("Entered import sales inventory mode.")
+        user.DB_PROFILE = "bulk_import"
         return user
 
     user = update_user_interaction_helper(helper)
@@ -11,8 +11,19 @@ log = logging.getLogger('discodos')
 @click.option(
     "--force", "force_upgrade_schema", is_flag=True,
     help='''Force-upgrade the database schema - use with caution!''')
+@click.option(
+    "--analyze", "analyze", is_flag=True,
+    help='''Gather statistics for the query planner (ANALYZE, PRAGMA optimize)
+    and show query plans of the most important DiscoBASE queries before and
+    after.''')
+@click.option(
+    "--stats-cache/--no-stats-cache", "stats_cache", default=None,
+    help='''Enable (or remove) the stats_cache table. It keeps the counters
+    shown by `dsc stats` up to date via triggers, making it return instantly
+    on large DiscoBASEs at the cost of slightly slower imports. Enabling
+    again rebuilds the counters.''')
 @click.pass_obj
-def setup_cmd(helper, force_upgrade_schema):
+def setup_cmd(helper, force_upgrade_schema, analyze, stats_cache):
     """Sets up the DiscoBASE and handles database schema upgrades.
     """
     def update_user_interaction_helper(user):
@@ -37,10 +48,22 @@ def setup_cmd(helper, force_upgrade_schema):
     # SETUP DB
     setup = Db_setup(user.conf.discobase)
     setup.create_tables()
+    if analyze:
+        plans_before = setup.get_query_plans()
     if user.WANTS_TO_FORCE_UPGRADE_SCHEMA:
         setup.upgrade_schema(force_upgrade=True)
     else:
         setup.upgrade_schema()
+    # ANALYZE DB and show query plans
+    if analyze:
+        setup.analyze()
+        setup.print_query_plans(plans_before, "Query plans before:")
+        setup.print_query_plans(setup.get_query_plans(), "Query plans after:")
+    # STATS CACHE enable/rebuild or remove
+    if stats_cache is True:
+        setup.create_stats_cache()
+    elif stats_cache is False:
+        setup.drop_stats_cache()
     # INSTALL CLI if not there yet (only in self-contained package)
     if user.conf.frozen:
         user.conf.install_cli()
@@ -7,8 +7,13 @@ log = logging.getLogger('discodos')
 
 
 @click.command(name='stats')
+@click.option(
+    "--discogs", "-d", "discogs_counts", is_flag=True,
+    help="""Also fetch the number of collection items and sales listings
+    from Discogs. Without this option stats are calculated offline.""",
+)
 @click.pass_obj
-def stats_cmd(helper):
+def stats_cmd(helper, discogs_counts):
     """
     Displays statistics about the collection.
 
@@ -19,6 +24,8 @@ def stats_cmd(helper):
     def update_user_interaction_helper(user):
         log.debug("Entered stats mode.")
         user.WANTS_TO_SHOW_STATS = True
+        if not discogs_counts:
+            user.WANTS_ONLINE = False
         return user
 
     user = update_user_interaction_helper(helper)
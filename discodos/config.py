@@ -10,6 +10,9 @@ from subprocess import run
 import yaml
 
 from discodos.model.database import Database, sqlerr
+from discodos.model.catno import CatnoNormalizer
+from discodos.model.collection import Collection
+from discodos.model.discogs_cache import DiscogsCache
 from discodos.utils import ask_user, print_help, read_yaml
 
 log = logging.getLogger('discodos')
@@ -107,6 +110,179 @@ class Db_setup(Database):
                   PRIMARY KEY (d_release_id, d_track_no)
                   ); """}
 
+        # FTS5 full-text search index, kept in sync via triggers. rowid of
+        # release_fts is release.discogs_id, rowid of track_fts is
+        # track_search_key.search_id. track has no INTEGER PRIMARY KEY, its
+        # rowids may change on VACUUM, thus tracks get stable IDs there.
+        # Created by upgrade_search_index, not bound to a schema version.
+        self.sql_search_index = {
+            'New search index table release_fts':
+            """ CREATE VIRTUAL TABLE IF NOT EXISTS release_fts USING fts5 (
+                  artist, title, catno,
+                  tokenize = 'unicode61 remove_diacritics 2',
+                  prefix = '2 3'
+                  ); """,
+            'New search index table track_fts':
+            """ CREATE VIRTUAL TABLE IF NOT EXISTS track_fts USING fts5 (
+                  artist, track_name, notes,
+                  tokenize = 'unicode61 remove_diacritics 2',
+                  prefix = '2 3'
+                  ); """,
+            'New table track_search_key':
+            """ CREATE TABLE IF NOT EXISTS track_search_key (
+                  search_id INTEGER PRIMARY KEY,
+                  d_release_id INTEGER NOT NULL,
+                  d_track_no TEXT NOT NULL,
+                  UNIQUE (d_release_id, d_track_no)
+                  ); """,
+            'Populate search index release_fts':
+            """ INSERT OR REPLACE INTO release_fts (rowid, artist, title, catno)
+                  SELECT discogs_id, d_artist, discogs_title, d_catno
+                  FROM release; """,
+            'Populate track_search_key':
+            """ INSERT OR IGNORE INTO track_search_key (d_release_id, d_track_no)
+                  SELECT d_release_id, d_track_no FROM track; """,
+            'Populate search index track_fts':
+            """ INSERT OR REPLACE INTO track_fts (rowid, artist, track_name, notes)
+                  SELECT track_search_key.search_id, track.d_artist,
+                    track.d_track_name,
+                    TRIM(COALESCE(track_ext.notes, '') || ' ' ||
+                         COALESCE(track_ext.key_notes, ''))
+                  FROM track INNER JOIN track_search_key
+                    ON track.d_release_id = track_search_key.d_release_id
+                    AND track.d_track_no = track_search_key.d_track_no
+                  LEFT OUTER JOIN track_ext
+                    ON track.d_release_id = track_ext.d_release_id
+                    AND track.d_track_no = track_ext.d_track_no; """,
+            # release uses ON CONFLICT REPLACE, which doesn't fire DELETE
+            # triggers, thus always INSERT OR REPLACE into the index.
+            'New trigger release_fts_insert':
+            """ CREATE TRIGGER IF NOT EXISTS release_fts_insert
+                AFTER INSERT ON release
+                BEGIN
+                    INSERT OR REPLACE INTO release_fts (rowid, artist, title, catno)
+                    VALUES (NEW.discogs_id, NEW.d_artist, NEW.discogs_title,
+                            NEW.d_catno);
+                END; """,
+            'New trigger release_fts_update':
+            """ CREATE TRIGGER IF NOT EXISTS release_fts_update
+                AFTER UPDATE OF discogs_id, d_artist, discogs_title, d_catno
+                ON release
+                BEGIN
+                    DELETE FROM release_fts WHERE rowid = OLD.discogs_id;
+                    INSERT OR REPLACE INTO release_fts (rowid, artist, title, catno)
+                    VALUES (NEW.discogs_id, NEW.d_artist, NEW.discogs_title,
+                            NEW.d_catno);
+                END; """,
+            'New trigger release_fts_delete':
+            """ CREATE TRIGGER IF NOT EXISTS release_fts_delete
+                AFTER DELETE ON release
+                BEGIN
+                    DELETE FROM release_fts WHERE rowid = OLD.discogs_id;
+                END; """,
+            'New trigger track_fts_insert':
+            """ CREATE TRIGGER IF NOT EXISTS track_fts_insert
+                AFTER INSERT ON track
+                BEGIN
+                    INSERT OR IGNORE INTO track_search_key (d_release_id, d_track_no)
+                    VALUES (NEW.d_release_id, NEW.d_track_no);
+                    INSERT OR REPLACE INTO track_fts (rowid, artist, track_name, notes)
+                    VALUES ((
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no),
+                      NEW.d_artist, NEW.d_track_name, (
+                        SELECT TRIM(COALESCE(notes, '') || ' ' ||
+                                    COALESCE(key_notes, ''))
+                        FROM track_ext
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no));
+                END; """,
+            'New trigger track_fts_update':
+            """ CREATE TRIGGER IF NOT EXISTS track_fts_update
+                AFTER UPDATE OF d_release_id, d_track_no, d_artist, d_track_name
+                ON track
+                BEGIN
+                    DELETE FROM track_fts WHERE rowid = (
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = OLD.d_release_id
+                        AND d_track_no = OLD.d_track_no);
+                    DELETE FROM track_search_key
+                    WHERE d_release_id = OLD.d_release_id
+                    AND d_track_no = OLD.d_track_no;
+                    INSERT OR IGNORE INTO track_search_key (d_release_id, d_track_no)
+                    VALUES (NEW.d_release_id, NEW.d_track_no);
+                    INSERT OR REPLACE INTO track_fts (rowid, artist, track_name, notes)
+                    VALUES ((
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no),
+                      NEW.d_artist, NEW.d_track_name, (
+                        SELECT TRIM(COALESCE(notes, '') || ' ' ||
+                                    COALESCE(key_notes, ''))
+                        FROM track_ext
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no));
+                END; """,
+            'New trigger track_fts_delete':
+            """ CREATE TRIGGER IF NOT EXISTS track_fts_delete
+                AFTER DELETE ON track
+                BEGIN
+                    DELETE FROM track_fts WHERE rowid = (
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = OLD.d_release_id
+                        AND d_track_no = OLD.d_track_no);
+                    DELETE FROM track_search_key
+                    WHERE d_release_id = OLD.d_release_id
+                    AND d_track_no = OLD.d_track_no;
+                END; """,
+            'New trigger track_ext_fts_insert':
+            """ CREATE TRIGGER IF NOT EXISTS track_ext_fts_insert
+                AFTER INSERT ON track_ext
+                BEGIN
+                    UPDATE track_fts
+                    SET notes = TRIM(COALESCE(NEW.notes, '') || ' ' ||
+                                     COALESCE(NEW.key_notes, ''))
+                    WHERE rowid = (
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no);
+                END; """,
+            'New trigger track_ext_fts_update':
+            """ CREATE TRIGGER IF NOT EXISTS track_ext_fts_update
+                AFTER UPDATE OF notes, key_notes ON track_ext
+                BEGIN
+                    UPDATE track_fts
+                    SET notes = TRIM(COALESCE(NEW.notes, '') || ' ' ||
+                                     COALESCE(NEW.key_notes, ''))
+                    WHERE rowid = (
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = NEW.d_release_id
+                        AND d_track_no = NEW.d_track_no);
+                END; """,
+            'New trigger track_ext_fts_delete':
+            """ CREATE TRIGGER IF NOT EXISTS track_ext_fts_delete
+                AFTER DELETE ON track_ext
+                BEGIN
+                    UPDATE track_fts SET notes = ''
+                    WHERE rowid = (
+                        SELECT search_id FROM track_search_key
+                        WHERE d_release_id = OLD.d_release_id
+                        AND d_track_no = OLD.d_track_no);
+                END; """,
+        }
+        # The first search index layout keyed track_fts by track.rowid.
+        self.sql_search_index_outdated = {
+            f'Drop outdated {kind} {name}': f'DROP {kind.upper()} IF EXISTS {name};'
+            for kind, name in [
+                ('trigger', 'track_fts_insert'), ('trigger', 'track_fts_update'),
+                ('trigger', 'track_fts_delete'),
+                ('trigger', 'track_ext_fts_insert'),
+                ('trigger', 'track_ext_fts_update'),
+                ('trigger', 'track_ext_fts_delete'), ('table', 'track_fts'),
+            ]
+        }
+
         self.sql_upgrades = [{    # list element 0 contains a dict
             'schema_version': 2,  # this dict contains 2 entries: schema and tasks
              'tasks': {           # tasks entry contains another dict with a lot of entries
@@ -195,9 +371,203 @@ class Db_setup(Database):
                 END;
                 """
             }
+        },
+        {
+            'schema_version': 5,
+            'tasks': {
+                # track <-> track_ext joins are covered by their composite
+                # primary keys already, everything else only had rowid/PK.
+                'New index mix_track(mix_id, track_pos)':
+                """ CREATE INDEX IF NOT EXISTS idx_mix_track_mix_pos
+                      ON mix_track (mix_id, track_pos); """,
+                'New index mix_track(d_release_id, d_track_no)':
+                """ CREATE INDEX IF NOT EXISTS idx_mix_track_release_track
+                      ON mix_track (d_release_id, d_track_no); """,
+                'New index collection(d_coll_release_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_collection_release
+                      ON collection (d_coll_release_id, coll_orphaned); """,
+                'New index collection(d_coll_folder_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_collection_folder
+                      ON collection (d_coll_folder_id); """,
+                'New index sales(d_sales_release_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_sales_release
+                      ON sales (d_sales_release_id, sales_sold); """,
+                'New index track(m_rec_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_track_m_rec_id
+                      ON track (m_rec_id); """,
+            }
+        },
+        {
+            'schema_version': 6,  # Search index, see upgrade_search_index
+            'tasks': {}
+        },
+        {
+            'schema_version': 7,
+            'tasks': {
+                'New table metadata':
+                """ CREATE TABLE IF NOT EXISTS metadata (
+                      meta_key TEXT NOT NULL,
+                      meta_value TEXT,
+                      meta_mtime TEXT,
+                      PRIMARY KEY (meta_key)
+                      ); """,
+            }
+        },
+        {
+            'schema_version': 8,
+            'tasks': {
+                'New table job':
+                """ CREATE TABLE IF NOT EXISTS job (
+                      job_id INTEGER PRIMARY KEY,
+                      job_name TEXT NOT NULL,
+                      job_params TEXT NOT NULL DEFAULT '',
+                      job_status TEXT NOT NULL DEFAULT 'running',
+                      job_items INTEGER NOT NULL DEFAULT 0,
+                      job_started TEXT,
+                      job_mtime TEXT
+                      ); """,
+                'New table job_item':
+                """ CREATE TABLE IF NOT EXISTS job_item (
+                      job_id INTEGER NOT NULL
+                        REFERENCES job (job_id) ON DELETE CASCADE,
+                      item_pos INTEGER NOT NULL,
+                      item_key TEXT NOT NULL,
+                      item_done INTEGER NOT NULL DEFAULT 0,
+                      PRIMARY KEY (job_id, item_key)
+                      ); """,
+                'New index job(job_name, job_status)':
+                """ CREATE INDEX IF NOT EXISTS idx_job_name_status
+                      ON job (job_name, job_status); """,
+            }
+        },
+        {
+            'schema_version': 9,
+            'tasks': {
+                'New table accbr_features':
+                """ CREATE TABLE IF NOT EXISTS accbr_features (
+                      m_rec_id TEXT NOT NULL,
+                      a_key TEXT,
+                      a_chords_key TEXT,
+                      a_bpm REAL,
+                      PRIMARY KEY (m_rec_id)
+                      ); """,
+            }
+        },
+        {
+            'schema_version': 10,
+            'tasks': {
+                'New table brainz_attempt':
+                """ CREATE TABLE IF NOT EXISTS brainz_attempt (
+                      d_release_id INTEGER NOT NULL,
+                      d_track_no TEXT NOT NULL,
+                      attempt_time TEXT NOT NULL,
+                      attempt_detail INTEGER NOT NULL DEFAULT 1,
+                      attempt_reason TEXT,
+                      attempt_failures INTEGER NOT NULL DEFAULT 0,
+                      PRIMARY KEY (d_release_id, d_track_no)
+                      ); """,
+            }
+        },
+        {
+            'schema_version': 11,
+            'tasks': {
+                'New table release_catno':
+                """ CREATE TABLE IF NOT EXISTS release_catno (
+                      d_release_id INTEGER NOT NULL,
+                      catno_key TEXT NOT NULL,
+                      catno_method TEXT NOT NULL,
+                      d_catno TEXT,
+                      PRIMARY KEY (d_release_id, catno_key)
+                      ); """,
+                'New index release_catno(catno_key)':
+                """ CREATE INDEX IF NOT EXISTS idx_release_catno_key
+                      ON release_catno (catno_key); """,
+            }
+        },
+        {
+            'schema_version': 12,
+            'tasks': {
+                'New table mb_release':
+                """ CREATE TABLE IF NOT EXISTS mb_release (
+                      m_rel_id TEXT NOT NULL,
+                      m_rel_title TEXT,
+                      PRIMARY KEY (m_rel_id)
+                      ); """,
+                'New table mb_release_discogs':
+                """ CREATE TABLE IF NOT EXISTS mb_release_discogs (
+                      m_rel_id TEXT NOT NULL
+                        REFERENCES mb_release (m_rel_id) ON DELETE CASCADE,
+                      d_release_id INTEGER NOT NULL,
+                      PRIMARY KEY (m_rel_id, d_release_id)
+                      ); """,
+                'New table mb_release_catno':
+                """ CREATE TABLE IF NOT EXISTS mb_release_catno (
+                      m_rel_id TEXT NOT NULL
+                        REFERENCES mb_release (m_rel_id) ON DELETE CASCADE,
+                      catno_key TEXT NOT NULL,
+                      m_catno TEXT,
+                      PRIMARY KEY (m_rel_id, catno_key)
+                      ); """,
+                'New table mb_track':
+                """ CREATE TABLE IF NOT EXISTS mb_track (
+                      m_rel_id TEXT NOT NULL
+                        REFERENCES mb_release (m_rel_id) ON DELETE CASCADE,
+                      medium_pos INTEGER NOT NULL,
+                      track_pos INTEGER NOT NULL,
+                      track_number TEXT,
+                      m_rec_id TEXT,
+                      m_rec_title TEXT,
+                      PRIMARY KEY (m_rel_id, medium_pos, track_pos)
+                      ); """,
+                'New index mb_release_discogs(d_release_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_mb_release_discogs
+                      ON mb_release_discogs (d_release_id); """,
+                'New index mb_release_catno(catno_key)':
+                """ CREATE INDEX IF NOT EXISTS idx_mb_release_catno_key
+                      ON mb_release_catno (catno_key); """,
+                'New index mb_track(m_rec_id)':
+                """ CREATE INDEX IF NOT EXISTS idx_mb_track_m_rec_id
+                      ON mb_track (m_rec_id); """,
+            }
         }
     ]
 
+        # Named representative queries of model.Collection and model.Mix,
+        # used by "setup --analyze" to show EXPLAIN QUERY PLAN output.
+        self.sql_explain_queries = {
+            'Mix tracklist (Mix.get_full_mix)':
+            """ SELECT track_pos, discogs_title, mix_track.d_track_no, key, bpm
+                FROM mix_track INNER JOIN mix
+                  ON mix.mix_id = mix_track.mix_id
+                    INNER JOIN release
+                    ON mix_track.d_release_id = release.discogs_id
+                      LEFT OUTER JOIN track
+                      ON mix_track.d_release_id = track.d_release_id
+                      AND mix_track.d_track_no = track.d_track_no
+                        LEFT OUTER JOIN track_ext
+                        ON mix_track.d_release_id = track_ext.d_release_id
+                        AND mix_track.d_track_no = track_ext.d_track_no
+                WHERE mix_track.mix_id == 1 ORDER BY track_pos ASC """,
+            'Track occurences in mixes (Collection.track_report_occurences)':
+            """ SELECT track_pos, mix_track.mix_id, mix.name
+                FROM mix_track INNER JOIN mix ON mix.mix_id = mix_track.mix_id
+                WHERE d_release_id == 1 AND d_track_no == 'A1' """,
+            'Collection items of release (Collection.get_collection_items_by_release)':
+            """ SELECT * FROM collection WHERE d_coll_release_id == 1 """,
+            'Sales listings of release (Collection.get_sales_listings_by_release)':
+            """ SELECT * FROM sales WHERE d_sales_release_id == 1 """,
+            'Release listing (Collection.key_value_search_releases)':
+            """ SELECT release.discogs_id, d_coll_instance_id, d_sales_listing_id,
+                  d_collfolder_name
+                FROM release
+                  LEFT OUTER JOIN sales
+                  ON discogs_id = sales.d_sales_release_id
+                  LEFT OUTER JOIN collection
+                  ON discogs_id = collection.d_coll_release_id
+                  LEFT OUTER JOIN collfolder
+                  ON d_coll_folder_id = d_collfolder_id """,
+        }
+
     def create_tables(self):  # initial db setup
         for table, sql in self.sql_initial.items():
             try:  # release
@@ -208,6 +578,113 @@ class Db_setup(Database):
             except sqlerr as e:
                 log.info("CREATE TABLE '%s': %s", table, e.args[0])
 
+    def fts5_available(self):
+        """Checks if the SQLite library was compiled with FTS5 support."""
+        row = self._select(
+            "SELECT sqlite_compileoption_used('ENABLE_FTS5') AS fts5", fetchone=True
+        )
+        if not row or not row['fts5']:
+            log.warning(
+                "Db_setup: SQLite has no FTS5 support, skipping search index "
+                "creation. Offline searches fall back to slower LIKE queries."
+            )
+            return False
+        return True
+
+    def get_stats_cache_sql(self):
+        """Returns statements creating the stats_cache table and triggers.
+
+        stats_cache holds a single row of STATS_COUNTERS, triggers on the
+        counted tables keep it up to date incrementally.
+        """
+        counters = self.STATS_COUNTERS
+        columns = ", ".join(f"{column} NUMERIC NOT NULL DEFAULT 0"
+                            for column in counters)
+        sql = {
+            'New table stats_cache':
+            f""" CREATE TABLE IF NOT EXISTS stats_cache (
+                  stats_id INTEGER PRIMARY KEY CHECK (stats_id = 1),
+                  {columns}
+                  ); """,
+            'Populate stats_cache':
+            f""" INSERT OR REPLACE INTO stats_cache (stats_id, {', '.join(counters)})
+                  SELECT 1, {', '.join(counters)}
+                  FROM ({self._stats_aggregate_sql().rstrip(';')}); """,
+        }
+        def value(expr, row):
+            return f"COALESCE(({expr.format(row=row)}), 0)"
+
+        tables = {}
+        for column, (table, expr) in counters.items():
+            tables.setdefault(table, []).append((column, expr))
+        for table, table_counters in tables.items():
+            changes = {
+                'insert': [f"{col} = {col} + {value(expr, 'NEW')}"
+                           for col, expr in table_counters],
+                'delete': [f"{col} = {col} - {value(expr, 'OLD')}"
+                           for col, expr in table_counters],
+                'update': [f"{col} = {col} + {value(expr, 'NEW')} - "
+                           f"{value(expr, 'OLD')}"
+                           for col, expr in table_counters],
+            }
+            for event, sets in changes.items():
+                sql[f'New trigger {table}_stats_{event}'] = f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_stats_{event}
+                    AFTER {event.upper()} ON {table}
+                    BEGIN
+                        UPDATE stats_cache SET {', '.join(sets)};
+                    END; """
+        return sql
+
+    def create_stats_cache(self):
+        """Creates (or rebuilds) the stats_cache table used by `dsc stats`."""
+        return self._run_tasks(self.get_stats_cache_sql())
+
+    def drop_stats_cache(self):
+        """Removes the stats_cache table and its triggers."""
+        tasks = {
+            f'Drop trigger {name.split()[-1]}':
+                f'DROP TRIGGER IF EXISTS {name.split()[-1]};'
+            for name in self.get_stats_cache_sql()
+            if name.startswith('New trigger')
+        }
+        tasks['Drop table stats_cache'] = 'DROP TABLE IF EXISTS stats_cache;'
+        return self._run_tasks(tasks)
+
+    def upgrade_search_index(self):
+        """Creates the FTS5 search index if it's missing and SQLite supports
+        FTS5. An index of the outdated layout is rebuilt.
+
+        Checked on each schema upgrade instead of being bound to a schema
+        version, thus the index is created as soon as SQLite supports FTS5.
+        Returns True if the index is available.
+        """
+        rows = self._select(
+            "SELECT name FROM sqlite_master WHERE type == 'table' "
+            "AND name IN ('release_fts', 'track_fts', 'track_search_key');"
+        )
+        existing = {row['name'] for row in rows or []}
+        if len(existing) == 3:
+            return True
+        if not self.fts5_available():
+            return False
+        if 'track_fts' in existing and 'track_search_key' not in existing:
+            if not self._run_tasks(self.sql_search_index_outdated):
+                return False
+        return self._run_tasks(self.sql_search_index)
+
+    def _run_tasks(self, tasks):
+        for task, sql in tasks.items():
+            try:
+                self.execute_sql(sql, raise_err=True)
+                msg_task="Task '{}' was successful.".format(task)
+                log.info(msg_task)
+                print(msg_task)
+            except sqlerr as e:
+                log.warning("Task failed '%s': %s", task, e.args[0])
+                return False
+        return True
+
     def get_latest_schema_version(self):
         vers_list = [schema['schema_version'] for schema in self.sql_upgrades]
         latest = max(vers_list)
@@ -224,6 +701,7 @@ class Db_setup(Database):
         # check if upgrade necessary
         if not current_schema < latest_schema and force_upgrade is False:
             log.info('Db_setup: No schema upgrade necessary.')
+            self.upgrade_search_index()
         else:  # also happens if force_upgrade True
             print("Upgrading DiscoBASE schema to latest version.")
             failure = False
@@ -241,6 +719,7 @@ class Db_setup(Database):
                         except sqlerr as e:
                             log.warning("Task failed '%s': %s", task, e.args[0])
                             failure = True
+            self.upgrade_search_index()  # Not critical, LIKE searches else
 
             if failure:
                 msg_fail='DiscoBASE schema upgrade failed, open an issue on Github!\n'
@@ -256,6 +735,36 @@ class Db_setup(Database):
                 self.configure_db()  # this sets foreign_keys = ON again
                 return True
 
+    def get_query_plans(self):
+        """Returns EXPLAIN QUERY PLAN details of all named queries.
+
+        Queries failing (eg. table missing in an outdated schema) are reported
+        with the error message instead of a plan.
+        """
+        plans = {}
+        for name, sql in self.sql_explain_queries.items():
+            try:
+                rows = self._select(f'EXPLAIN QUERY PLAN {sql}')
+                plans[name] = [row['detail'] for row in rows] if rows else []
+            except sqlerr as e:
+                log.warning("Db_setup: Query plan '%s' failed: %s", name, e.args[0])
+                plans[name] = [f'Error: {e.args[0]}']
+        return plans
+
+    def print_query_plans(self, plans, headline):
+        print(headline)
+        for name, details in plans.items():
+            print(f'  {name}:')
+            for detail in details:
+                print(f'    {detail}')
+        print('')
+
+    def analyze(self):
+        """Gathers table statistics for the SQLite query planner."""
+        return self._run_tasks(
+            {task: task for task in ['ANALYZE', 'PRAGMA optimize']}
+        )
+
 
 class Config():  # pylint: disable=too-many-instance-attributes
     """Provides access to the DiscoDOS configuration file."""
@@ -353,6 +862,10 @@ class Config():  # pylint: disable=too-many-instance-attributes
             self.webdav_url = self._get_config_entry('webdav_url')
             self.enable_tui = self._get_config_entry('enable_tui')
             self.sold_folder_id = self._get_config_entry('discogs_sold_folder_id')
+            self.sqlite_profiles = self._get_config_entry('sqlite_profiles')
+            self.discogs_cache = self._get_config_entry('discogs_cache')
+            self.brainz_backoff = self._get_config_entry('brainz_backoff')
+            self.catno_rules_conf = self._get_config_entry('catno_rules')
 
             # discogs_token is essential, bother user until we have one
             # but not when no_ask_token is set (macOS)
@@ -390,6 +903,78 @@ class Config():  # pylint: disable=too-many-instance-attributes
                 raise SystemExit(3)
             return value
 
+    def db_profile(self, name="default"):
+        """Returns the PRAGMA settings of a DiscoBASE performance profile.
+
+        Built-in profiles are defined in Database.DB_PROFILES. Single settings
+        can be overridden in config.yaml, eg.:
+
+        sqlite_profiles:
+          bulk_import:
+            cache_size: -128000
+        """
+        profile = dict(Database.DB_PROFILES.get(
+            name, Database.DB_PROFILES["default"]
+        ))
+        overrides = getattr(self, "sqlite_profiles", "")
+        if overrides and isinstance(overrides.get(name), dict):
+            profile.update(overrides[name])
+        log.debug("Config: DB profile %s: %s", name, profile)
+        return profile
+
+    def discogs_cache_ttls(self):
+        """Returns the Discogs response cache TTLs in seconds per endpoint.
+
+        Built-in TTLs are defined in DiscogsCache.TTLS. They can be overridden
+        in config.yaml, a TTL of 0 disables caching of an endpoint, eg.:
+
+        discogs_cache:
+          releases: 86400
+          artists: 0
+        """
+        ttls = dict(DiscogsCache.TTLS)
+        overrides = getattr(self, "discogs_cache", "")
+        if overrides and isinstance(overrides, dict):
+            ttls.update(overrides)
+        log.debug("Config: Discogs cache TTLs: %s", ttls)
+        return ttls
+
+    def brainz_retry_backoff(self):
+        """Returns the back-off of failed *Brainz matches in hours.
+
+        Tracks that failed to match are skipped by brainz updates for "hours",
+        doubled with each further failure up to "max_hours". Built-in values
+        are defined in Collection.BRAINZ_BACKOFF. They can be overridden in
+        config.yaml, eg.:
+
+        brainz_backoff:
+          hours: 168
+          max_hours: 8760
+        """
+        backoff = dict(Collection.BRAINZ_BACKOFF)
+        overrides = getattr(self, "brainz_backoff", "")
+        if overrides and isinstance(overrides, dict):
+            backoff.update(overrides)
+        log.debug("Config: *Brainz retry back-off: %s", backoff)
+        return backoff
+
+    def catno_rules(self):
+        """Returns the rules deriving catalog number variants.
+
+        Built-in rules are defined in CatnoNormalizer.RULES. They can be
+        overridden in config.yaml, eg.:
+
+        catno_rules:
+          suffixes: [CD, D, LP]
+          middle_terms: ['-', '#', D, CD, BLACK, WHITE]
+        """
+        rules = dict(CatnoNormalizer.RULES)
+        overrides = getattr(self, "catno_rules_conf", "")
+        if overrides and isinstance(overrides, dict):
+            rules.update(overrides)
+        log.debug("Config: Catalog number rules: %s", rules)
+        return rules
+
     def install_cli(self):
         # when to_path is set, we install wrappers to ~/bin
         # and extend $PATH if necessary (posix only)
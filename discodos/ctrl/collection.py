@@ -1,9 +1,23 @@
 import logging
+import bz2
+import gzip
+import io
+import lzma
+import re
+import tarfile
 from abc import ABC
 # import pprint as p
 from time import time
 from datetime import datetime
+import json
 from json import JSONDecodeError
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from sqlite3 import Error as sqlerr
 import discogs_client.exceptions as errors
 from discogs_client import CollectionItemInstance, Sort
 from rich.progress import (BarColumn, MofNCompleteColumn, Progress,
@@ -17,6 +31,12 @@ from discodos.ctrl.common import ControlCommon
 from discodos.model import Brainz
 from discodos.model import Brainz_match
 from discodos.model import Collection
+from discodos.model import DiscogsCache
+from discodos.model import AcousticBrainzCache
+from discodos.model import MusicBrainzCache
+from discodos.model import CatnoNormalizer
+from discodos.model import MusicBrainzIndex
+from discodos.model.brainz_index import DISCOGS_RELEASE_REGEX
 from discodos.utils import is_number
 from discodos.view import CollectionViewCommandline
 from discodos.ctrl.tui import DiscodosListApp
@@ -31,6 +51,48 @@ from discodos.utils import (
 )
 
 log = logging.getLogger('discodos')
+MBID_REGEX = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE
+)
+CATNO_REGEX = re.compile(r'"catalog-number":\s*"((?:[^"\\]|\\.)*)"')
+
+
+@contextmanager
+def worker_lanes(*names):
+    """Yields one single-threaded executor per name, shut down on exit."""
+    pools = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+             for name in names]
+    try:
+        yield pools
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+@contextmanager
+def open_dump(dump_file, members=None):
+    """Opens a data dump of JSON lines, optionally gzip, bzip2 or xz
+    compressed. Tar archives (eg. MusicBrainz' release.tar.xz) are streamed,
+    the lines of all members accepted by the members callable are read.
+
+    Yields the raw file (its position tells the progress) and the lines.
+    """
+    dump_file = Path(dump_file)
+    with open(dump_file, "rb") as raw:
+        if ".tar" in [suffix.lower() for suffix in dump_file.suffixes]:
+            with tarfile.open(fileobj=raw, mode="r|*") as tar:
+                yield raw, (  # Stream members can't be wrapped in text mode
+                    line.decode("utf-8") for member in tar
+                    if member.isfile() and (members is None or members(member.name))
+                    for line in tar.extractfile(member)
+                )
+            return
+        opener = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}.get(
+            dump_file.suffix.lower())
+        yield raw, (opener(raw, "rt", encoding="utf-8") if opener
+                    else io.TextIOWrapper(raw, encoding="utf-8"))
+
+
 custom_progress = Progress(
     MofNCompleteColumn(),
     BarColumn(),
@@ -46,6 +108,8 @@ class CollectionControlCommon (ABC):
 
 class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
     """CLI level controller functionality, offline & Discogs user profile"""
+    BRAINZ_LANE_WINDOW = 8  # Tracks queued ahead per lane of brainz updates
+    BRAINZ_ACCBR_WINDOW = 25  # Max. tracks held back for a bulk request
 
     def __init__(
         self,
@@ -63,24 +127,123 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         self.cli = (
             CollectionViewCommandline()
         )  # instantiate cli frontend class
-        self.collection = Collection(db_conn, db_file)
+        pragmas = self.user.conf.db_profile(self.user.DB_PROFILE)
+        self.collection = Collection(db_conn, db_file, pragmas=pragmas)
 
         if self.collection.db_not_found is True:
             self.cli.ask("Setting up DiscoBASE, press enter...")
             super().setup_db(db_file)
-            self.collection = Collection(db_conn, db_file)
+            self.collection = Collection(db_conn, db_file, pragmas=pragmas)
 
+        self.cache = None
+        self.accbr_cache = None
+        self.mb_cache = None
+        self.catno_normalizer = None
+        self.mb_index = None
         if self.user.WANTS_ONLINE:
-            if not self.collection.discogs_connect(userToken, appIdentifier):
+            self.cache = self.discogs_cache(db_file)
+            if not self.collection.discogs_connect(
+                userToken, appIdentifier, cache=self.cache
+            ):
                 log.error("connecting to Discogs API, let's stay offline!\n")
             else:  # only try to initialize brainz if discogs is online already
+                self.accbr_cache = self.acousticbrainz_cache(db_file)
+                self.mb_cache = self.musicbrainz_cache(db_file)
+                self.catno_normalizer = CatnoNormalizer(
+                    self.user.conf.catno_rules())
+                if getattr(self.user, "BRAINZ_LOCAL_MB", False):
+                    self.mb_index = self.musicbrainz_index(db_file)
                 self.brainz = Brainz(
-                    musicbrainz_user, musicbrainz_pass, appIdentifier
+                    musicbrainz_user, musicbrainz_pass, appIdentifier,
+                    accbr_cache=self.accbr_cache, mb_cache=self.mb_cache,
+                    mb_index=self.mb_index
                 )
         print()
         log.debug("CTRL: ONLINE=%s in %s", self.ONLINE, __class__.__name__)
         self.first_track_on_release = ""
 
+    def discogs_cache(self, db_file):
+        """Returns the Discogs response cache living next to the DiscoBASE.
+
+        None if disabled via --no-cache.
+        """
+        mode = getattr(self.user, "CACHE_MODE", "use")
+        if mode == "off":
+            log.debug("CTRL: Discogs response cache disabled.")
+            return None
+        cache_dir = Path(db_file).parent if db_file else Path(".")
+        cache = DiscogsCache(
+            cache_dir / "discogs_cache.db",
+            ttls=self.user.conf.discogs_cache_ttls(),
+            refresh=mode == "refresh",
+        )
+        cache.purge_expired()
+        return cache
+
+    def acousticbrainz_cache(self, db_file):
+        """Returns the AcousticBrainz features cache living next to the
+        DiscoBASE. Memory only if disabled via --no-cache, --refresh fetches
+        stored features again. Features of imported AcousticBrainz dumps are
+        always used.
+        """
+        local_index = self.acousticbrainz_index(db_file)  # Imported dumps
+        mode = getattr(self.user, "CACHE_MODE", "use")
+        if mode == "off":
+            return AcousticBrainzCache(local_index=local_index)
+        cache_dir = Path(db_file).parent if db_file else Path(".")
+        return AcousticBrainzCache(cache_dir / "acousticbrainz_cache.db",
+                                   local_index=local_index,
+                                   refresh=mode == "refresh")
+
+    def acousticbrainz_index(self, db_file):
+        """Returns a lookup function for AcousticBrainz features imported
+        into the DiscoBASE. It uses its own connection, brainz updates call it
+        from their AcousticBrainz lane.
+        """
+        index = self.lane_collection(db_file)
+        lock = threading.Lock()
+
+        def local_index(mb_id):
+            with lock:
+                return index.get_accbr_features(mb_id)
+        return local_index
+
+    def musicbrainz_index(self, db_file):
+        """Returns the local MusicBrainz index imported into the DiscoBASE
+        (see import_musicbrainz_dump), using its own connection."""
+        return MusicBrainzIndex(self.lane_collection(db_file))
+
+    def lane_collection(self, db_file=None):
+        """Returns a Collection with a DiscoBASE connection of its own, usable
+        from the worker lanes of brainz updates. Access has to be serialized.
+
+        db_file defaults to the file of the main DiscoBASE connection, which
+        must never be used from a lane.
+        """
+        db_file = db_file or self.collection.get_db_file()
+        if not db_file:
+            log.error("CTRL: Worker lanes need a DiscoBASE file, "
+                      "an in-memory database can't be shared.")
+            raise SystemExit(4)
+        return Collection(sqlite3.connect(
+            f"file:{db_file}?mode=rw", uri=True, check_same_thread=False
+        ), db_file)
+
+    def musicbrainz_cache(self, db_file):
+        """Returns the MusicBrainz lookup cache living next to the DiscoBASE.
+
+        Memory only if disabled via --no-cache, --refresh ignores stored
+        lookups.
+        """
+        mode = getattr(self.user, "CACHE_MODE", "use")
+        if mode == "off":
+            return MusicBrainzCache()
+        cache_dir = Path(db_file).parent if db_file else Path(".")
+        mb_cache = MusicBrainzCache(cache_dir / "musicbrainz_cache.db",
+                                    refresh=mode == "refresh")
+        mb_cache.purge_expired()
+        return mb_cache
+
     @property
     def ONLINE(self):
         status = self.collection.ONLINE
@@ -389,21 +552,19 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         tracks_discogs_errors = 0
 
         try:
-            for track in tracklist:
-                tr_artists = self.collection.d_artists_parse(
-                    tracklist, track.position, d_artists
-                )
-                tr_title = track.title
-                if self.collection.upsert_track(
-                    release_id, track.position, tr_title, tr_artists
-                ):
-                    tracks_added += 1
-                    # msg_tr_add = f'Track "{tr_artists}" - "{tr_title}"'
-                    # log.debug(msg_tr_add)
-                    # print(msg_tr_add)
-                else:
-                    tracks_db_errors += 1
-                    log.error("importing track. Continuing anyway.")
+            tracks = [
+                (release_id, track.position, track.title,
+                 self.collection.d_artists_parse(
+                     tracklist, track.position, d_artists))
+                for track in tracklist
+            ]
+            # One executemany for the whole tracklist
+            upserted = self.collection.upsert_tracks(tracks)
+            if upserted is False:
+                tracks_db_errors += len(tracks)
+                log.error("importing tracks. Continuing anyway.")
+            else:
+                tracks_added += upserted
         except Exception as Exc:
             tracks_discogs_errors += 1
             log.error("Exception: %s", Exc)
@@ -453,15 +614,109 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
     def print_release_info(self, release_id, artists, title):
         print(f'Release {release_id} - "{artists}" - "{title}"')
 
-    def import_collection(self, tracks=False, offset=0):
+    def start_job(self, job_name, item_keys, resume=False, **params):
+        """Starts a batch job recorded in the job journal or continues one.
+
+        With resume=True the last unfinished job of the same name and params
+        is continued, item_keys is not used then (it can be a lazy generator).
+        Returns a tuple of the job ID (None if the journal is not available),
+        the set of item keys still to do and the number of items done already.
+        """
+        job_params = json.dumps(params, sort_keys=True)
+        if resume:
+            job = self.collection.get_unfinished_job(job_name, job_params)
+            if job:
+                pending = self.collection.get_job_pending_keys(job["job_id"])
+                done = job["job_items"] - len(pending)
+                self.cli.p(
+                    f"Continuing job started {job['job_started']}: "
+                    f"{done} of {job['job_items']} items done already."
+                )
+                return job["job_id"], pending, done
+            log.warning("No unfinished job found, starting from the beginning.")
+        item_keys = [str(key) for key in item_keys]
+        job_id = self.collection.create_job(job_name, job_params, item_keys)
+        return job_id, set(item_keys), 0
+
+    def journal_items(self, job_id, pending, items, key):
+        """Yields the pending items of a job, in the order of items.
+
+        An item is marked done in the journal when the next one is requested,
+        ie. when the caller's loop is through with it. Once all items are
+        through, the job is finished.
+        """
+        for item in items:
+            item_key = str(key(item))
+            if item_key not in pending:
+                continue
+            yield item
+            if job_id:
+                self.collection.set_job_item_done(job_id, item_key)
+        if job_id:
+            self.collection.finish_job(job_id)
+
+    def fetch_release(self, item):
+        """Fetches the full release data of a collection item.
+
+        Runs in a worker thread. The data is stored in the item itself, thus
+        each later access to item.release doesn't fetch again.
+        """
+        try:
+            item.release.refresh()
+        except Exception as Exc:  # pylint: disable=broad-exception-caught
+            # The writer accesses the release again and reports the error.
+            log.debug("Prefetching release %s failed: %s", item.id, Exc)
+        return item
+
+    def prefetch_releases(self, items, workers=1):
+        """Yields collection items in order, releases fetched ahead of time.
+
+        Up to twice as many releases as workers are fetched concurrently, the
+        rate limiter keeps the pace. With workers=1 items are simply passed
+        through.
+        """
+        if workers <= 1:
+            yield from items
+            return
+        pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="discogs_fetch"
+        )
+        try:
+            yield from self.run_lane(pool, self.fetch_release, items,
+                                     workers * 2)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def run_lane(pool, func, items, window=2):
+        """Yields func(item) for all items in order, computed by pool.
+
+        Up to window items are submitted ahead, so the pool works while the
+        caller is busy with the previous results.
+        """
+        futures = deque()
+        for item in items:
+            futures.append(pool.submit(func, item))
+            while len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+    def import_collection(self, tracks=False, offset=0, workers=1,
+                          resume=False):
+        """Imports the Discogs collection, optionally including tracks.
+
+        With tracks=True, releases are fetched by a pool of worker threads;
+        results are written to the DiscoBASE in collection order by this
+        (the only writing) thread. Progress is recorded in the job journal,
+        resume=True continues an unfinished import (offset is ignored then).
+        """
         start_time = time()
         self.cli.exit_if_offline(self.collection.ONLINE)
 
         releases_processed = releases_added = releases_db_errors = 0
         tracks_processed = tracks_added = tracks_db_errors = tracks_discogs_errors = 0
         real_releases_processed = 0  # In case we start at offset, we need two counts
-        imported_instance_ids = []  # After import we check for orphaned entries
-        instances_orphaned = 0
 
         # Start tracks or basic import
         if tracks:
@@ -479,39 +734,40 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         if not self.import_collection_folders():
             return
 
-        releases = self.collection.me.collection_folders[0].releases
+        releases = list(self.collection.me.collection_folders[0].releases)
+        # Also skipped ones are in the collection, thus not orphaned
+        imported_instance_ids = [item.instance_id for item in releases]
         total_releases = len(releases)
-
-        with custom_progress as progress:
-            task = progress.add_task("Processing releases...", total=total_releases)
-
-            for item in releases:
-                if offset and releases_processed < offset:
-                    progress.update(task, advance=1)
-                    releases_processed += 1
-                    continue
-
-                imported_instance_ids.append(item.instance_id)
-                rel_created, d_artists, _ = self.create_release_entry(item.release)
-                self.create_collection_item(
-                    item.data,
-                    sold_folder_id=self.user.conf.sold_folder_id,
+        offset = 0 if resume else offset
+        job_id, pending, _ = self.start_job(
+            "import_collection", imported_instance_ids[offset:], resume,
+            tracks=tracks,
+        )
+        todo = [item for item in releases[offset:]
+                if str(item.instance_id) in pending]
+        releases_processed = total_releases - len(todo)
+
+        # Commit in batches instead of after each release/item/track
+        with custom_progress as progress, self.collection.batch():
+            task = progress.add_task(
+                "Processing releases...", total=total_releases,
+                completed=releases_processed,
+            )
+            items = self.prefetch_releases(todo, workers) if tracks else todo
+            for item in self.journal_items(
+                job_id, pending, items, lambda item: item.instance_id
+            ):
+                rel_created, tracks_count, db_errors, discogs_errors = (
+                    self.import_collection_item(item, tracks)
                 )
-
                 if not rel_created:
                     releases_db_errors += 1
-                    log.error(
-                        'importing release "%s" Continuing anyway.', item.release.title
-                    )
                     progress.update(task, advance=1)
                     continue
 
                 releases_added += 1
 
                 if tracks:
-                    tracks_count, db_errors, discogs_errors = self.process_tracks(
-                        item.release.id, item.release.tracklist, d_artists
-                    )
                     tracks_added += tracks_count
                     tracks_db_errors += db_errors
                     tracks_discogs_errors += discogs_errors
@@ -531,17 +787,15 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
 
         # Final cleanup
         print("Looking for orphaned collection items...")
-        for item in self.collection.get_all_collection_items():
-            if (
-                not item["d_coll_instance_id"] in imported_instance_ids
-                and not item["coll_orphaned"]
-            ):
-                instances_orphaned += 1
-                log.warning(
-                    "Marking orphaned: %s. Not in Discogs collection anymore.",
-                    item["d_coll_instance_id"],
-                )
-                self.collection.set_collection_item_orphaned(item["d_coll_instance_id"])
+        orphaned_ids = self.collection.mark_orphaned_collection_items(
+            imported_instance_ids
+        )
+        for instance_id in orphaned_ids:
+            log.warning(
+                "Marked orphaned: %s. Not in Discogs collection anymore.",
+                instance_id,
+            )
+        instances_orphaned = len(orphaned_ids)
 
         # Final report
         report_notes = {
@@ -550,6 +804,7 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
             "Imported releases to DiscoBASE": releases_added,
             "Marked orphaned collection items": instances_orphaned,
             "Database errors (release import)": releases_db_errors,
+            "Database writes rolled back": self.collection.batch_failed_rows,
         }
         if tracks:
             report_notes.update({
@@ -558,14 +813,146 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
                     "Database errors (track import)": tracks_db_errors,
                     "Discogs errors (track import)": tracks_discogs_errors,
                 })
+        report_notes.update(self.discogs_api_report())
         print(
             Panel.fit(
                 self.cli.two_column_view(report_notes, as_is=True),
                 title="Final report",
             )
         )
+        self.save_collection_state()
         self.cli.duration_stats(start_time, "Discogs import")
 
+    def import_collection_item(self, item, tracks=False):
+        """Writes a collection item, its release and optionally its tracks.
+
+        Returns a tuple of (release created, tracks added, tracks database
+        errors, tracks Discogs errors).
+        """
+        rel_created, d_artists, _ = self.create_release_entry(item.release)
+        self.create_collection_item(
+            item.data,
+            sold_folder_id=self.user.conf.sold_folder_id,
+        )
+        if not rel_created:
+            log.error(
+                'importing release "%s" Continuing anyway.', item.release.title
+            )
+            return rel_created, 0, 0, 0
+        if not tracks:
+            return rel_created, 0, 0, 0
+        return (rel_created, *self.process_tracks(
+            item.release.id, item.release.tracklist, d_artists
+        ))
+
+    def discogs_api_report(self):
+        """Returns Discogs cache and rate limiter stats for final reports."""
+        report_notes = {}
+        if self.cache:
+            report_notes.update({
+                "Discogs cache hits": self.cache.stats["hits"],
+                "Discogs cache revalidated": self.cache.stats["revalidated"],
+                "Discogs cache misses": self.cache.stats["misses"],
+            })
+        if self.collection.rate_limiter:
+            report_notes["Discogs rate limit waits (s)"] = round(
+                self.collection.rate_limiter.stats["wait_seconds"], 1
+            )
+        return report_notes
+
+    def save_collection_state(self):
+        """Records the high-water mark of the collection import.
+
+        The next incremental import stops at known items and only compares
+        counts to find removed ones, as long as the DiscoBASE still is in this
+        state. Not recorded if writes of the import were rolled back, the
+        next import is a full one then.
+        """
+        if self.collection.batch_failed_rows:
+            log.warning("Not recording import state, writes were rolled back.")
+            return
+        self.collection.set_metadata(self.collection.get_collection_state())
+
+    def import_collection_incremental(self, tracks=False, workers=1):
+        """Imports only collection items added since the last import.
+
+        Collection items are fetched sorted by date added, newest first. The
+        import stops at the first item already in the DiscoBASE. Removed items
+        are only searched for (and marked orphaned), when the number of items
+        on Discogs doesn't add up. Falls back to a full import if no previous
+        import state is recorded or the DiscoBASE was changed since.
+        """
+        start_time = time()
+        self.cli.exit_if_offline(self.collection.ONLINE)
+        state = self.collection.get_collection_state()
+        if (state["collection_ids_hash"]
+                != self.collection.get_metadata("collection_ids_hash")):
+            print("No state of a previous import found, running a full import.")
+            return self.import_collection(tracks=tracks, workers=workers)
+
+        self.cli.p(
+            "Importing Discogs collection into DiscoBASE (incremental import - "
+            f"collection items added after {state['collection_newest_added']})",
+            trail_nl=False,
+        )
+        if not self.import_collection_folders():
+            return None
+
+        known_ids = set(self.collection.get_collection_instance_ids())
+        releases = self.collection.me.collection_folders[0].releases
+        releases.sort("added", Sort.Order.DESCENDING)
+        new_items = []
+        for item in releases:
+            if item.instance_id in known_ids:
+                break
+            new_items.append(item)
+
+        releases_added = releases_db_errors = tracks_added = 0
+        with self.collection.batch():
+            items = self.prefetch_releases(new_items, workers) if tracks else new_items
+            for item in items:
+                rel_created, tracks_count, _, _ = self.import_collection_item(
+                    item, tracks
+                )
+                if not rel_created:
+                    releases_db_errors += 1
+                    continue
+                releases_added += 1
+                tracks_added += tracks_count
+
+        # Cheap check for removals: Does the count add up?
+        orphaned_ids = []
+        if len(releases) != len(known_ids) + len(new_items):
+            print("Looking for orphaned collection items...")
+            orphaned_ids = self.collection.mark_orphaned_collection_items(
+                [item.instance_id for item in releases]
+            )
+            for instance_id in orphaned_ids:
+                log.warning(
+                    "Marked orphaned: %s. Not in Discogs collection anymore.",
+                    instance_id,
+                )
+
+        report_notes = {
+            "New collection items": len(new_items),
+            "Imported releases to DiscoBASE": releases_added,
+            "Marked orphaned collection items": len(orphaned_ids),
+            "Database errors (release import)": releases_db_errors,
+            "Database writes rolled back": self.collection.batch_failed_rows,
+        }
+        if tracks:
+            report_notes["Imported tracks to DiscoBASE"] = tracks_added
+        report_notes.update(self.discogs_api_report())
+        print(
+            Panel.fit(
+                self.cli.two_column_view(report_notes, as_is=True),
+                title="Final report",
+            )
+        )
+        self.save_collection_state()
+        self.cli.duration_stats(start_time, "Discogs incremental import")
+        return None
+
     # Suggest
 
     def track_report(self, track_searchterm):
@@ -680,63 +1067,63 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
            List has to contain fields: d_release_id, discogs_title, d_track_no.
            Usually list items are slite Row objects, but could be dicts too.
            Any iterable should work unless it doesn't have named keys!
+           Tracks are grouped by release, each release is fetched once.
         '''
         start_time = time()
-        if offset:
-            self.processed = offset
-            self.processed_total = len(track_list) + offset
-        else:
-            self.processed = 1
-            self.processed_total = len(track_list)
+        # Tracks skipped via offset count as processed
+        self.processed = offset + 1
+        self.processed_total = len(track_list) + offset
         self.tracks_added = 0
         self.tracks_db_errors = 0
         self.tracks_not_found_errors = 0
+        # Fetch each release once and update all of its tracks from it.
+        releases = {}
         for track in track_list:
-
-            d_track_no = track['d_track_no']
-            d_release_id = track['d_release_id']
-            discogs_title = track['discogs_title']
-            self.collection.rate_limit_slow_downer(remaining=20, sleep=3)
-
-            # move this to method fetch_track_and_artist_from_discogs
-            try: # we catch 404 here, and not via get_d_release, to save one request
-                name, artist = "", ""
-                d_tracklist = self.d.release(d_release_id).tracklist
-                name = self.collection.d_tracklist_parse(
-                    d_tracklist, d_track_no)
-                artist = self.collection.d_artists_parse(
-                    d_tracklist, d_track_no,
-                    self.d.release(d_release_id).artists)
+            releases.setdefault(track['d_release_id'], []).append(track)
+
+        for d_release_id, tracks in releases.items():
+            discogs_title = tracks[0]['discogs_title']
+            try:  # we catch 404 here, and not via get_d_release, to save one request
+                d_release = self.d.release(d_release_id)
+                d_tracklist = d_release.tracklist
+                d_artists = d_release.artists
             except errors.HTTPError as HtErr:
-                log.error('Track %s on "%s" (%s) not existing on Discogs (%s).',
-                          d_track_no, discogs_title, d_release_id, HtErr)
-                self.cli.brainz_processed_so_far(self.processed, self.processed_total)
-                self.processed += 1
-                print("")  # space for readability
-                continue  # jump to next iteration, nothing more to do here
-
-            if name or artist:
-                print('Adding Track {} on "{}" ({})'.format(
-                      d_track_no, discogs_title, d_release_id))
-                print('{} - {}'.format(artist, name))
-                if self.collection.upsert_track(
-                    d_release_id, d_track_no, name, artist
-                ):
-                    self.tracks_added += 1
+                for track in tracks:
+                    log.error('Track %s on "%s" (%s) not existing on Discogs (%s).',
+                              track['d_track_no'], discogs_title, d_release_id,
+                              HtErr)
+                    self.cli.brainz_processed_so_far(self.processed,
+                                                     self.processed_total)
+                    self.processed += 1
+                    print("")  # space for readability
+                continue  # jump to next release, nothing more to do here
+
+            found = []
+            for track in tracks:
+                d_track_no = track['d_track_no']
+                name = self.collection.d_tracklist_parse(d_tracklist, d_track_no)
+                artist = self.collection.d_artists_parse(
+                    d_tracklist, d_track_no, d_artists)
+                if name or artist:
+                    print('Adding Track {} on "{}" ({})'.format(
+                          d_track_no, discogs_title, d_release_id))
+                    print('{} - {}'.format(artist, name))
+                    found.append((d_release_id, d_track_no, name, artist))
                 else:
-                    self.tracks_db_errors += 1
-                self.cli.brainz_processed_so_far(self.processed, self.processed_total)
-                self.processed += 1
-                print("")  # space for readability
-            else:
-                print('Either track or artist name not found on '
-                      '"{}" ({}) - Track {} really existing?'.format(
-                          discogs_title, d_release_id, d_track_no))
-                self.tracks_not_found_errors += 1
+                    print('Either track or artist name not found on '
+                          '"{}" ({}) - Track {} really existing?'.format(
+                              discogs_title, d_release_id, d_track_no))
+                    self.tracks_not_found_errors += 1
                 self.cli.brainz_processed_so_far(self.processed, self.processed_total)
                 self.processed += 1
                 print("")  # space for readability
 
+            if found:  # One write for all tracks of the release
+                if self.collection.upsert_tracks(found):
+                    self.tracks_added += len(found)
+                else:
+                    self.tracks_db_errors += len(found)
+
         if offset:
             processed_real = self.processed_total - offset
         else:
@@ -746,6 +1133,7 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         print('Database errors: {}. Not found on Discogs errors: {}.'.format(
             self.tracks_db_errors, self.tracks_not_found_errors))
         print("")  # space for readability
+        self.collection.log_rate_limit_stats()
 
         self.cli.duration_stats(start_time, 'Updating track info') # print time stats
         return True # we did at least something and thus were successfull
@@ -771,97 +1159,88 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
             }]
         return self.update_tracks_from_discogs(tr_list)
 
-    def update_tracks_from_brainz(self, track_list, detail=1, offset=0):
-        # catch errors. this is a last resort check. prettier err-msgs earlier!
-        if track_list == [None] or track_list == [] or track_list == None:
-            log.error("Didn't get sufficient data for *Brainz update. Quitting.")
-            return False
-        start_time = time()
-        log.debug('CTRL: update_track_from_brainz: '
-                  'match detail option is: %s', detail)
-        if offset:
-            processed = offset
-            processed_total = len(track_list) + offset -1
-        else:
-            processed = 1
-            processed_total = len(track_list)
-        errors_not_found, errors_db, errors_no_release = 0, 0, 0
-        errors_no_rec_MB, errors_no_rec_AB, errors_not_imported = 0, 0, 0
-        added_release, added_rec, added_key, added_chords_key, added_bpm = 0, 0, 0, 0, 0
-        warns_discogs_fetches = 0
-        for track in track_list:
-            release_mbid, rec_mbid = None, None  # we are filling these
-            key, chords_key, bpm = None, None, None  # searched later, in this order
-            # d_release_id = track['d_release_id']  # from track table
-            discogs_id = track['discogs_id']  # from release table
-            d_track_no = track['d_track_no']
-            user_rec_mbid = track['m_rec_id_override']
-
-            log.info('CTRL: Trying to match Discogs release %s "%s"...',
-                     discogs_id, track['discogs_title'])
-            d_rel = self.collection.fetch_discogs_release(discogs_id) # 404 is handled here
-
-            def _warn_skipped(m):  # prints skipped-message and processed-count
-                log.warning(m)
-                self.cli.brainz_processed_so_far(processed, processed_total)
-                print('')  # space for readability
-
-            if not d_rel:
-                m = "Skipping. Cant't fetch Discogs release."
-                _warn_skipped(m)
-                processed += 1
-                continue  # jump to next track
-            else:
-                if not track['d_track_no']:  # no track number in db -> not imported
-                    # FIXME errors_not_imported
-                    m = f'Skipping. No track number for '
-                    m+= f'"{track["discogs_title"]}" in DiscoBASE.\n'
-                    m+= f'Did you import Track details from Discogs yet? (-u)'
-                    _warn_skipped(m)
-                    errors_not_imported += 1
-                    processed += 1
-                    continue  # jump to next track
-                elif not track['d_track_name']:  # no track name in db -> ask discogs
-                    # FIXME why was get_d_release needed here? it's above already???
-                    # d_rel = self.collection.get_d_release(discogs_id) # 404 is handled here
-                    log.warning('No track name in DiscoBASE, asking Discogs...')
-                    d_track_name = self.collection.d_tracklist_parse(
-                        d_rel.tracklist, track['d_track_no'])
-                    if not d_track_name:  # no track name on Discogs -> give up
-                        m = f'Skipping. Track number {track["d_track_no"]} '
-                        m+= f'not existing on release "{track["discogs_title"]}"'
-                        _warn_skipped(m)
-                        errors_not_found += 1
-                        processed += 1
-                        continue  # jump to next track
-                    print(f'Track name found on Discogs: "{d_track_name}"')
-                    warns_discogs_fetches += 1
-                else:
-                    d_track_name = track['d_track_name']  # track name in db, good
+    def match_track_brainz(self, track, d_rel, detail=1, memo=None):
+        """Matches one DiscoBASE track with MusicBrainz.
 
-                if not track['d_catno']:  # no CatNo in db -> ask discogs
-                    log.warning('No catalog number in DiscoBASE, asking Discogs...')
-                    d_catno = d_rel.labels[0].data['catno']
-                    print(f'Catalog number found on Discogs: "{d_catno}"')
-                    warns_discogs_fetches += 1
-                else:
-                    d_catno = track['d_catno']
-
-                if not track['d_artist']: # no artist name in db -> ask discogs
-                    log.warning('No artist name in DiscoBASE, asking Discogs...')
-                    d_artist = self.collection.d_artists_parse(d_rel.tracklist,
-                          d_track_no, d_rel.artists)
-                    print(f'Artist found on Discogs: "{d_artist}"')
-                    warns_discogs_fetches += 1
-                else:
-                    d_artist = track['d_artist']
+        d_rel is the Discogs release of the track, missing track details are
+        taken from it. AcousticBrainz is not asked here, see
+        prefetch_accbr_features. Returns a dict of the results. If the track
+        can't be matched at all, "skip" holds the message to show and "error"
+        the name of the error counter.
 
-                # get_discogs track number numerical
-                # print(dir(d_rel.tracklist[1]))
-                # d_rel_track_count = len(d_rel.tracklist)
-                d_track_numerical = self.collection.d_tracklist_parse_numerical(
-                    d_rel.tracklist, d_track_no)
+        memo is a dict remembering the MusicBrainz release matches between
+        calls. Consecutive tracks of the same release only run
+        match_recording against the already matched release.
+        """
+        memo = {} if memo is None else memo
+        match = {
+            "skip": None, "error": None, "notes": [], "discogs_fetches": 0,
+            "release_mbid": None, "rec_mbid": None,
+            "release_match_method": None, "rec_match_method": None,
+            "d_artist": None, "d_track_name": None,
+        }
+        discogs_id = track['discogs_id']  # from release table
+        d_track_no = track['d_track_no']
+        user_rec_mbid = track['m_rec_id_override']
+
+        log.info('CTRL: Trying to match Discogs release %s "%s"...',
+                 discogs_id, track['discogs_title'])
+        if memo.get("discogs_id") != discogs_id:  # next release
+            memo["discogs_id"] = discogs_id
+            memo["bmatches"] = {}
+        if not d_rel:
+            match["skip"] = "Skipping. Cant't fetch Discogs release."
+            return match
+        if not track['d_track_no']:  # no track number in db -> not imported
+            # FIXME errors_not_imported
+            m = f'Skipping. No track number for '
+            m+= f'"{track["discogs_title"]}" in DiscoBASE.\n'
+            m+= f'Did you import Track details from Discogs yet? (-u)'
+            match["skip"], match["error"] = m, "errors_not_imported"
+            return match
+        elif not track['d_track_name']:  # no track name in db -> ask discogs
+            log.warning('No track name in DiscoBASE, asking Discogs...')
+            d_track_name = self.collection.d_tracklist_parse(
+                d_rel.tracklist, track['d_track_no'])
+            if not d_track_name:  # no track name on Discogs -> give up
+                m = f'Skipping. Track number {track["d_track_no"]} '
+                m+= f'not existing on release "{track["discogs_title"]}"'
+                match["skip"], match["error"] = m, "errors_not_found"
+                return match
+            match["notes"].append(f'Track name found on Discogs: "{d_track_name}"')
+            match["discogs_fetches"] += 1
+        else:
+            d_track_name = track['d_track_name']  # track name in db, good
 
+        if not track['d_catno']:  # no CatNo in db -> ask discogs
+            log.warning('No catalog number in DiscoBASE, asking Discogs...')
+            d_catno = d_rel.labels[0].data['catno']
+            match["notes"].append(f'Catalog number found on Discogs: "{d_catno}"')
+            match["discogs_fetches"] += 1
+        else:
+            d_catno = track['d_catno']
+
+        if not track['d_artist']: # no artist name in db -> ask discogs
+            log.warning('No artist name in DiscoBASE, asking Discogs...')
+            d_artist = self.collection.d_artists_parse(d_rel.tracklist,
+                  d_track_no, d_rel.artists)
+            match["notes"].append(f'Artist found on Discogs: "{d_artist}"')
+            match["discogs_fetches"] += 1
+        else:
+            d_artist = track['d_artist']
+
+        # get_discogs track number numerical
+        d_track_numerical = self.collection.d_tracklist_parse_numerical(
+            d_rel.tracklist, d_track_no)
+        match["d_artist"], match["d_track_name"] = d_artist, d_track_name
+
+        # The release is searched by artist too, tracks of compilations might
+        # need their own release match.
+        bmatch = memo["bmatches"].get((d_catno, d_artist))
+        if bmatch:
+            log.info('CTRL: Release matched already, matching track only.')
+            bmatch.set_track(d_track_name, d_track_no, d_track_numerical)
+        else:
             # initialize the brainz match class here,
             # we pass it the prepared track data we'd like to match,
             # detailed modifications are done inside (strip spaces, etc)
@@ -870,93 +1249,251 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
                                   self.brainz.musicbrainz_appid,
               discogs_id, track['discogs_title'], d_catno,
               d_artist, d_track_name, d_track_no,
-              d_track_numerical)
+              d_track_numerical, accbr_cache=self.accbr_cache,
+              mb_cache=self.mb_cache, catno_normalizer=self.catno_normalizer,
+              mb_index=self.mb_index)
             # fetching of mb_releases controllable from outside
             # (reruns with different settings)
             bmatch.fetch_mb_releases(detail = detail)
-            release_mbid = bmatch.match_release()
-            if not release_mbid and not user_rec_mbid:
-                log.info('CTRL: No MusicBrainz release matches. Sorry dude!')
-            else: # Recording MBID search
-                if user_rec_mbid:
-                    rec_mbid = user_rec_mbid
-                else:
+            bmatch.match_release()
+            memo["bmatches"][(d_catno, d_artist)] = bmatch
+        match["release_mbid"] = bmatch.release_mbid
+        if not match["release_mbid"] and not user_rec_mbid:
+            log.info('CTRL: No MusicBrainz release matches. Sorry dude!')
+        else: # Recording MBID search
+            if user_rec_mbid:
+                match["rec_mbid"] = user_rec_mbid
+            else:
+                if bmatch.mb_matched_rel is None:  # once per release
                     bmatch.fetch_mb_matched_rel()
-                    rec_mbid = bmatch.match_recording()
+                match["rec_mbid"] = bmatch.match_recording()
+        match["release_match_method"] = bmatch.release_match_method
+        match["rec_match_method"] = bmatch.rec_match_method
+        return match
+
+    def record_brainz_attempt(self, discogs_id, track_no, detail, reason=None):
+        """Records a *Brainz match attempt of a track, see
+        Collection.record_brainz_attempt. MusicBrainz failures are not
+        recorded with the local MusicBrainz index, it might just lack the
+        release."""
+        if self.mb_index and reason in ("no_mb_release", "no_mb_recording"):
+            return False
+        return self.collection.record_brainz_attempt(
+            discogs_id, track_no, detail, reason)
+
+    def prefetch_accbr_features(self, matches, pool):
+        """Yields (track, match) tuples in order, with the AcousticBrainz
+        features of their recordings fetched ahead in bulk requests.
+
+        Matches are held back until enough recording MBIDs for one bulk
+        request came together, or BRAINZ_ACCBR_WINDOW matches are waiting -
+        then the recordings collected so far are requested anyway, thus
+        tracks are written steadily even if only a few of them match. The
+        request runs in pool (the AcousticBrainz lane) while the next batch
+        is collected.
+        """
+        pending = deque()  # (future, batch), future is None if nothing to fetch
+        window, rec_mbids = [], []
+        for track, match in matches:
+            window.append((track, match))
+            if match["rec_mbid"]:
+                rec_mbids.append(match["rec_mbid"])
+            if (len(rec_mbids) >= Brainz.ACCBR_BULK_SIZE
+                    or len(window) >= self.BRAINZ_ACCBR_WINDOW):
+                pending.append((pool.submit(
+                    self.brainz.fetch_accbr_features_bulk, rec_mbids
+                ) if rec_mbids else None, window))
+                window, rec_mbids = [], []
+            # Keep one request in flight, pass on finished batches right away
+            while pending and (len(pending) > 1 or pending[0][0] is None
+                               or pending[0][0].done()):
+                future, batch = pending.popleft()
+                if future:
+                    future.result()
+                yield from batch
+        if rec_mbids:
+            pending.append((pool.submit(
+                self.brainz.fetch_accbr_features_bulk, rec_mbids), window))
+        else:
+            pending.append((None, window))
+        while pending:
+            future, batch = pending.popleft()
+            if future:
+                future.result()
+            yield from batch
+
+    def update_tracks_from_brainz(self, track_list, detail=1, offset=0,
+                                  total=None, journal=None):
+        """Updates tracks from *Brainz.
+
+        track_list can be a list or a generator streaming rows from the
+        DiscoBASE. For the latter the total number of tracks (including the
+        ones skipped by offset) has to be passed as well.
+
+        Tracks flow through a pipeline with one worker lane per service:
+        their Discogs releases are fetched, then they are matched with
+        MusicBrainz, then AcousticBrainz is asked for batches of matched
+        recordings at once. Each lane keeps the rate limit of its service, so
+        a slow service doesn't stall the others. Results are written to the
+        DiscoBASE in order by this (the only writing) thread. journal
+        optionally wraps the stream of (track, match) tuples (see
+        journal_items), items are through when they are written.
+        """
+        # catch errors. this is a last resort check. prettier err-msgs earlier!
+        if (track_list == [None] or track_list == [] or track_list == None
+                or total == 0):
+            log.error("Didn't get sufficient data for *Brainz update. Quitting.")
+            return False
+        start_time = time()
+        log.debug('CTRL: update_track_from_brainz: '
+                  'match detail option is: %s', detail)
+        if total is None:
+            total = len(track_list) + offset
+        processed = offset + 1  # Tracks skipped via offset count as processed
+        processed_total = total
+        errors_not_found, errors_db, errors_no_release = 0, 0, 0
+        errors_no_rec_MB, errors_no_rec_AB, errors_not_imported = 0, 0, 0
+        added_release, added_rec, added_key, added_chords_key, added_bpm = 0, 0, 0, 0, 0
+        warns_discogs_fetches = 0
+
+        # Consecutive tracks of a release are fetched and matched once. Each
+        # memo is only used by the single thread of its lane.
+        d_memo, memo = {}, {}
+
+        def fetch_release(track):
+            if d_memo.get("discogs_id") != track['discogs_id']:
+                d_memo["discogs_id"] = track['discogs_id']
+                # 404 is handled here
+                d_memo["d_rel"] = self.collection.fetch_discogs_release(
+                    track['discogs_id'])
+            return track, d_memo["d_rel"]
+
+        def match_track(item):
+            track, d_rel = item
+            return track, self.match_track_brainz(track, d_rel, detail, memo)
+
+        lanes = worker_lanes("discogs_lane", "musicbrainz_lane",
+                             "acousticbrainz_lane")
+        # Commit in batches, a crash loses at most one batch
+        with lanes as (discogs, musicbrainz, acousticbrainz), \
+                self.collection.batch():
+            releases = self.run_lane(discogs, fetch_release, track_list,
+                                     self.BRAINZ_LANE_WINDOW)
+            matches = self.prefetch_accbr_features(
+                self.run_lane(musicbrainz, match_track, releases,
+                              self.BRAINZ_LANE_WINDOW),
+                acousticbrainz)
+            if journal:
+                matches = journal(matches)
+            for track, match in matches:
+                key, chords_key, bpm = None, None, None  # searched later, in this order
+                discogs_id = track['discogs_id']  # from release table
+                user_rec_mbid = track['m_rec_id_override']
+                release_mbid, rec_mbid = match["release_mbid"], match["rec_mbid"]
+                d_artist, d_track_name = match["d_artist"], match["d_track_name"]
+
+                if match["skip"]:
+                    log.warning(match["skip"])
+                    if match["error"] == "errors_not_imported":
+                        errors_not_imported += 1
+                    elif match["error"] == "errors_not_found":
+                        errors_not_found += 1
+                        self.record_brainz_attempt(
+                            discogs_id, track['d_track_no'], detail,
+                            "no_discogs_track")
+                    self.cli.brainz_processed_so_far(processed, processed_total)
+                    print('')  # space for readability
+                    processed += 1
+                    continue  # jump to next track
+                for note in match["notes"]:
+                    print(note)
+                warns_discogs_fetches += match["discogs_fetches"]
 
                 if rec_mbid: # we where lucky...
-                    # get accousticbrainz info
-                    key = bmatch.get_accbr_key(rec_mbid)
+                    # get accousticbrainz info, prefetched in bulk already
+                    features = self.brainz.get_accbr_features(rec_mbid)
+                    key = features["key"] if features else None
                     if key is not None: # Skip if Rec MBID not on AcBr yet
-                        chords_key = bmatch.get_accbr_chords_key(rec_mbid)
-                        bpm = bmatch.get_accbr_bpm(rec_mbid)
+                        chords_key = features["chords_key"]
+                        bpm = features["bpm"]
                     else:
-                        chords_key = None
-                        bpm = None
                         errors_no_rec_AB += 1
-                else:
+                elif release_mbid or user_rec_mbid:
                     errors_no_rec_MB += 1
-            # user reporting starts here, not in model anymore
-            # summary and save only when we have Release MBID or user_rec_mbid
-            if release_mbid or user_rec_mbid:
-                print("Adding Brainz info for track {} on {} ({})".format(
-                    track['d_track_no'],  track['discogs_title'],
-                    discogs_id))
-                print("{} - {}".format(d_artist, d_track_name))
-                if release_mbid:
-                    print("Release MBID: {}".format(release_mbid))
-                else:
-                    log.warning("No Release MBID found!!!")
+                # user reporting starts here, not in model anymore
+                # summary and save only when we have Release MBID or user_rec_mbid
+                if release_mbid or user_rec_mbid:
+                    print("Adding Brainz info for track {} on {} ({})".format(
+                        track['d_track_no'],  track['discogs_title'],
+                        discogs_id))
+                    print("{} - {}".format(d_artist, d_track_name))
+                    if release_mbid:
+                        print("Release MBID: {}".format(release_mbid))
+                    else:
+                        log.warning("No Release MBID found!!!")
 
-                if not rec_mbid:
-                    log.warning("No Recording MBID found!!!")
-                else:
-                    if user_rec_mbid:
-                        print("Recording MBID: {} (user override)".format(rec_mbid))
+                    if not rec_mbid:
+                        log.warning("No Recording MBID found!!!")
                     else:
-                        print("Recording MBID: {}".format(rec_mbid))
+                        if user_rec_mbid:
+                            print("Recording MBID: {} (user override)".format(rec_mbid))
+                        else:
+                            print("Recording MBID: {}".format(rec_mbid))
+
+                    print("Key: {}  |  Chords Key: {}  |  BPM: {}".format(
+                        key if key else '---',
+                        chords_key if chords_key else '---',
+                        bpm if bpm else '---')
+                    )
 
-                print("Key: {}  |  Chords Key: {}  |  BPM: {}".format(
-                    key if key else '---',
-                    chords_key if chords_key else '---',
-                    bpm if bpm else '---')
-                )
+                    # update release table
+                    ok_release = self.collection.update_release_brainz(discogs_id,
+                        release_mbid, match["release_match_method"])
+                    if ok_release:
+                        log.info('Release table updated successfully.')
+                        added_release += 1
+                    else:
+                        log.error('while updating release table. Continuing anyway.')
+                        errors_db += 1
+
+                    # update track and track_ext table
+                    ok_rec = self.collection.upsert_track_brainz(discogs_id,
+                        track['d_track_no'], rec_mbid, match["rec_match_method"],
+                        key, chords_key, bpm)
+
+                    if ok_rec:
+                        if rec_mbid: added_rec += 1
+                        log.info('Track table updated successfully.')
+                        if key: added_key += 1
+                        if chords_key: added_chords_key += 1
+                        if bpm: added_bpm += 1
+                        if not rec_mbid:
+                            reason = "no_mb_recording"
+                        elif key is None:
+                            reason = "no_ab_features"
+                        elif not bpm:
+                            reason = "no_ab_bpm"
+                        else:
+                            reason = None  # Matched, back-off is reset
+                        self.record_brainz_attempt(
+                            discogs_id, track['d_track_no'], detail, reason)
+                    else:
+                        log.error('while updating track table. Continuing anyway.')
+                        errors_db += 1
 
-                # update release table
-                ok_release = self.collection.update_release_brainz(discogs_id,
-                    release_mbid, bmatch.release_match_method)
-                if ok_release:
-                    log.info('Release table updated successfully.')
-                    added_release += 1
-                else:
-                    log.error('while updating release table. Continuing anyway.')
-                    errors_db += 1
-
-                # update track and track_ext table
-                ok_rec = self.collection.upsert_track_brainz(discogs_id,
-                    track['d_track_no'], rec_mbid, bmatch.rec_match_method,
-                    key, chords_key, bpm)
-
-                if ok_rec:
-                    if rec_mbid: added_rec += 1
-                    log.info('Track table updated successfully.')
-                    if key: added_key += 1
-                    if chords_key: added_chords_key += 1
-                    if bpm: added_bpm += 1
                 else:
-                    log.error('while updating track table. Continuing anyway.')
-                    errors_db += 1
-
-            else:
-                errors_no_release += 1
-                log.warning(
-                    'No Release MBID found for track %s on Discogs release "%s"',
-                    track["d_track_no"],
-                    track["discogs_title"],
-                )
-            self.cli.brainz_processed_so_far(processed, processed_total)
-            processed += 1
-            print('')  # space for readability
+                    errors_no_release += 1
+                    log.warning(
+                        'No Release MBID found for track %s on Discogs release "%s"',
+                        track["d_track_no"],
+                        track["discogs_title"],
+                    )
+                    self.record_brainz_attempt(
+                        discogs_id, track['d_track_no'], detail,
+                        "no_mb_release")
+                self.cli.brainz_processed_so_far(processed, processed_total)
+                processed += 1
+                print('')  # space for readability
 
         if offset:
             processed_real = processed_total - offset
@@ -966,18 +1503,208 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
           added_rec, added_key, added_chords_key, added_bpm, errors_db,
           errors_not_found, errors_no_rec_AB, errors_not_imported,
           warns_discogs_fetches)
+        if self.accbr_cache:
+            log.info("CTRL: AcousticBrainz cache stats: %s", self.accbr_cache.stats)
+        if self.mb_cache:
+            log.info("CTRL: MusicBrainz cache stats: %s", self.mb_cache.stats)
         self.cli.duration_stats(start_time, 'Updating track info') # print time stats
         return True  # we are through all tracks, in any way, this is a success
 
+    def import_acousticbrainz_dump(self, dump_file):
+        """Imports key, chords key and BPM from an AcousticBrainz data dump.
+
+        The dump is expected as JSON lines, one low-level document per line,
+        optionally gzip, bzip2 or xz compressed. It is streamed, only lines
+        mentioning a recording MBID known to the DiscoBASE are parsed and
+        written to the local feature index, which is asked before
+        AcousticBrainz itself during *Brainz updates.
+        """
+        start_time = time()
+        known_mbids = self.collection.get_known_rec_mbids()
+        if not known_mbids:
+            log.warning("No recording MBIDs in DiscoBASE yet. "
+                        "Run 'dsc import brainz' first.")
+            return False
+        dump_file = Path(dump_file)
+        lines_read, imported = 0, set()
+        features = []
+
+        def write_features():
+            self.collection.upsert_accbr_features(features)
+            features.clear()
+
+        progress = Progress(BarColumn(), TaskProgressColumn(), TimeElapsedColumn())
+        try:
+            with open_dump(dump_file) as (raw, dump), progress:
+                task = progress.add_task(
+                    "[cyan] Reading dump: ", total=dump_file.stat().st_size)
+                for line in dump:
+                    lines_read += 1
+                    if lines_read % 10000 == 0:
+                        progress.update(task, completed=raw.tell())
+                    # Cheap check before parsing the whole document
+                    if not any(mbid.lower() in known_mbids
+                               for mbid in MBID_REGEX.findall(line)):
+                        continue
+                    try:
+                        low_level = json.loads(line)
+                        mb_id = low_level.get("mbid") or (
+                            low_level["metadata"]["tags"]["musicbrainz_trackid"][0])
+                    except (JSONDecodeError, KeyError, IndexError, TypeError):
+                        log.debug("Skipping unparsable dump line %s", lines_read)
+                        continue
+                    mb_id = mb_id.lower()
+                    if mb_id not in known_mbids or mb_id in imported:
+                        continue  # Only the first submission of a recording
+                    parsed = Brainz._accbr_parse_features(low_level)
+                    features.append((mb_id, parsed["key"], parsed["chords_key"],
+                                     parsed["bpm"]))
+                    imported.add(mb_id)
+                    if len(features) >= 1000:
+                        write_features()
+                progress.update(task, completed=dump_file.stat().st_size)
+            write_features()
+        except (OSError, EOFError, UnicodeDecodeError, lzma.LZMAError,
+                tarfile.TarError) as err:
+            log.error("Reading AcousticBrainz dump %s: %s", dump_file, err)
+            return False
+        except sqlerr as err:
+            log.error("Writing AcousticBrainz features: %s. "
+                      "Please run 'dsc setup'.", err.args[0])
+            return False
+
+        print(f"Lines read: {lines_read}. Recordings imported: {len(imported)} "
+              f"of {len(known_mbids)} known to the DiscoBASE.")
+        self.cli.duration_stats(start_time, 'Importing AcousticBrainz dump')
+        return True
+
+    def import_musicbrainz_dump(self, dump_file):
+        """Imports releases of a MusicBrainz JSON data dump into the local
+        MusicBrainz index, used by *Brainz updates with --local-mb.
+
+        The release dump (release.tar.xz or the extracted mbdump/release file,
+        JSON lines) is streamed. Only releases linking to a release of the
+        DiscoBASE or sharing a catalog number key with one are parsed and
+        kept: their Discogs links, catalog numbers and tracks. Lines of a
+        recording dump update the titles of indexed recordings.
+        """
+        start_time = time()
+        normalizer = self.catno_normalizer or CatnoNormalizer(
+            self.user.conf.catno_rules())
+        self.collection.update_catno_keys(normalizer)
+        release_ids = self.collection.get_release_ids()
+        if not release_ids:
+            log.warning("No releases in DiscoBASE yet. "
+                        "Run 'dsc import basic' first.")
+            return False
+        catno_keys = self.collection.get_catno_keys()
+        dump_file = Path(dump_file)
+        lines_read, releases, recordings = 0, 0, 0
+
+        def relevant(line):  # Cheap checks before parsing the whole document
+            if any(int(d_id) in release_ids
+                   for d_id in DISCOGS_RELEASE_REGEX.findall(line)):
+                return True
+            if any(key in catno_keys for catno in CATNO_REGEX.findall(line)
+                   for key in normalizer.keys(catno)):
+                return True
+            return any(mbid.lower() in rec_mbids
+                       for mbid in MBID_REGEX.findall(line))
+
+        progress = Progress(BarColumn(), TaskProgressColumn(), TimeElapsedColumn())
+        try:
+            rec_mbids = self.collection.get_mb_index_rec_mbids()
+            with open_dump(dump_file, members=lambda name: name.rsplit(
+                    "/", 1)[-1] in ("release", "recording")) as (raw, dump), \
+                    progress, self.collection.batch():
+                task = progress.add_task(
+                    "[cyan] Reading dump: ", total=dump_file.stat().st_size)
+                for line in dump:
+                    lines_read += 1
+                    if lines_read % 1000 == 0:
+                        progress.update(task, completed=raw.tell())
+                    if not relevant(line):
+                        continue
+                    try:
+                        doc = json.loads(line)
+                    except JSONDecodeError:
+                        doc = None
+                    if not isinstance(doc, dict) or not doc.get("id"):
+                        log.debug("Skipping unparsable dump line %s", lines_read)
+                        continue
+                    if "media" not in doc:  # A recording
+                        if doc["id"] in rec_mbids and doc.get("title"):
+                            self.collection.update_mb_index_recordings(
+                                [(doc["title"], doc["id"])])
+                            recordings += 1
+                        continue
+                    release = MusicBrainzIndex.parse_release(doc, normalizer)
+                    if not (release_ids.intersection(release["d_release_ids"])
+                            or catno_keys.intersection(
+                                key for key, _ in release["catnos"])):
+                        continue
+                    self.collection.upsert_mb_index_release(release)
+                    releases += 1
+                progress.update(task, completed=dump_file.stat().st_size)
+        except (OSError, EOFError, UnicodeDecodeError, lzma.LZMAError,
+                tarfile.TarError) as err:
+            log.error("Reading MusicBrainz dump %s: %s", dump_file, err)
+            return False
+        except sqlerr as err:
+            log.error("Writing local MusicBrainz index: %s. "
+                      "Please run 'dsc setup'.", err.args[0])
+            return False
+
+        print(f"Lines read: {lines_read}. Releases imported: {releases}. "
+              f"Recordings updated: {recordings}.")
+        self.cli.duration_stats(start_time, 'Importing MusicBrainz dump')
+        return True
+
     def update_all_tracks_from_brainz(self, detail=1, offset=0, force=False,
-                                      skip_unmatched=False):
+                                      skip_unmatched=False, resume=False,
+                                      retry_failed=False):
+        """Updates all tracks from *Brainz, progress is recorded in the job
+        journal. resume=True continues an unfinished run (offset is ignored
+        then). Tracks that failed to match recently are skipped, unless
+        retry_failed=True (see Config.brainz_retry_backoff)."""
         if not self.ONLINE:
             self.cli.p("Not online, can't pull from AcousticBrainz...")
             return False  # exit method we are offline
-        tracks = self.collection.get_all_tracks_for_brainz_update(
-              offset=offset, really_all=force, skip_unmatched=skip_unmatched)
-        match_ret = self.update_tracks_from_brainz(tracks, detail,
-              offset=offset)
+        offset = 0 if resume else offset
+        backoff = None if retry_failed else self.user.conf.brainz_retry_backoff()
+        if backoff:
+            backed_off = self.collection.count_all_tracks_for_brainz_update(
+                really_all=force, skip_unmatched=skip_unmatched
+            ) - self.collection.count_all_tracks_for_brainz_update(
+                really_all=force, skip_unmatched=skip_unmatched,
+                backoff=backoff, detail=detail)
+            if backed_off:
+                self.cli.p(
+                    f"Skipping {backed_off} tracks that failed to match "
+                    "recently. Use --retry-failed to try them anyway.")
+
+        def tracks():  # Streamed from the DiscoBASE, memory usage stays flat
+            return self.collection.get_all_tracks_for_brainz_update(
+                offset=offset, really_all=force, skip_unmatched=skip_unmatched,
+                iterate=True, backoff=backoff, detail=detail)
+
+        def track_key(track):
+            return f"{track['discogs_id']}/{track['d_track_no']}"
+
+        job_id, pending, done = self.start_job(
+            "import_brainz", (track_key(track) for track in tracks()), resume,
+            detail=detail, force=force, skip_unmatched=skip_unmatched,
+            retry_failed=retry_failed,
+        )
+
+        def journal(matches):  # Tracks are done when written, not when matched
+            return self.journal_items(
+                job_id, pending, matches, lambda match: track_key(match[0]))
+
+        match_ret = self.update_tracks_from_brainz(
+            (track for track in tracks() if track_key(track) in pending),
+            detail, offset=offset + done, total=offset + done + len(pending),
+            journal=journal)
         return match_ret
 
     def update_single_track_or_release_from_brainz(self, rel_id, rel_title,
@@ -1033,26 +1760,16 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
             raise SystemExit(1)
 
     def view_stats(self):
-        self.cli.tab_stats(
-            self.collection.stats_releases_total(),
-            self.collection.stats_releases_matched(),
-            self.collection.stats_tracks_total(),
-            self.collection.stats_tracks_matched(),
-            self.collection.stats_collection_items_discobase(),
-            self.collection.stats_collection_items_discogs(),
-            self.collection.stats_sales_listings_discobase(),
-            self.collection.stats_sales_listings_discogs(),
-            self.collection.stats_sales_listings_forsale(),
-            self.collection.stats_sales_listings_sold(),
-            self.collection.stats_sales_price_average(),
-            self.collection.stats_sales_price_average_lower(),
-            self.collection.stats_mixtracks_total(),
-            self.collection.stats_mixtracks_unique(),
-            self.collection.stats_tracks_key_brainz(),
-            self.collection.stats_tracks_key_manual(),
-            self.collection.stats_tracks_bpm_brainz(),
-            self.collection.stats_tracks_bpm_manual(),
-        )
+        stats = self.collection.stats_overview()
+        if self.collection.ONLINE:
+            stats['collection_items_discogs'] = (
+                self.collection.stats_collection_items_discogs())
+            stats['sales_listings_discogs'] = (
+                self.collection.stats_sales_listings_discogs())
+        else:
+            stats['collection_items_discogs'] = '-'
+            stats['sales_listings_discogs'] = '-'
+        self.cli.tab_stats(**stats)
 
     # Sales import
 
@@ -1123,7 +1840,7 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         self.print_import_sales_notes()
         total_items = len(self.collection.me.inventory)
 
-        with custom_progress:
+        with custom_progress, self.collection.batch():
             task = custom_progress.add_task(
                 "[cyan] Status: ",
                 total=total_items,
@@ -1527,14 +2244,29 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
 
     # Cleanup
 
-    def cleanup_sales_inventory(self, offset=0):
-        """Cleanup sales inventory"""
+    def cleanup_sales_inventory(self, offset=0, resume=False):
+        """Cleanup sales inventory
+
+        Progress is recorded in the job journal, resume=True continues an
+        unfinished run (offset is ignored then).
+        """
         start_time = time()
         orphaned_entries =  0
         self.cli.exit_if_offline(self.collection.ONLINE)
         self.cli.p("Cleaning up DiscoBASE sales inventory...")
-        total_items = self.collection.stats_sales_items_total()
-        sales = self.collection.get_sales_inventory(offset)
+        offset = 0 if resume else offset
+        job_id, pending, done = self.start_job(
+            "clean_sales",
+            (row["d_sales_listing_id"] for row in
+             self.collection.get_sales_inventory(offset, iterate=True)),
+            resume,
+        )
+        offset += done
+        total_items = offset + len(pending)
+        sales = self.journal_items(
+            job_id, pending, self.collection.get_sales_inventory(0, iterate=True),
+            lambda row: row["d_sales_listing_id"],
+        )
 
         console = Console()
         adapted_progress = Progress(
@@ -1577,37 +2309,23 @@ class CollectionControlCommandline (ControlCommon, CollectionControlCommon):
         self.cli.exit_if_offline(self.collection.ONLINE)
         self.cli.p("Cleaning up the DiscoBASE release table...")
         # total_items = self.collection.stats_releases_total()
-        collection = self.collection.get_all_db_releases(offset, as_dict=True)
+        # One anti-join query instead of three lookups per release
+        orphaned = self.collection.get_orphaned_releases(
+            offset=offset, iterate=True
+        )
 
         print(
             "The following releases are not used in any [yellow]sales listing, mix or "
             "collection item[/] and can be safely deleted:\n"
         )
-        for row in collection:
-            coll_existing = self.collection.get_collection_items_by_release(
-                row["discogs_id"],
-                quiet=True,
-            )
-            listing_existing = self.collection.get_sales_listings_by_release(
-                row["discogs_id"],
-                quiet=True,
-            )
-            mix_tracks_existing = self.collection.get_mix_tracks_by_release(
-                row["discogs_id"],
-                quiet=True,
-            )
-            if (
-                not coll_existing
-                and not listing_existing
-                and not mix_tracks_existing
-            ):
-                orphaned_entries += 1
-                entry = " - ".join([str(value) for value in row.values()])
-                print(f"\n{entry}")
-                print(self.cli.link_to("discogs release", row["discogs_id"]))
-                confirm = Confirm.ask("Delete?", default=False)
-                if confirm:
-                    self.collection.delete_release(row["discogs_id"])
+        for row in orphaned:
+            orphaned_entries += 1
+            entry = " - ".join([str(value) for value in row.values()])
+            print(f"\n{entry}")
+            print(self.cli.link_to("discogs release", row["discogs_id"]))
+            confirm = Confirm.ask("Delete?", default=False)
+            if confirm:
+                self.collection.delete_release(row["discogs_id"])
 
         print(f"Orphaned entries found: {orphaned_entries}.")
         self.cli.duration_stats(start_time, 'Release table cleanup')
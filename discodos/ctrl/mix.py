@@ -24,7 +24,8 @@ class MixControlCommandline (ControlCommon, MixControlCommon):
     def __init__(self, db_conn, mix_name_or_id, _user_int, db_file = False):
         self.user = _user_int # take an instance of the User_int class and set as attribute
         self.cli = MixViewCommandline() # instantiatie the Mix view class (the CLI)
-        self.mix = Mix(db_conn, mix_name_or_id, db_file) # instantiate the Mix model class
+        pragmas = self.user.conf.db_profile(self.user.DB_PROFILE)
+        self.mix = Mix(db_conn, mix_name_or_id, db_file, pragmas=pragmas) # instantiate the Mix model class
         if self.mix.db_not_found == True:
             self.cli.ask('Setting up DiscoBASE, press enter...')
             super(MixControlCommandline, self).setup_db(db_file)
@@ -200,13 +201,15 @@ class MixControlCommandline (ControlCommon, MixControlCommon):
 
     def delete_track(self, delete_track_pos):
         if self.cli.really_delete_track(delete_track_pos, self.mix.name):
-             successful = self.mix.delete_track(delete_track_pos)
-             # reorder existing and print tracklist
+             with self.mix.batch():  # delete and reorder in one transaction
+                 successful = self.mix.delete_track(delete_track_pos)
+                 # reorder existing and print tracklist
+                 if successful:
+                     if delete_track_pos == 1:
+                        self.mix.reorder_tracks(1)
+                     else:
+                        self.mix.reorder_tracks(delete_track_pos - 1)
              if successful:
-                 if delete_track_pos == 1:
-                    self.mix.reorder_tracks(1)
-                 else:
-                    self.mix.reorder_tracks(delete_track_pos - 1)
                  self.view()
              else:
                  self.cli.p("Delete failed, maybe nonexistent track position?")
@@ -256,12 +259,13 @@ class MixControlCommandline (ControlCommon, MixControlCommon):
                 tracks_to_shift = self.mix.get_tracks_from_position(_pos)
                 if self.cli.really_add_track(track_to_add, _release_title,
                                              self.mix.id, _pos):
-                    current_id = self.mix.add_track(_release_id,
-                                                    track_to_add, track_pos = _pos)
-                    # all good? reorder tracks
-                    if current_id:
-                        log.info("Add track to mix successful, now reordering ...")
-                        self.mix.reorder_tracks_squeeze_in(_pos, tracks_to_shift)
+                    with self.mix.batch():  # add and reorder in one transaction
+                        current_id = self.mix.add_track(_release_id,
+                                                        track_to_add, track_pos = _pos)
+                        # all good? reorder tracks
+                        if current_id:
+                            log.info("Add track to mix successful, now reordering ...")
+                            self.mix.reorder_tracks_squeeze_in(_pos, tracks_to_shift)
                 else:
                     print("Track not added.")
                     return True
@@ -315,9 +319,9 @@ class MixControlCommandline (ControlCommon, MixControlCommon):
         if offset:
             update_ret = coll_ctrl.update_tracks_from_discogs(mixed_tracks,
               offset)
-        else:
+        else:  # Tracks before start_pos count as processed
             update_ret = coll_ctrl.update_tracks_from_discogs(mixed_tracks,
-              start_pos)
+              max(start_pos - 1, 0))
 
         return update_ret
 
@@ -341,9 +345,9 @@ class MixControlCommandline (ControlCommon, MixControlCommon):
         if offset:
             match_ret = coll_ctrl.update_tracks_from_brainz(mixed_tracks,
               detail, offset)
-        else:
+        else:  # Tracks before start_pos count as processed
             match_ret = coll_ctrl.update_tracks_from_brainz(mixed_tracks,
-              detail, start_pos)
+              detail, max(start_pos - 1, 0))
 
         return match_ret
 
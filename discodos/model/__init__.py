@@ -3,6 +3,10 @@ from discodos.model.mix import Mix
 from discodos.model.brainz import Brainz
 from discodos.model.brainz_match import Brainz_match
 from discodos.model.discogs import DiscogsMixin
+from discodos.model.discogs_cache import DiscogsCache
+from discodos.model.brainz_cache import AcousticBrainzCache, MusicBrainzCache
+from discodos.model.catno import CatnoNormalizer
+from discodos.model.brainz_index import MusicBrainzIndex
 
 __ALL__ = [
     Collection,
@@ -10,4 +14,9 @@ __ALL__ = [
     Brainz,
     Brainz_match,
     DiscogsMixin,
+    DiscogsCache,
+    AcousticBrainzCache,
+    MusicBrainzCache,
+    CatnoNormalizer,
+    MusicBrainzIndex,
 ]
\ No newline at end of file
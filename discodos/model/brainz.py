@@ -6,17 +6,36 @@ import requests.exceptions
 import musicbrainzngs as m
 from musicbrainzngs import WebServiceError
 
+from discodos.model.brainz_cache import AcousticBrainzCache, MusicBrainzCache
+from discodos.model.discogs_ratelimit import RateLimiter
+
 log = logging.getLogger('discodos')
 
 
 class Brainz (object):
+    ACCBR_URL = "https://acousticbrainz.org/api/v1"
+    ACCBR_BULK_SIZE = 25  # Max. recordings per AcousticBrainz bulk request
+    ACCBR_RATE_LIMIT = 60  # requests per minute
+    ACCBR_BURST = 10  # AcousticBrainz allows 10 requests per 10 seconds
 
-    def __init__(self, musicbrainz_user, musicbrainz_pass, musicbrainz_appid):
+    def __init__(self, musicbrainz_user, musicbrainz_pass, musicbrainz_appid,
+                 accbr_cache=None, mb_cache=None, mb_index=None):
         self.ONLINE = False
+        # Shared between instances to fetch each recording only once
+        self.accbr_cache = accbr_cache if accbr_cache else AcousticBrainzCache()
+        self.mb_cache = mb_cache if mb_cache else MusicBrainzCache()
+        # MusicBrainz requests are paced by musicbrainzngs itself
+        self.accbr_rate_limiter = RateLimiter(
+            rate_limit=self.ACCBR_RATE_LIMIT, burst=self.ACCBR_BURST
+        )
         self.musicbrainz_user = musicbrainz_user
         self.musicbrainz_password = musicbrainz_pass
         self.musicbrainz_appid = musicbrainz_appid
-        if self.musicbrainz_connect(musicbrainz_user, musicbrainz_pass, musicbrainz_appid):
+        # Local MusicBrainz index, releases are looked up offline then
+        self.mb_index = mb_index
+        if mb_index:
+            log.debug("MODEL: Brainz class uses the local MusicBrainz index.")
+        elif self.musicbrainz_connect(musicbrainz_user, musicbrainz_pass, musicbrainz_appid):
             self.ONLINE = True
             log.debug("MODEL: Brainz class is ONLINE.")
 
@@ -38,8 +57,13 @@ class Brainz (object):
             return False
 
     def get_mb_artist_by_id(self, mb_id):
+        cached = self.mb_cache.get("artist", mb_id)
+        if cached:
+            return cached
         try:
-            return m.get_artist_by_id(mb_id, [])
+            mb_artist = m.get_artist_by_id(mb_id, [])
+            self.mb_cache.store("artist", mb_id, mb_artist)
+            return mb_artist
         except WebServiceError as exc:
             log.error("requesting data from MusicBrainz: %s (WebServiceError)" % exc)
             log.debug("MODELS: get_mb_artist_by_id returns False.")
@@ -51,17 +75,25 @@ class Brainz (object):
 
     def search_mb_releases(self, artist, album, cat_no=False,
                            limit=10, strict=False):
+        search_key = json.dumps([artist, album, cat_no, limit, strict])
+        cached = self.mb_cache.get("release-search", search_key)
+        if cached:
+            return cached
         try:
             if cat_no:
-                return m.search_releases(
+                mb_releases = m.search_releases(
                     artist=artist, release=album,
                     catno=cat_no, limit=limit, strict=strict
                 )
             else:
-                return m.search_releases(
+                mb_releases = m.search_releases(
                     artist=artist, release=album,
                     limit=limit, strict=strict
                 )
+            # Search results change more often, keep them for this run only
+            self.mb_cache.store("release-search", search_key, mb_releases,
+                                persist=False)
+            return mb_releases
         except WebServiceError as exc:
             log.error(
                 "requesting data from MusicBrainz: %s (WebServiceError)" % exc
@@ -74,14 +106,21 @@ class Brainz (object):
             return {}
 
     def get_mb_release_by_id(self, mb_id):
+        if self.mb_index:
+            return self.mb_index.get_release(mb_id)
+        cached = self.mb_cache.get("release", mb_id)
+        if cached:
+            return cached
         try:
-            return m.get_release_by_id(
+            mb_release = m.get_release_by_id(
                 mb_id, includes=[
                     "release-groups",
                     "artists", "labels", "url-rels", "recordings",
                     "recording-rels", "recording-level-rels"
                 ]
             )
+            self.mb_cache.store("release", mb_id, mb_release)
+            return mb_release
         except WebServiceError as websvcerr:
             log.error("requesting data from MusicBrainz: %s (WebServiceError)" % websvcerr)
             log.debug("MODELS: get_mb_release_by_id returns empty dict.")
@@ -92,10 +131,15 @@ class Brainz (object):
             return {}
 
     def get_mb_recording_by_id(self, mb_id):
+        cached = self.mb_cache.get("recording", mb_id)
+        if cached:
+            return cached
         try:
-            return m.get_recording_by_id(
+            mb_recording = m.get_recording_by_id(
                 mb_id, includes=["url-rels"]
             )
+            self.mb_cache.store("recording", mb_id, mb_recording)
+            return mb_recording
         except WebServiceError as exc:
             log.error("requesting data from MusicBrainz: %s (WebServiceError)" % exc)
             log.debug("MODELS: get_mb_recording_by_id returns False.")
@@ -121,7 +165,8 @@ class Brainz (object):
 
     def _get_accousticbrainz(self, urlpart):
         headers={'Accept': 'application/json'}
-        url="https://acousticbrainz.org/api/v1/{}".format(urlpart)
+        url="{}/{}".format(self.ACCBR_URL, urlpart)
+        self.accbr_rate_limiter.acquire()
         try:
             resp = requests.get(url, headers=headers, timeout=7)
             resp.raise_for_status()
@@ -152,38 +197,111 @@ class Brainz (object):
         # pprint.pprint(low_level)
         return low_level
 
+    def _get_accbr_low_level_bulk(self, mb_ids):
+        """Fetches low-level data of up to ACCBR_BULK_SIZE recordings at once.
+
+        Returns a dict of MBID to low-level data, recordings missing on
+        AcousticBrainz are left out. None if the request failed.
+        """
+        ab_return = self._get_accousticbrainz(
+            "low-level?recording_ids={}".format(";".join(mb_ids)))
+        if ab_return is None:
+            return None
+        # Redirected MBIDs are answered with their canonical MBID
+        mapping = ab_return.get("mbid_mapping", {})
+        low_levels = {}
+        for mb_id in mb_ids:
+            submissions = ab_return.get(mb_id) or ab_return.get(mapping.get(mb_id))
+            if submissions and "0" in submissions:
+                low_levels[mb_id] = submissions["0"]
+        return low_levels
+
     def _get_accbr_high_level(self, mb_id):
         return self._get_accousticbrainz("{}/high-level".format(mb_id))
 
     # def _get_accbr_url_rels(self, )
 
-    def get_accbr_bpm(self, mb_id):
+    def get_accbr_features(self, mb_id):
+        """Returns key, chords key and BPM of a recording as a dict.
+
+        All three come from one low-level request, cached in accbr_cache.
+        Returns None if the recording is missing on AcousticBrainz.
+        """
+        features = self.accbr_cache.get(mb_id)
+        if features:
+            return features
+        if self.accbr_cache.is_missing(mb_id):
+            return None
+        ab_return = self._get_accbr_low_level(mb_id)
+        if ab_return is None:  # Missing or connection problems, not cached
+            return None
+        features = self._accbr_parse_features(ab_return)
+        self.accbr_cache.store(mb_id, features)
+        return features
+
+    def fetch_accbr_features_bulk(self, mb_ids):
+        """Fetches key, chords key and BPM of many recordings into accbr_cache.
+
+        Only recordings not cached yet are requested, ACCBR_BULK_SIZE per
+        request. Returns the number of recordings found on AcousticBrainz.
+        """
+        todo = list(dict.fromkeys(
+            mb_id for mb_id in mb_ids
+            if not self.accbr_cache.is_missing(mb_id)
+            and not self.accbr_cache.get(mb_id)
+        ))
+        found = 0
+        for start in range(0, len(todo), self.ACCBR_BULK_SIZE):
+            chunk = todo[start:start + self.ACCBR_BULK_SIZE]
+            low_levels = self._get_accbr_low_level_bulk(chunk)
+            if low_levels is None:  # Single lookups will try again later
+                continue
+            self.accbr_cache.store_many({
+                mb_id: self._accbr_parse_features(low_level)
+                for mb_id, low_level in low_levels.items()
+            })
+            for mb_id in chunk:
+                if mb_id not in low_levels:
+                    self.accbr_cache.store_missing(mb_id)
+            found += len(low_levels)
+        log.debug("MODEL: fetch_accbr_features_bulk: %s of %s found.",
+                  found, len(todo))
+        return found
+
+    @classmethod
+    def _accbr_parse_features(cls, ab_return):
+        return {
+            "key": cls._accbr_parse_key(ab_return, "key"),
+            "chords_key": cls._accbr_parse_key(ab_return, "chords"),
+            "bpm": cls._accbr_parse_bpm(ab_return),
+        }
+
+    @staticmethod
+    def _accbr_parse_bpm(ab_return):
         try:
-            ab_return = self._get_accbr_low_level(mb_id)
             return ab_return['rhythm']['bpm']
         except:
             return None
 
-    def get_accbr_key(self, mb_id):
+    @staticmethod
+    def _accbr_parse_key(ab_return, prefix):
         try:
-            ab_return = self._get_accbr_low_level(mb_id)
-            if ab_return['tonal']['key_scale'] == 'minor':
+            if ab_return['tonal']['{}_scale'.format(prefix)] == 'minor':
                 majmin = 'm'
             else:
                 majmin = ''
-            key_key = '{}{}'.format(ab_return['tonal']['key_key'], majmin)
-            return key_key
+            return '{}{}'.format(ab_return['tonal']['{}_key'.format(prefix)], majmin)
         except:
             return None
 
+    def get_accbr_bpm(self, mb_id):
+        features = self.get_accbr_features(mb_id)
+        return features["bpm"] if features else None
+
+    def get_accbr_key(self, mb_id):
+        features = self.get_accbr_features(mb_id)
+        return features["key"] if features else None
+
     def get_accbr_chords_key(self, mb_id):
-        try:
-            ab_return = self._get_accbr_low_level(mb_id)
-            if ab_return['tonal']['chords_scale'] == 'minor':
-                majmin = 'm'
-            else:
-                majmin = ''
-            chords_key = '{}{}'.format(ab_return['tonal']['chords_key'], majmin)
-            return chords_key
-        except:
-            return None
+        features = self.get_accbr_features(mb_id)
+        return features["chords_key"] if features else None
@@ -0,0 +1,214 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from time import time
+
+log = logging.getLogger('discodos')
+
+
+class BrainzCache():
+    """Base of the *Brainz caches: an in-process LRU, optionally backed by a
+    single table SQLite database next to the DiscoBASE.
+
+    Subclasses define the table (TABLE, TABLE_SQL), the LRU size and the time
+    to live of stored entries (TTL, None means entries never expire). With
+    refresh=True the cache database is not read, only written.
+    """
+    TABLE = None
+    TABLE_SQL = None
+    LRU_SIZE = 256
+    TTL = None
+
+    def __init__(self, cache_file=None, ttl=None, refresh=False,
+                 lru_size=None):
+        self.ttl = ttl if ttl is not None else self.TTL
+        self.refresh = refresh  # Ignore entries in the cache database
+        self.lru_size = lru_size or self.LRU_SIZE
+        self.lru = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self.db_conn = None
+        if cache_file:
+            self.db_conn = sqlite3.connect(
+                str(cache_file), check_same_thread=False
+            )
+            self.db_conn.execute("PRAGMA journal_mode = WAL")
+            self.db_conn.execute(self.TABLE_SQL)
+            self.db_conn.commit()
+        log.debug("%s: Using %s, TTL: %s", self.__class__.__name__,
+                  cache_file or "memory only", self.ttl)
+
+    def _remember(self, cache_key, value):
+        with self._lock:
+            self.lru[cache_key] = value
+            self.lru.move_to_end(cache_key)
+            while len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    def _recall(self, cache_key):
+        """Returns a value from the LRU or None."""
+        with self._lock:
+            if cache_key in self.lru:
+                self.lru.move_to_end(cache_key)
+                self.stats["hits"] += 1
+                return self.lru[cache_key]
+        return None
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _fetch_row(self, sql, values):
+        """Returns a row from the cache database or None, counts the hit or
+        miss."""
+        with self._lock:
+            row = None
+            if self.db_conn and not self.refresh:
+                row = self.db_conn.execute(sql, values).fetchone()
+            self.stats["misses" if row is None else "hits"] += 1
+        return row
+
+    def _write_rows(self, sql, rows):
+        if not self.db_conn or not rows:
+            return
+        with self._lock:
+            self.db_conn.executemany(sql, rows)
+            self.db_conn.commit()
+
+    def _fresh_since(self):
+        """Entries fetched before this timestamp are expired."""
+        return time() - self.ttl if self.ttl is not None else 0
+
+    def purge_expired(self):
+        """Deletes expired entries from the cache database."""
+        if not self.db_conn or self.ttl is None:
+            return 0
+        with self._lock:
+            cur = self.db_conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE fetched_at <= ?",
+                (self._fresh_since(),)
+            )
+            self.db_conn.commit()
+        return cur.rowcount
+
+
+class AcousticBrainzCache(BrainzCache):
+    """Fetch-once layer for AcousticBrainz features of a recording.
+
+    Key, chords key and BPM are extracted from one low-level document and
+    kept in the LRU and optionally in the cache database. AcousticBrainz is
+    frozen, thus entries never expire; refresh=True fetches them again
+    anyway. local_index is an optional callable returning the features of a
+    recording from an imported AcousticBrainz dump (or None), it is asked
+    before the cache database, also when refreshing.
+    """
+    TABLE = "accbr_features"
+    TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS accbr_features (
+            rec_mbid TEXT NOT NULL,
+            key TEXT,
+            chords_key TEXT,
+            bpm REAL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (rec_mbid)
+        )"""
+    LRU_SIZE = 1024
+
+    def __init__(self, cache_file=None, lru_size=None, local_index=None,
+                 refresh=False):
+        super().__init__(cache_file, refresh=refresh, lru_size=lru_size)
+        self.local_index = local_index
+        self.missing = set()  # Not on AcousticBrainz, this session only
+
+    def get(self, mb_id):
+        """Returns the features dict of a recording or None."""
+        features = self._recall(mb_id)
+        if features is not None:
+            return features
+        features = self.local_index(mb_id) if self.local_index else None
+        if features:
+            self._count("hits")
+            self._remember(mb_id, features)
+            return features
+        row = self._fetch_row(
+            "SELECT key, chords_key, bpm FROM accbr_features "
+            "WHERE rec_mbid = ?", (mb_id,)
+        )
+        if row is None:
+            return None
+        features = {"key": row[0], "chords_key": row[1], "bpm": row[2]}
+        self._remember(mb_id, features)
+        return features
+
+    def store(self, mb_id, features):
+        self.store_many({mb_id: features})
+
+    def store_many(self, features_by_id):
+        """Stores a dict of recording MBID to features dict."""
+        for mb_id, features in features_by_id.items():
+            self._remember(mb_id, features)
+        now = time()
+        self._write_rows(
+            "INSERT OR REPLACE INTO accbr_features "
+            "(rec_mbid, key, chords_key, bpm, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(mb_id, features["key"], features["chords_key"],
+              features["bpm"], now)
+             for mb_id, features in features_by_id.items()]
+        )
+
+    def store_missing(self, mb_id):
+        with self._lock:
+            self.missing.add(mb_id)
+
+    def is_missing(self, mb_id):
+        return mb_id in self.missing
+
+
+class MusicBrainzCache(BrainzCache):
+    """Cache of MusicBrainz lookups, shared by all Brainz objects of a run.
+
+    Looked up entities (releases, recordings, artists) are kept in the LRU,
+    so each candidate release is fetched at most once per match run.
+    Optionally they are also stored in the cache database and reused for TTL
+    seconds. Search results are only kept in memory.
+    """
+    TABLE = "mb_cache"
+    TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS mb_cache (
+            entity TEXT NOT NULL,
+            key TEXT NOT NULL,
+            content TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (entity, key)
+        )"""
+    LRU_SIZE = 256  # Full releases with recordings can be large
+    TTL = 7 * 86400
+
+    def get(self, entity, key):
+        """Returns a cached lookup result or None."""
+        value = self._recall((entity, key))
+        if value is not None:
+            return value
+        row = self._fetch_row(
+            "SELECT content FROM mb_cache "
+            "WHERE entity = ? AND key = ? AND fetched_at > ?",
+            (entity, key, self._fresh_since())
+        )
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        self._remember((entity, key), value)
+        return value
+
+    def store(self, entity, key, value, persist=True):
+        self._remember((entity, key), value)
+        if not persist:
+            return
+        self._write_rows(
+            "INSERT OR REPLACE INTO mb_cache "
+            "(entity, key, content, fetched_at) VALUES (?, ?, ?, ?)",
+            [(entity, key, json.dumps(value), time())]
+        )
@@ -0,0 +1,100 @@
+import logging
+import re
+import threading
+
+log = logging.getLogger('discodos')
+
+DISCOGS_RELEASE_URL = "https://www.discogs.com/release/{}"
+DISCOGS_RELEASE_REGEX = re.compile(r"discogs\.com/release/(\d+)")
+
+
+class MusicBrainzIndex():
+    """Offline stand-in for the MusicBrainz release lookups of Brainz_match.
+
+    Releases are imported from a MusicBrainz JSON data dump into the
+    DiscoBASE (see CollectionControlCommandline.import_musicbrainz_dump).
+    Lookups are answered in the shape musicbrainzngs returns them, thus the
+    match methods work unchanged. collection should have a connection of its
+    own, the index is used from the MusicBrainz lane of brainz updates.
+    """
+    LIMIT = 10  # Max. candidate releases per search
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = threading.Lock()
+
+    def search_releases(self, d_release_id, catno_keys, limit=LIMIT):
+        """Returns releases linking to a Discogs release or sharing one of the
+        catalog number keys, like musicbrainzngs.search_releases."""
+        with self._lock:
+            rows = self.collection.get_mb_index_candidates(
+                d_release_id, catno_keys, limit)
+        return {
+            "release-list": [{"id": row["m_rel_id"], "title": row["m_rel_title"]}
+                             for row in rows],
+            "release-count": len(rows),
+        }
+
+    def get_release(self, m_rel_id):
+        """Returns a release like musicbrainzngs.get_release_by_id with labels,
+        url-rels and recordings included. Empty dict if not in the index."""
+        with self._lock:
+            release = self.collection.get_mb_index_release(m_rel_id)
+        if not release:
+            return {}
+        media = {}
+        for track in release["tracks"]:
+            media.setdefault(track["medium_pos"], []).append({
+                "position": str(track["track_pos"]),
+                "number": track["track_number"] or str(track["track_pos"]),
+                "recording": {"id": track["m_rec_id"],
+                              "title": track["m_rec_title"]},
+            })
+        return {"release": {
+            "id": release["m_rel_id"],
+            "title": release["m_rel_title"],
+            "label-info-list": [{"catalog-number": catno}
+                                for catno in release["catnos"]],
+            "url-relation-list": [
+                {"type": "discogs",
+                 "target": DISCOGS_RELEASE_URL.format(d_release_id)}
+                for d_release_id in release["d_release_ids"]],
+            "medium-list": [{"position": str(position), "track-list": tracks}
+                            for position, tracks in sorted(media.items())],
+        }}
+
+    @staticmethod
+    def parse_release(doc, normalizer):
+        """Extracts what matching needs from a release of the JSON dump.
+
+        Returns a dict as expected by Collection.upsert_mb_index_release.
+        """
+        d_release_ids = set()
+        for relation in doc.get("relations") or []:
+            resource = (relation.get("url") or {}).get("resource", "")
+            found = DISCOGS_RELEASE_REGEX.search(resource)
+            if relation.get("type") == "discogs" and found:
+                d_release_ids.add(int(found.group(1)))
+        catnos = {}
+        for label_info in doc.get("label-info") or []:
+            catno = label_info.get("catalog-number")
+            for key in normalizer.keys(catno):
+                catnos.setdefault(key, catno)
+        tracks = []
+        for medium_pos, medium in enumerate(doc.get("media") or [], 1):
+            for track_pos, track in enumerate(medium.get("tracks") or [], 1):
+                recording = track.get("recording") or {}
+                tracks.append((
+                    medium.get("position") or medium_pos,
+                    track.get("position") or track_pos,
+                    track.get("number"),
+                    recording.get("id"),
+                    recording.get("title") or track.get("title"),
+                ))
+        return {
+            "m_rel_id": doc["id"],
+            "m_rel_title": doc.get("title"),
+            "d_release_ids": sorted(d_release_ids),
+            "catnos": list(catnos.items()),
+            "tracks": tracks,
+        }
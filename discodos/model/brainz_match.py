@@ -1,8 +1,8 @@
 import logging
 # import pprint
-import re
 
 from discodos.model import Brainz
+from discodos.model.catno import CatnoNormalizer
 
 log = logging.getLogger('discodos')
 
@@ -13,33 +13,48 @@ class Brainz_match (Brainz):  # we are based on Brainz, but it's not online
 
     def __init__(self, mb_user, mb_pass, mb_appid,
                  d_release_id, d_release_title, d_catno, d_artist, d_track_name,
-                 d_track_no, d_track_no_num, detail=1):
+                 d_track_no, d_track_no_num, detail=1, accbr_cache=None,
+                 mb_cache=None, catno_normalizer=None, mb_index=None):
         # FIXME we take mb credentials from passed coll_ctrl object
-        super().__init__(mb_user, mb_pass, mb_appid)
+        super().__init__(mb_user, mb_pass, mb_appid, accbr_cache=accbr_cache,
+                         mb_cache=mb_cache, mb_index=mb_index)
         # we don't need to create a Brainz obj, we are a child of it
         # remember all original discogs names
         self.d_release_id_orig = d_release_id
         self.d_release_title_orig = d_release_title
         self.d_catno_orig = d_catno
         self.d_artist_orig = d_artist
-        self.d_track_name_orig = d_track_name
-        self.d_track_no_orig = d_track_no
-        self.d_track_no_num_orig = d_track_no_num
         # self.detail = detail
         # match methods and times init
         self.release_match_method = ''
         self.release_mbid = ''
-        self.rec_match_method = ''
-        self.rec_mbid = ''
+        self.mb_matched_rel = None
         # strip and lowercase here already, we need it all the time
         self.d_release_id = d_release_id  # no mods here, just streamlining
         self.d_release_title = d_release_title.lower()
         # self.d_catno = d_catno.upper().replace(' ', '') # exp. with upper here
         self.d_catno = d_catno.upper().replace(' ', '')
+        self.catno_normalizer = (catno_normalizer if catno_normalizer
+                                 else CatnoNormalizer())
+        self.d_catno_keys = self.catno_normalizer.keys(d_catno)
         if d_artist:
             self.d_artist = d_artist.lower()
         else:  # if it's None or something else
             self.d_artist = ''
+        self.set_track(d_track_name, d_track_no, d_track_no_num)
+
+    def set_track(self, d_track_name, d_track_no, d_track_no_num):
+        """Switches to another track of the same release.
+
+        The release match (and the matched MusicBrainz release) is kept, thus
+        match_recording can be run for each track of a release without
+        matching the release again.
+        """
+        self.d_track_name_orig = d_track_name
+        self.d_track_no_orig = d_track_no
+        self.d_track_no_num_orig = d_track_no_num
+        self.rec_match_method = ''
+        self.rec_mbid = ''
         self.d_track_name = d_track_name.lower()
         self.d_track_no = d_track_no.upper()  # upper comparision everywhere
         self.d_track_no_num = int(d_track_no_num)
@@ -47,7 +62,10 @@ class Brainz_match (Brainz):  # we are based on Brainz, but it's not online
     def fetch_mb_releases(self, detail):  # fetching controllable from outside
         # decide which search method is used according to detail (-z count)
         # FIXME error handling should be happening here
-        if detail < 2:  # be strict, also use _original_ data here
+        if self.mb_index:  # offline, candidates by Discogs URL and CatNo
+            self.mb_releases = self.mb_index.search_releases(
+                self.d_release_id, self.d_catno_keys)
+        elif detail < 2:  # be strict, also use _original_ data here
             log.debug('strict catno: {}'.format(self.d_catno_orig))
             log.debug('strict artist: {}'.format(self.d_artist_orig))
             log.debug('strict release: {}'.format(self.d_release_title_orig))
@@ -117,109 +135,39 @@ class Brainz_match (Brainz):  # we are based on Brainz, but it's not online
         return False
 
     def catno_match(self, variations=False):
-        '''finds Release MBID by looking through catalog numbers.'''
+        '''finds Release MBID by looking through catalog numbers.
+
+        Catalog numbers are compared by their keys (see CatnoNormalizer),
+        with variations=True also by their variant keys.
+        '''
         # reset match method var. FIXME is this the right place
         self.release_match_method = ''
         for release in self.mb_releases['release-list']:
-            # _mb_rel_id = False # this is what we are looking for
             if variations:
                 log.info('CTRL: ...CatNo-matching (variations) MB-Release:')
-                log.info('CTRL: ..."{}"'.format(release['title']))
             else:
                 log.info('CTRL: ...CatNo-matching (exact) MB-Release:')
-                log.info('CTRL: ..."{}"'.format(release['title']))
+            log.info('CTRL: ..."{}"'.format(release['title']))
             full_rel = self.get_mb_release_by_id(release['id'])
             # FIXME should we do something here if full_rel not successful?
 
             for mb_label_item in full_rel['release']['label-info-list']:
                 mb_catno_orig = self.get_catno_from_mb_label(mb_label_item)
-                mb_catno = mb_catno_orig.upper().replace(' ', '')
-                # log.debug(
-                #   'CTRL: ...MB CatNo (upper, no-ws): {}'.format(mb_catno))
-
-                if variations is False:  # this is the vanilla exact-match
-                    log.info('CTRL: ...DC CatNo: {}'.format(self.d_catno_orig))
-                    log.info('CTRL: ...MB CatNo: {}'.format(mb_catno_orig))
-                    if mb_catno == self.d_catno:
-                        self.release_match_method = 'CatNo (exact)'
-                        self._catno_match_found_msg()
-                        return release['id']
-
-                else:  # these are the variation matches
-                    # log original DC CatNo only once
-                    log.info('CTRL: ...DC CatNo: {}'.format(self.d_catno_orig))
-
-                    # start with simple "ending differences"
-                    log.info('CTRL: ...MB CatNo: {} (CD cut off)'.format(mb_catno_orig))
-                    mb_catno_last2 = mb_catno[-2:]
-                    if mb_catno_last2 == 'CD':
-                        mb_catno_cd_cut = mb_catno[:-2]
-                        if mb_catno_cd_cut == self.d_catno:
-                            self.release_match_method = 'CatNo (var 3)'
-                            self.release_mbid = release['id']
-                            self._catno_match_found_msg()
-                            return self.release_mbid
-
-                    log.info('CTRL: ...MB CatNo: {} (D cut off)'.format(mb_catno_orig))
-                    mb_catno_last1 = mb_catno[-1:]
-                    if mb_catno_last1 == 'D':
-                        mb_catno_d_cut = mb_catno[:-1]
-                        if mb_catno_d_cut == self.d_catno:
-                            self.release_match_method = 'CatNo (var 1)'
-                            self.release_mbid = release['id']
-                            self._catno_match_found_msg()
-                            return self.release_mbid
-
-                    # now the trickier stuff - char in between is different
-                    log.info(
-                        'CTRL: ...MB CatNo: {} (middle cut out)'.format(
-                            mb_catno_orig)
-                    )
-                    # FIXME extendable via config.yaml
-                    middle_terms = ['-', '#', 'D', 'CD', 'BLACK']
-                    if self._catno_has_numtail(mb_catno):
-                        for term in middle_terms:
-                            log.info('CTRL: ...trying split at: {}'.format(term))
-                            parts = self._catno_cutter(mb_catno, term)
-                            if parts['term'] == term:
-                                mb_catno_d_betw_cut = '{}{}'.format(
-                                    parts['before'], parts['after']
-                                )
-                                if mb_catno_d_betw_cut == self.d_catno:
-                                    self.release_match_method = 'CatNo (var 2)'
-                                    self.release_mbid = release['id']
-                                    self._catno_match_found_msg()
-                                    return self.release_mbid
-
-                    # we didn't find a variation and return False
-                    log.info('CTRL: ...no applicable variations found')
-                    return False
-
-    def _catno_has_numtail(self, catno):
-        numtail = re.split('[^\d]', catno)[-1]
-        log.debug('CTRL: ...catno_match_numtail return: {}'.format(numtail))
-        return numtail
-
-    def _catno_cutter(self, catno, term):
-        '''returns 3 parts of catno: before delimiter-term, the delim-term
-           and after delim-term, which _has_ to be a number'''
-        ret_dict = {}
-        # first thing: the tail is a number check, exit if not
-        numtail = re.split('[^\d]', catno)[-1]
-        if not numtail:
-            return False  # should never happen, we catch it with _catno_has_numtail
-        # before delimiter-term check
-        beforenum = re.split('[^\D]', catno)[0]
-        # log.debug('CTRL: ...catno_cutter: beforenum {}'.format(beforenum))
-        split_at_term = beforenum.split(term)
-        # log.debug('CTRL: ...catno_cutter: split_at_term {}'.format(split_at_term))
-        ret_dict['before'] = split_at_term[0]
-        ret_dict['term'] = term
-        ret_dict['after'] = numtail
-        log.debug('CTRL: ...catno_cutter: before: {}'.format(ret_dict['before']))
-        # log.debug('CTRL: ...catno_cutter: term: {}'.format(ret_dict['term']))
-        log.debug('CTRL: ...catno_cutter: after: {}'.format(ret_dict['after']))
-        return ret_dict
+                log.info('CTRL: ...DC CatNo: {}'.format(self.d_catno_orig))
+                log.info('CTRL: ...MB CatNo: {}'.format(mb_catno_orig))
+                method = self.catno_normalizer.match(
+                    self.d_catno_keys,
+                    self.catno_normalizer.keys(mb_catno_orig),
+                    variations=variations
+                )
+                if method:
+                    self.release_match_method = method
+                    self.release_mbid = release['id']
+                    self._catno_match_found_msg()
+                    return self.release_mbid
+        if variations:
+            log.info('CTRL: ...no applicable variations found')
+        return False
 
     def _catno_match_found_msg(self):
         # only show this final log line if we found a match
@@ -0,0 +1,85 @@
+import json
+import logging
+import re
+from functools import lru_cache
+
+log = logging.getLogger('discodos')
+
+
+class CatnoNormalizer():
+    """Canonical and variant keys of catalog numbers.
+
+    The canonical key is the catalog number uppercased without whitespace.
+    Variant keys are derived from it by the rules:
+
+    suffixes: A trailing term is cut off, eg. "ABC123CD" -> "ABC123".
+    middle_terms: If the catalog number ends with a number, the letters in
+        front of it are cut at the term, eg. "ABC-D123" -> "ABC123".
+
+    Each key names the release match method it stands for. Keys are computed
+    once per catalog number, Discogs and MusicBrainz catalog numbers match if
+    their keys intersect.
+    """
+    EXACT = 'CatNo (exact)'
+    SUFFIX = 'CatNo (var 1)'
+    MIDDLE = 'CatNo (var 2)'
+    SUFFIX_METHODS = {'CD': 'CatNo (var 3)'}  # Method names used since ever
+    # Overridable via config.yaml, see Config.catno_rules().
+    RULES = {
+        'suffixes': ['CD', 'D'],
+        'middle_terms': ['-', '#', 'D', 'CD', 'BLACK'],
+    }
+    CACHE_SIZE = 4096
+
+    def __init__(self, rules=None):
+        self.rules = dict(self.RULES)
+        self.rules.update(rules or {})
+        self.suffixes = [str(term).upper() for term in self.rules['suffixes']]
+        self.middle_terms = [
+            str(term).upper() for term in self.rules['middle_terms']
+        ]
+        self.keys = lru_cache(maxsize=self.CACHE_SIZE)(self._keys)
+
+    @property
+    def rules_id(self):
+        """Identifies the rules, keys stored with other rules are outdated."""
+        return json.dumps([self.suffixes, self.middle_terms])
+
+    @staticmethod
+    def canonical(catno):
+        return re.sub(r'\s+', '', catno or '').upper()
+
+    def _keys(self, catno):
+        """Returns a dict of all keys of a catalog number and their match
+        methods, the canonical key first, then the variants in rule order."""
+        canonical = self.canonical(catno)
+        if not canonical:
+            return {}
+        keys = {canonical: self.EXACT}
+        for term in self.suffixes:
+            if canonical.endswith(term) and len(canonical) > len(term):
+                keys.setdefault(canonical[:-len(term)],
+                                self.SUFFIX_METHODS.get(term, self.SUFFIX))
+        numtail = re.split(r'\D', canonical)[-1]
+        if numtail:
+            beforenum = re.split(r'\d', canonical)[0]
+            for term in self.middle_terms:
+                before = beforenum.split(term)[0]
+                if before:
+                    keys.setdefault(before + numtail, self.MIDDLE)
+        return keys
+
+    def match(self, keys, other_keys, variations=True):
+        """Returns the match method if two dicts of keys intersect, else None.
+
+        Without variations only the canonical keys are compared. Variants of
+        other_keys take precedence, it usually holds the candidate's keys.
+        """
+        for key, method in other_keys.items():
+            if key not in keys:
+                continue
+            if method == self.EXACT and keys[key] == self.EXACT:
+                return self.EXACT
+            if variations:
+                return method if method != self.EXACT else keys[key]
+        return None
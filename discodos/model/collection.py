@@ -1,10 +1,11 @@
 import logging
+from hashlib import sha1
 from sqlite3 import Error as sqlerr
 
 from discodos.model.discogs import DiscogsMixin
 from discodos.model.database import Database
 from discodos.utils import (
-    is_number, timestamp_now, SQL_ORDER_MUSICAL
+    fts_match_expr, is_number, timestamp_now, SQL_ORDER_MUSICAL
 )
 
 log = logging.getLogger('discodos')
@@ -12,16 +13,27 @@ log = logging.getLogger('discodos')
 
 class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-methods
     """Offline record collection class."""
-    def __init__(self, db_conn, db_file=False):
-        super().__init__(db_conn, db_file)
+    # Hours failed *Brainz matches are not tried again, doubled with each
+    # further failure. Overridable via config.yaml, see
+    # Config.brainz_retry_backoff().
+    BRAINZ_BACKOFF = {"hours": 24, "max_hours": 90 * 24}
+
+    def __init__(self, db_conn, db_file=False, pragmas=None):
+        super().__init__(db_conn, db_file, pragmas=pragmas)
         self.d = False
         self.me = False
         self.ONLINE = False # set True by discogs_connect method
+        self.rate_limiter = None  # set by discogs_connect method
+        self._search_index = None  # FTS5 tables existing? See search_index_available
+        self._brainz_attempts = None  # See brainz_attempts_available
 
     # Base fetchers and inserts
 
-    def get_all_db_releases(self, orderby='d_artist, discogs_title', as_dict=False):
-        return self._select_simple(
+    def get_all_db_releases(self, orderby='d_artist, discogs_title', as_dict=False,
+                            offset=0, iterate=False):
+        """Returns all releases. With iterate=True as a streaming generator."""
+        select = self.iter_rows if iterate else self._select_simple
+        return select(
             [
                 "d_catno",
                 "d_artist",
@@ -33,13 +45,16 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             "release",
             as_dict=as_dict,
             orderby=orderby,
+            offset=offset,
         )
 
     def get_track(self, release_id, track_no):
         log.info("MODEL: Returning collection track {} from release {}.".format(
             track_no, release_id))
-        where = 'track.d_release_id == {} AND track.d_track_no == "{}"'.format(
-            release_id, track_no.upper())  # we always save track_nos uppercase
+        where = {
+            'track.d_release_id': release_id,
+            'track.d_track_no': track_no.upper(),  # we always save track_nos uppercase
+        }
         join = '''track LEFT OUTER JOIN track_ext
                     ON track.d_release_id = track_ext.d_release_id
                     AND track.d_track_no = track_ext.d_track_no'''
@@ -58,13 +73,22 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
                 log.error("Not found or Database Exception: %s\n", Exc)
                 raise Exc
         else:
+            match = fts_match_expr(id_or_title, ['artist', 'title'])
             try:
-                releases = self._select_simple(
-                    ['*'], 'release',
-                    'discogs_title LIKE "%{}%" OR d_artist LIKE "%{}%"'.format(
-                        id_or_title, id_or_title),
-                    fetchone=False, orderby='d_artist'
-                )
+                if self.search_index_available() and match:
+                    releases = self._select_simple(
+                        ['*'], 'release',
+                        'discogs_id IN (SELECT rowid FROM release_fts '
+                        'WHERE release_fts MATCH ?)',
+                        fetchone=False, orderby='d_artist', values_tuple=(match,)
+                    )
+                else:
+                    releases = self._select_simple(
+                        ['*'], 'release',
+                        'discogs_title LIKE "%{}%" OR d_artist LIKE "%{}%"'.format(
+                            id_or_title, id_or_title),
+                        fetchone=False, orderby='d_artist'
+                    )
                 if releases:
                     log.debug("First found release: {}".format(releases[0]))
                     log.debug("All found releases: {}".format(releases))
@@ -96,6 +120,21 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
                       ON track.d_release_id = track_ext.d_release_id
                       AND track.d_track_no = track_ext.d_track_no'''
 
+        order_by = 'track.d_artist, discogs_title, d_track_name'
+        # prevent returning whole track collection when all search params empty
+        if not artist and not release and not track:
+            return []
+
+        if self.search_index_available():
+            where, values = self._search_release_track_fts_condition(
+                artist, release, track
+            )
+            if where:
+                return self._select_simple(
+                    fields, from_tables, where, fetchone=False, orderby=order_by,
+                    values_tuple=values
+                )
+
         if not artist:
             artist_sql = '''
                 ((track.d_artist IS NULL OR track.d_artist LIKE "%") OR
@@ -117,28 +156,76 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         where = '''{} AND {} AND {}'''.format(
             artist_sql, release_sql, track_sql
         )
-        order_by = 'track.d_artist, discogs_title, d_track_name'
-
-        # prevent returning whole track collection when all search params empty
-        if not artist and not release and not track:
-            tracks = []
-        else:
-            tracks = self._select_simple(
-                fields, from_tables, where, fetchone=False, orderby=order_by
-            )
+        tracks = self._select_simple(
+            fields, from_tables, where, fetchone=False, orderby=order_by
+        )
         # log.debug(self.debug_db(tracks))
         return tracks
 
+    # Full-text search helpers
+
+    def search_index_available(self):
+        """Checks if the FTS5 search index tables exist in the DiscoBASE.
+
+        They are created by dsc setup if SQLite supports FTS5 (see
+        Db_setup.upgrade_search_index). If not, or if they still have the
+        outdated layout, offline searches fall back to LIKE queries.
+        """
+        if self._search_index is None:
+            rows = self._select(
+                "SELECT name FROM sqlite_master WHERE type == 'table' "
+                "AND name IN ('release_fts', 'track_fts', 'track_search_key')"
+            )
+            self._search_index = len(rows) == 3 if rows else False
+            log.debug("MODEL: FTS5 search index available: %s", self._search_index)
+        return self._search_index
+
+    def _search_release_track_fts_condition(self, artist, release, track):
+        """Returns a WHERE condition using the search index and its values.
+
+        The condition is None if no searchable words are left in any term,
+        callers then should fall back to a LIKE based search.
+        """
+        rel_sub = 'SELECT rowid FROM release_fts WHERE release_fts MATCH ?'
+        track_sub = (
+            'SELECT 1 FROM track_search_key AS tsk '
+            'WHERE tsk.d_release_id = track.d_release_id '
+            'AND tsk.d_track_no = track.d_track_no '
+            'AND tsk.search_id IN ('
+            'SELECT rowid FROM track_fts WHERE track_fts MATCH ?)'
+        )
+        conditions, values = [], []
+        for term, columns in [
+            (artist, ['artist']), (release, ['title']), (track, ['track_name', 'notes'])
+        ]:
+            if not term:
+                continue
+            match = fts_match_expr(term, columns)
+            if not match:
+                return None, None
+            if columns == ['artist']:
+                conditions.append(
+                    f'(EXISTS ({track_sub}) OR release.discogs_id IN ({rel_sub}))'
+                )
+                values.extend([match, match])
+            elif columns == ['title']:
+                conditions.append(f'release.discogs_id IN ({rel_sub})')
+                values.append(match)
+            else:
+                conditions.append(f'EXISTS ({track_sub})')
+                values.append(match)
+        return " AND ".join(conditions), tuple(values)
+
     def get_release_by_id(self, release_id):
         return self._select_simple(
-            ["*"], "release", f"discogs_id == {release_id}", fetchone=True
+            ["*"], "release", {"discogs_id": release_id}, fetchone=True
         )
 
     def get_release_tracks_by_id(self, release_id):
         return self._select_simple(
             ["*"],
             "release",
-            f"discogs_id == {release_id}",
+            {"discogs_id": release_id},
             fetchone=False,
             join=[
                 ("LEFT OUTER", "track", "discogs_id = track.d_release_id")
@@ -146,77 +233,54 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             as_dict=True
         )
 
+    # Track writers are native UPSERTs: one statement per row, no exception
+    # round trip for existing tracks.
+    SQL_UPSERT_TRACK = Database._build_upsert(
+        "track",
+        ["d_release_id", "d_track_no", "d_artist", "d_track_name",
+         "import_timestamp"],
+        ["d_release_id", "d_track_no"],
+        values=["?", "?", "?", "?", "datetime('now', 'localtime')"],
+    )
+    SQL_UPSERT_TRACK_BRAINZ = Database._build_upsert(
+        "track",
+        ["d_release_id", "d_track_no", "m_rec_id", "m_match_method",
+         "m_match_time", "a_key", "a_chords_key", "a_bpm"],
+        ["d_release_id", "d_track_no"],
+        values=["?", "?", "?", "?", "datetime('now', 'localtime')", "?", "?",
+                "?"],
+    )
+
     def upsert_track(self, release_id, track_no, track_name, track_artist):
         track_no = track_no.upper()  # always save uppercase track numbers
-        try:
-            sql_i='''INSERT INTO track(d_release_id, d_track_no, d_artist,
-                        d_track_name, import_timestamp)
-                        VALUES(?, ?, ?, ?, datetime('now', 'localtime'));'''
-            tuple_i = (release_id, track_no, track_artist, track_name)
-            return self.execute_sql(sql_i, tuple_i, raise_err=True)
-        except sqlerr as e:
-            if "UNIQUE constraint failed" in e.args[0]:
-                log.debug("Track already in DiscoBASE, updating ...")
-                try:
-                    sql_u='''UPDATE track SET
-                                d_artist = ?, d_track_name = ?,
-                                import_timestamp=datetime('now', 'localtime')
-                                WHERE d_release_id = ? AND d_track_no = ?;'''
-                    tuple_u = (track_artist, track_name, release_id, track_no)
-                    return self.execute_sql(sql_u, tuple_u, raise_err=True)
-                except sqlerr as ee:
-                    log.error("MODEL: upsert_track: %s", ee.args[0])
-                    return False
-            else:
-                log.error("MODEL: %s", e.args[0])
-                return False
+        return self.execute_sql(
+            self.SQL_UPSERT_TRACK,
+            (release_id, track_no, track_artist, track_name)
+        )
 
-    def upsert_track_ext(self, orig, edit_answers):  # pylint: disable=too-many-locals
+    def upsert_tracks(self, tracks):
+        """Batched upsert_track. Expects a list of tuples in the same order as
+        upsert_track's arguments. Returns the number of rows or False."""
+        return self.executemany_sql(
+            self.SQL_UPSERT_TRACK,
+            [(release_id, track_no.upper(), track_artist, track_name)
+             for release_id, track_no, track_name, track_artist in tracks]
+        )
+
+    def upsert_track_ext(self, orig, edit_answers):
         track_no = orig['d_track_no'].upper()  # always save uppercase track numbers
         release_id = orig['d_release_id']
-
-        fields_ins = ''
-        fields_ins_vals = ''
-        fields_upd = ''
-        values_list = []
-        for key, answer in edit_answers.items():
-            log.debug('key: {}, value: {}'.format(key, answer))
-            # update fields key = ? snippets
-            if fields_upd == '':
-                fields_upd += "{} = ? ".format(key)
-            else:
-                fields_upd += ", {} = ? ".format(key)
-            # insert fields (keys) and values (list of ?)
-            fields_ins += ", {}".format(key)
-            fields_ins_vals += ", ?"
-            values_list.append(answer)
-
         if len(edit_answers) == 0:  # only update if necessary
             return True
-
-        try:
-            sql_i='''INSERT INTO track_ext(d_release_id, d_track_no{})
-                        VALUES(?, ?{});'''.format(fields_ins, fields_ins_vals)
-            tuple_i = (release_id, track_no) + tuple(values_list)
-            return self.execute_sql(sql_i, tuple_i, raise_err=True)
-        except sqlerr as e:
-            if "UNIQUE constraint failed" in e.args[0]:
-                log.debug(
-                    "Track existing in track_ext table, updating ..."
-                )
-                try:
-                    sql_u='''
-                        UPDATE track_ext SET {}
-                          WHERE d_release_id = ? AND d_track_no = ?;'''.format(
-                        fields_upd)
-                    tuple_u = tuple(values_list) + (release_id, track_no)
-                    return self.execute_sql(sql_u, tuple_u, raise_err=True)
-                except sqlerr as ee:
-                    log.error("MODEL: upsert_track_ext: %s", ee.args[0])
-                    return False
-            else:
-                log.error("MODEL: %s", e.args[0])
-                return False
+        for key, answer in edit_answers.items():
+            log.debug('key: {}, value: {}'.format(key, answer))
+        sql_upsert = self._build_upsert(
+            "track_ext",
+            ["d_release_id", "d_track_no", *edit_answers.keys()],
+            ["d_release_id", "d_track_no"],
+        )
+        values = (release_id, track_no) + tuple(edit_answers.values())
+        return self.execute_sql(sql_upsert, values)
 
     # Release & collection items
 
@@ -234,6 +298,74 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             (instance_id,),
         )
 
+    def mark_orphaned_collection_items(self, instance_ids):
+        """Sets orphaned flag on collection items not in instance_ids.
+
+        instance_ids are all instance IDs currently in the Discogs collection.
+        They are loaded into a temporary table, orphans are found with an
+        anti-join. Returns a list of the newly orphaned instance IDs, nothing
+        is marked if the temporary table can't be filled.
+        """
+        try:
+            self.execute_sql(
+                "CREATE TEMP TABLE IF NOT EXISTS imported_instance ("
+                "d_coll_instance_id INTEGER PRIMARY KEY);", raise_err=True,
+            )
+            self.execute_sql("DELETE FROM temp.imported_instance;",
+                             raise_err=True)
+            # Not via executemany_sql, within a batch() rows would be queued.
+            self.cur.executemany(
+                "INSERT OR IGNORE INTO temp.imported_instance VALUES (?);",
+                [(instance_id,) for instance_id in instance_ids],
+            )
+        except sqlerr as e:
+            log.error("MODEL: mark_orphaned_collection_items: %s", e.args[0])
+            return []
+        not_imported = """
+            coll_orphaned == 0 AND NOT EXISTS (
+                SELECT 1 FROM temp.imported_instance AS imported
+                WHERE imported.d_coll_instance_id == collection.d_coll_instance_id
+            )"""
+        orphaned = self._select(
+            f"SELECT d_coll_instance_id FROM collection WHERE {not_imported};"
+        )
+        if orphaned:
+            self.execute_sql(
+                f"UPDATE collection SET coll_orphaned = 1 WHERE {not_imported};"
+            )
+        self.execute_sql("DROP TABLE IF EXISTS temp.imported_instance;")
+        return [row["d_coll_instance_id"] for row in orphaned or []]
+
+    def get_collection_instance_ids(self):
+        """Returns the sorted instance IDs of all not orphaned collection items."""
+        rows = self._select(
+            "SELECT d_coll_instance_id FROM collection WHERE coll_orphaned == 0 "
+            "ORDER BY d_coll_instance_id;"
+        )
+        return [row["d_coll_instance_id"] for row in rows or []]
+
+    def get_collection_state(self):
+        """Returns the high-water mark of the collection import.
+
+        A dict of the newest d_coll_added timestamp, the number of not orphaned
+        collection items and a SHA-1 hash over their instance IDs. Keys are
+        named like the metadata table keys they are stored in.
+        """
+        instance_ids = self.get_collection_instance_ids()
+        newest = self._select(
+            "SELECT MAX(d_coll_added) AS newest FROM collection "
+            "WHERE coll_orphaned == 0;",
+            fetchone=True,
+        )
+        return {
+            "collection_newest_added": newest["newest"] if newest else None,
+            "collection_count": len(instance_ids),
+            "collection_ids_hash": sha1(
+                ",".join(str(i) for i in instance_ids).encode()
+            ).hexdigest(),
+            "collection_import_time": timestamp_now(),
+        }
+
     def set_collection_item_folder(
         self, instance_id, folder_id, sold_folder_id, timestamp
     ):
@@ -301,7 +433,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
     def delete_release(self, release_id):
         """Deletes a release from DiscoBASE"""
         in_db = self._select_simple(
-            ["discogs_id"], "release", condition=f"discogs_id == {release_id}"
+            ["discogs_id"], "release", condition={"discogs_id": release_id}
         )
         if not in_db:
             log.warning("Release not in DiscoBASE.")
@@ -310,6 +442,27 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             "DELETE FROM release WHERE discogs_id == ?", (release_id, )
         )
 
+    def get_orphaned_releases(self, offset=0, iterate=False):
+        """Returns releases not used by any collection item, sales listing or
+        mix. With iterate=True as a streaming generator."""
+        select = self.iter_rows if iterate else self._select_simple
+        return select(
+            ["d_catno", "d_artist", "discogs_title", "discogs_id", "m_rel_id",
+             "m_rel_id_override"],
+            "release",
+            condition="""
+                NOT EXISTS (
+                    SELECT 1 FROM collection
+                    WHERE d_coll_release_id == discogs_id AND coll_orphaned == 0)
+                AND NOT EXISTS (
+                    SELECT 1 FROM sales WHERE d_sales_release_id == discogs_id)
+                AND NOT EXISTS (
+                    SELECT 1 FROM mix_track WHERE d_release_id == discogs_id)""",
+            as_dict=True,
+            orderby="d_artist, discogs_title",
+            offset=offset,
+        )
+
     def create_collfolders(self, folders):
         """Creates/updates collection folders in DiscoBASE collfolder table.
 
@@ -341,7 +494,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         folder_row = self._select_simple(
             ["d_collfolder_name"],
             "collfolder",
-            condition=f"d_collfolder_id == {folder_id}",
+            condition={"d_collfolder_id": folder_id},
             fetchone=True
         )
         if folder_row:
@@ -356,7 +509,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         folder_row = self._select_simple(
             ["d_collfolder_id"],
             "collfolder",
-            condition=f'd_collfolder_name == "{folder_name}"',
+            condition={"d_collfolder_name": folder_name},
             fetchone=True
         )
         if folder_row:
@@ -380,7 +533,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         in_db = self._select_simple(
             ["*"],
             "collection",
-            condition=f"d_coll_release_id == {release_id} and NOT coll_orphaned",
+            condition={"d_coll_release_id": release_id, "coll_orphaned": 0},
             as_dict=True,
         )
         if not in_db and not quiet:
@@ -395,7 +548,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         in_db = self._select_simple(
             ["*"],
             "sales",
-            condition=f"d_sales_release_id == {release_id}",
+            condition={"d_sales_release_id": release_id},
             as_dict=True,
         )
         if not in_db and not quiet:
@@ -410,7 +563,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         in_db = self._select_simple(
             ["*"],
             "mix_track",
-            condition=f"d_release_id == {release_id}",
+            condition={"d_release_id": release_id},
             as_dict=True,
         )
         if not in_db and not quiet:
@@ -425,7 +578,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         in_db = self._select_simple(
             ["d_coll_instance_id"],
             "collection",
-            condition=f"d_coll_instance_id == {instance_id}",
+            condition={"d_coll_instance_id": instance_id},
         )
         if not in_db:
             log.warning("Collection item instance not in DiscoBASE.")
@@ -470,6 +623,111 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             log.error("MODEL: create_collection_item: %s", e.args[0])
             return False
 
+    # Metadata
+
+    def get_metadata(self, key, default=None):
+        """Returns a value of the metadata key/value table or default."""
+        try:
+            row = self._select(
+                "SELECT meta_value FROM metadata WHERE meta_key == ?;",
+                fetchone=True, values_tuple=(key,),
+            )
+        except sqlerr as e:
+            log.warning(
+                "MODEL: get_metadata: %s. Please run 'dsc setup'.", e.args[0]
+            )
+            return default
+        return row["meta_value"] if row else default
+
+    def set_metadata(self, values):
+        """Stores a dictionary of keys and values in the metadata table."""
+        mtime = timestamp_now()
+        return self.executemany_sql(
+            self._build_upsert(
+                "metadata", ["meta_key", "meta_value", "meta_mtime"], ["meta_key"]
+            ),
+            [(key, None if value is None else str(value), mtime)
+             for key, value in values.items()],
+        )
+
+    # Job journal
+
+    def create_job(self, job_name, job_params, item_keys):
+        """Records a new batch job and its work list in the job journal.
+
+        Unfinished jobs of the same name and parameters are dropped. Returns
+        the job ID, or None if the journal is not available.
+        """
+        now = timestamp_now()
+        item_keys = [str(key) for key in item_keys]
+        try:
+            with self.batch():
+                self.execute_sql(
+                    "DELETE FROM job WHERE job_name == ? AND job_params == ? "
+                    "AND job_status == 'running';",
+                    (job_name, job_params), raise_err=True,
+                )
+                self.execute_sql(
+                    "INSERT INTO job (job_name, job_params, job_items, "
+                    "job_started, job_mtime) VALUES (?, ?, ?, ?, ?);",
+                    (job_name, job_params, len(item_keys), now, now),
+                    raise_err=True,
+                )
+                job_id = self.lastrowid
+                self.executemany_sql(
+                    "INSERT OR IGNORE INTO job_item (job_id, item_pos, item_key) "
+                    "VALUES (?, ?, ?);",
+                    [(job_id, pos, key) for pos, key in enumerate(item_keys)],
+                    raise_err=True,
+                )
+        except sqlerr as e:
+            log.warning("MODEL: create_job: %s. Please run 'dsc setup'.", e.args[0])
+            return None
+        return job_id
+
+    def get_unfinished_job(self, job_name, job_params):
+        """Returns the latest unfinished job of a name and parameters as a dict."""
+        try:
+            row = self._select(
+                "SELECT * FROM job WHERE job_name == ? AND job_params == ? "
+                "AND job_status == 'running' ORDER BY job_id DESC LIMIT 1;",
+                fetchone=True, values_tuple=(job_name, job_params),
+            )
+        except sqlerr as e:
+            log.warning(
+                "MODEL: get_unfinished_job: %s. Please run 'dsc setup'.", e.args[0]
+            )
+            return None
+        return dict(row) if row else None
+
+    def get_job_pending_keys(self, job_id):
+        """Returns the set of item keys of a job not done yet."""
+        rows = self._select(
+            "SELECT item_key FROM job_item WHERE job_id == ? AND item_done == 0;",
+            values_tuple=(job_id,),
+        )
+        return {row["item_key"] for row in rows or []}
+
+    def set_job_item_done(self, job_id, item_key):
+        """Marks an item of a job done.
+
+        Within a batch() block this is committed together with the item's
+        data, thus a crash never leaves one without the other.
+        """
+        return self.execute_sql(
+            "UPDATE job_item SET item_done = 1 "
+            "WHERE job_id == ? AND item_key == ?;",
+            (job_id, str(item_key)),
+        )
+
+    def finish_job(self, job_id):
+        """Marks a job done and drops its work list."""
+        self.execute_sql("DELETE FROM job_item WHERE job_id == ?;", (job_id,))
+        return self.execute_sql(
+            "UPDATE job SET job_status = 'done', job_mtime = ? WHERE job_id == ?;",
+            (timestamp_now(), job_id),
+        )
+
     # Suggest fetchers
 
     def track_report_snippet(self, track_pos, mix_id):
@@ -491,12 +749,13 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
                         LEFT OUTER JOIN track_ext
                         ON mix_track.d_release_id = track_ext.d_release_id
                         AND mix_track.d_track_no = track_ext.d_track_no
-            WHERE (mix_track.track_pos == "{}" OR mix_track.track_pos == "{}"
-                  OR mix_track.track_pos == "{}") AND mix_track.mix_id == "{}"
-            ORDER BY mix_track.track_pos'''.format(
-            track_pos, track_pos_before, track_pos_after, mix_id
+            WHERE (mix_track.track_pos == ? OR mix_track.track_pos == ?
+                  OR mix_track.track_pos == ?) AND mix_track.mix_id == ?
+            ORDER BY mix_track.track_pos'''
+        tracks_snippet = self._select(
+            sql_sel, fetchone=False,
+            values_tuple=(track_pos, track_pos_before, track_pos_after, mix_id)
         )
-        tracks_snippet = self._select(sql_sel, fetchone=False)
         if not tracks_snippet:
             return False
         else:
@@ -508,9 +767,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         occurences_data = self._select_simple(
             ['track_pos', 'mix_track.mix_id', 'mix.name'],
             'mix_track INNER JOIN MIX ON mix.mix_id = mix_track.mix_id',
-            'd_release_id == "{}" AND d_track_no == "{}"'.format(
-                release_id, track_no.upper()
-            )
+            {'d_release_id': release_id, 'd_track_no': track_no.upper()}
         )
         log.info("MODEL: Returning track_report_occurences data.")
         return occurences_data
@@ -518,7 +775,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
     def get_tracks_by_bpm(self, bpm, pitch_range):
         min_bpm = bpm - (bpm / 100 * pitch_range)
         max_bpm = bpm + (bpm / 100 * pitch_range)
-        sql_bpm = f'''
+        sql_bpm = '''
         SELECT
             discogs_title,
             d_catno,
@@ -536,21 +793,21 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             ON track.d_release_id = track_ext.d_release_id
             AND track.d_track_no = track_ext.d_track_no
         WHERE
-            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) >= {min_bpm}
+            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) >= ?
             AND
-            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) <= {max_bpm}
+            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) <= ?
         ORDER BY
         ''' + SQL_ORDER_MUSICAL + '''
             chosen_bpm;
         '''
         # THEN trim(track_ext.bpm, '.0')
         # THEN trim(round(track.a_bpm, 0), '.0')
-        return self._select(sql_bpm, fetchone=False)
+        return self._select(sql_bpm, fetchone=False, values_tuple=(min_bpm, max_bpm))
 
     def get_tracks_by_key(self, key):
         # prev_key = "" # future music ;-) when we have key-translation-table
         # next_key = ""
-        sql_key = f'''
+        sql_key = '''
         SELECT
             discogs_title,
             d_catno,
@@ -567,19 +824,19 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         LEFT JOIN track_ext
             ON track.d_release_id = track_ext.d_release_id
             AND track.d_track_no = track_ext.d_track_no
-        WHERE COALESCE(track_ext.key, track.a_key) LIKE "%{key}%"
+        WHERE COALESCE(track_ext.key, track.a_key) LIKE ?
         ORDER BY
         ''' + SQL_ORDER_MUSICAL + '''
             chosen_bpm;
         '''
         # THEN trim(round(track.a_bpm, 0), '.0')
         # THEN round(track_ext.bpm, 0)
-        return self._select(sql_key, fetchone=False)
+        return self._select(sql_key, fetchone=False, values_tuple=(f"%{key}%",))
 
     def get_tracks_by_key_and_bpm(self, key, bpm, pitch_range):
         min_bpm = bpm - (bpm / 100 * pitch_range)
         max_bpm = bpm + (bpm / 100 * pitch_range)
-        sql = f'''
+        sql = '''
         SELECT
             discogs_title,
             d_catno,
@@ -597,39 +854,60 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             ON track.d_release_id = track_ext.d_release_id
             AND track.d_track_no = track_ext.d_track_no
         WHERE
-            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) >= {min_bpm}
+            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) >= ?
             AND
-            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) <= {max_bpm}
+            ROUND(COALESCE(track_ext.bpm, track.a_bpm), 1) <= ?
             AND
-            COALESCE(track_ext.key, track.a_key) LIKE "%{key}%"
+            COALESCE(track_ext.key, track.a_key) LIKE ?
         ORDER BY
         ''' + SQL_ORDER_MUSICAL + '''
             chosen_bpm;
         '''
-        return self._select(sql, fetchone=False)
+        return self._select(
+            sql, fetchone=False, values_tuple=(min_bpm, max_bpm, f"%{key}%")
+        )
 
     # Stats fetchers
 
+    def stats_overview(self):
+        """Returns all DiscoBASE counters shown by `dsc stats` as a dict.
+
+        Read from the stats_cache table if it was enabled via `dsc setup
+        --stats-cache`, otherwise computed by a single aggregate query.
+        """
+        cached = self._select(
+            "SELECT name FROM sqlite_master WHERE type == 'table' "
+            "AND name == 'stats_cache'", fetchone=True
+        )
+        if cached:
+            log.info("MODEL: Reading counters from stats_cache.")
+            stats = self._select("SELECT * FROM stats_cache;", fetchone=True,
+                                 as_dict=True)
+        else:
+            stats = self._select(self._stats_aggregate_sql(), fetchone=True,
+                                 as_dict=True)
+        stats = stats if stats else {column: 0 for column in self.STATS_COUNTERS}
+        stats.pop('stats_id', None)
+
+        def average(price_sum, count):
+            return f"{round(price_sum / count, 2)} €" if count else "0.00 €"
+
+        stats['sales_price_average'] = average(
+            stats.pop('sales_price_sum'), stats.pop('sales_price_count'))
+        stats['sales_price_average_lower'] = average(
+            stats.pop('sales_price_lower_sum'),
+            stats.pop('sales_price_lower_count'))
+        # Distinct counts can't be maintained incrementally, the index on
+        # mix_track (d_release_id, d_track_no) keeps this cheap.
+        stats['mixtracks_unique'] = self.stats_mixtracks_unique()
+        return stats
+
     def stats_match_method_release(self):
         sql_stats = '''
                     SELECT m_match_method, COUNT(*) FROM release GROUP BY m_match_method;
                     '''
         return self._select(sql_stats, fetchone=False)
 
-    def stats_releases_total(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM release;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_tracks_total(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
     def stats_tracks_total_ext(self):
         sql_stats = '''
                     SELECT COUNT(*) FROM track_ext;
@@ -659,78 +937,6 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         stats = self._select(sql_stats, fetchone=True)
         return stats[0] if stats else 0
 
-    def stats_releases_matched(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM release WHERE m_match_time IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_tracks_matched(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track WHERE m_match_time IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_collection_items_discobase(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM release LEFT OUTER JOIN collection
-                    ON discogs_id = d_coll_release_id
-                    WHERE coll_orphaned = 0;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_sales_listings_discobase(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM sales;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_sales_listings_forsale(self):
-        sql_stats = """ SELECT COUNT(*) FROM sales
-            WHERE d_sales_status = "forsale" OR d_sales_status = "expired";
-            """
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_sales_listings_sold(self):
-        sql_stats = '''
-            SELECT COUNT(*) FROM sales WHERE d_sales_status = "sold";
-            '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_sales_price_average(self):
-        sql_stats = '''
-            SELECT AVG(d_sales_price) FROM sales
-            WHERE
-                d_sales_status = "forsale" OR
-                d_sales_status = "expired";
-            '''
-        stats = self._select(sql_stats, fetchone=True)
-        return f"{round(stats[0], 2)} €" if stats else "0.00 €"
-
-    def stats_sales_price_average_lower(self):
-        sql_stats = '''
-            SELECT AVG(d_sales_price) FROM sales
-            WHERE
-                (d_sales_status = "forsale" OR
-                 d_sales_status = "expired") AND
-                 d_sales_price < 15;
-            '''
-        stats = self._select(sql_stats, fetchone=True)
-        return f"{round(stats[0], 2)} €" if stats else "0.00 €"
-
-    def stats_mixtracks_total(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM mix_track;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
     def stats_mixtracks_unique(self):
         sql_stats = '''
                     SELECT COUNT(*) FROM (
@@ -741,64 +947,297 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         stats = self._select(sql_stats, fetchone=True)
         return stats[0] if stats else 0
 
-    def stats_tracks_key_brainz(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track WHERE a_key IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_tracks_key_manual(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track_ext WHERE key IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_tracks_bpm_brainz(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track WHERE a_bpm IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
-    def stats_tracks_bpm_manual(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM track_ext WHERE bpm IS NOT NULL;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
-
     # Brainz fetchers and inserts
 
-    def get_all_tracks_for_brainz_update(self, offset=0, really_all=False,
-                                         skip_unmatched=False):
-        log.info("MODEL: Getting tracks. Preparing *Brainz mass update.")
-        if offset > 0:
-            offset = offset - 1
-            log.info("MODEL: Subtracted 1 from offset (--resume 1 should "
-                     "not alter anything).")
-        where = '(a_key IS NULL or a_bpm IS NULL)' if not really_all else ''
-        where += ' AND' if skip_unmatched and not really_all else ''
-        where += ' m_rec_id IS NOT NULL' if skip_unmatched else ''
+    def _brainz_update_tables_and_condition(self, really_all=False,
+                                            skip_unmatched=False,
+                                            backoff=None, detail=1):
+        conditions = []
+        if not really_all:
+            conditions.append('(a_key IS NULL or a_bpm IS NULL)')
+        if skip_unmatched:
+            conditions.append('m_rec_id IS NOT NULL')
         tables = '''release
                       LEFT OUTER JOIN track
                       ON release.discogs_id = track.d_release_id
                         LEFT OUTER JOIN track_ext
                         ON track.d_release_id = track_ext.d_release_id
                         AND track.d_track_no = track_ext.d_track_no'''
-        return self._select_simple([
+        if backoff and self.brainz_attempts_available():
+            tables += '''
+                          LEFT OUTER JOIN brainz_attempt
+                          ON track.d_release_id = brainz_attempt.d_release_id
+                          AND track.d_track_no = brainz_attempt.d_track_no'''
+            # Exponential back-off, a higher match detail always tries again
+            hours = (
+                f"min({int(backoff['max_hours'])}, {int(backoff['hours'])} * "
+                "(1 << min(attempt_failures - 1, 30)))"
+            )
+            conditions.append(
+                "(attempt_failures IS NULL OR attempt_failures == 0 "
+                f"OR attempt_detail < {int(detail)} "
+                f"OR datetime(attempt_time, '+' || {hours} || ' hours') "
+                "<= datetime('now', 'localtime'))"
+            )
+        return tables, ' AND '.join(conditions)
+
+    def get_all_tracks_for_brainz_update(self, offset=0, really_all=False,
+                                         skip_unmatched=False, iterate=False,
+                                         backoff=None, detail=1):
+        """Returns tracks for a *Brainz mass update.
+
+        With iterate=True a generator streaming the rows is returned, use
+        count_all_tracks_for_brainz_update to get the total. With a backoff
+        dict (see BRAINZ_BACKOFF), tracks that failed to match recently at
+        the same or a higher detail level are left out.
+        """
+        log.info("MODEL: Getting tracks. Preparing *Brainz mass update.")
+        tables, where = self._brainz_update_tables_and_condition(
+            really_all, skip_unmatched, backoff, detail
+        )
+        fields = [
             'release.discogs_id', 'track.d_release_id', 'discogs_title',
             'd_catno', 'track.d_artist', 'track.d_track_name',
-            'track.d_track_no', 'track_ext.m_rec_id_override'],
-            tables, condition=where,
+            'track.d_track_no', 'track_ext.m_rec_id_override']
+        if iterate:
+            return self.iter_rows(
+                fields, tables, condition=where,
+                orderby='release.discogs_id', offset=offset
+            )
+        return self._select_simple(
+            fields, tables, condition=where,
             fetchone=False, orderby='release.discogs_id', offset=offset
         )
 
+    def count_all_tracks_for_brainz_update(self, really_all=False,
+                                           skip_unmatched=False,
+                                           backoff=None, detail=1):
+        tables, where = self._brainz_update_tables_and_condition(
+            really_all, skip_unmatched, backoff, detail
+        )
+        count = self._select_simple(
+            ['COUNT(*)'], tables, condition=where, fetchone=True
+        )
+        return count[0] if count else 0
+
+    def brainz_attempts_available(self):
+        """Checks if the brainz_attempt table exists in the DiscoBASE.
+
+        It is created by schema upgrade 10. Without it failed *Brainz matches
+        are not recorded and always tried again.
+        """
+        if self._brainz_attempts is None:
+            rows = self._select(
+                "SELECT name FROM sqlite_master WHERE type == 'table' "
+                "AND name == 'brainz_attempt'"
+            )
+            self._brainz_attempts = bool(rows)
+            log.debug("MODEL: brainz_attempt table available: %s",
+                      self._brainz_attempts)
+        return self._brainz_attempts
+
+    def record_brainz_attempt(self, release_id, track_no, detail, reason=None):
+        """Records a *Brainz match attempt of a track.
+
+        reason describes why it failed (eg. "no_mb_release"), None means the
+        track was matched successfully and resets its failure count.
+        """
+        if not self.brainz_attempts_available():
+            return False
+        return self.execute_sql(
+            """INSERT INTO brainz_attempt (d_release_id, d_track_no,
+                 attempt_time, attempt_detail, attempt_reason, attempt_failures)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(d_release_id, d_track_no) DO UPDATE SET
+                 attempt_time = excluded.attempt_time,
+                 attempt_detail = excluded.attempt_detail,
+                 attempt_reason = excluded.attempt_reason,
+                 attempt_failures = CASE WHEN excluded.attempt_reason IS NULL
+                   THEN 0 ELSE attempt_failures + 1 END;""",
+            (release_id, track_no.upper(), timestamp_now(), detail, reason,
+             0 if reason is None else 1),
+        )
+
+    def get_brainz_attempt(self, release_id, track_no):
+        """Returns the last *Brainz match attempt of a track as a dict."""
+        if not self.brainz_attempts_available():
+            return None
+        row = self._select_simple(
+            ['*'], 'brainz_attempt', fetchone=True, condition={
+                'd_release_id': release_id, 'd_track_no': track_no.upper()
+            }
+        )
+        return dict(row) if row else None
+
+    def update_catno_keys(self, normalizer):
+        """Stores the catalog number keys of releases (see CatnoNormalizer)
+        in the indexed release_catno table, read by get_catno_keys.
+
+        Only releases whose catalog number changed since are processed, all
+        of them if the rules changed. Returns the number of releases
+        processed, None if the table is not available.
+        """
+        try:
+            if self.get_metadata("catno_rules") != normalizer.rules_id:
+                self.execute_sql("DELETE FROM release_catno;", raise_err=True)
+            rows = self._select(
+                """SELECT discogs_id, d_catno FROM release
+                   WHERE d_catno IS NOT NULL AND trim(d_catno) != ''
+                   AND NOT EXISTS (
+                     SELECT 1 FROM release_catno
+                     WHERE release_catno.d_release_id == release.discogs_id
+                     AND release_catno.d_catno == release.d_catno);"""
+            )
+        except sqlerr as e:
+            log.warning(
+                "MODEL: update_catno_keys: %s. Please run 'dsc setup'.", e.args[0]
+            )
+            return None
+        upsert = self._build_upsert(
+            "release_catno",
+            ["d_release_id", "catno_key", "catno_method", "d_catno"],
+            ["d_release_id", "catno_key"],
+        )
+        with self.batch():
+            for row in rows:
+                self.executemany_sql(  # Keys of the old catalog number
+                    "DELETE FROM release_catno WHERE d_release_id == ?;",
+                    [(row["discogs_id"],)],
+                )
+                self.executemany_sql(upsert, [
+                    (row["discogs_id"], key, method, row["d_catno"])
+                    for key, method in normalizer.keys(row["d_catno"]).items()
+                ])
+            self.set_metadata({"catno_rules": normalizer.rules_id})
+        log.info("MODEL: Catalog number keys of %s releases updated.", len(rows))
+        return len(rows)
+
+    def get_catno_keys(self):
+        """Returns the set of catalog number keys of all releases."""
+        try:
+            rows = self._select("SELECT DISTINCT catno_key FROM release_catno;")
+        except sqlerr as e:
+            log.warning(
+                "MODEL: get_catno_keys: %s. Please run 'dsc setup'.", e.args[0]
+            )
+            return set()
+        return {row[0] for row in rows or []}
+
+    def get_release_ids(self):
+        """Returns the set of Discogs release IDs in the DiscoBASE."""
+        rows = self._select("SELECT discogs_id FROM release;")
+        return {row[0] for row in rows or []}
+
+    # Local MusicBrainz index
+
+    def upsert_mb_index_release(self, release):
+        """Stores a release in the local MusicBrainz index.
+
+        Expects a dict of m_rel_id, m_rel_title, d_release_ids, catnos (a
+        list of (catno_key, m_catno) tuples) and tracks (a list of
+        (medium_pos, track_pos, track_number, m_rec_id, m_rec_title)
+        tuples). Rows queue up when called within a batch() block.
+        """
+        m_rel_id = release["m_rel_id"]
+        self.executemany_sql(  # Cascades to the release's other rows
+            "DELETE FROM mb_release WHERE m_rel_id == ?;", [(m_rel_id,)],
+            raise_err=True,
+        )
+        self.executemany_sql(
+            self._build_upsert("mb_release", ["m_rel_id", "m_rel_title"],
+                               ["m_rel_id"]),
+            [(m_rel_id, release["m_rel_title"])], raise_err=True,
+        )
+        self.executemany_sql(
+            "INSERT OR IGNORE INTO mb_release_discogs (m_rel_id, d_release_id) "
+            "VALUES (?, ?);",
+            [(m_rel_id, d_release_id) for d_release_id in release["d_release_ids"]],
+            raise_err=True,
+        )
+        self.executemany_sql(
+            "INSERT OR IGNORE INTO mb_release_catno (m_rel_id, catno_key, m_catno) "
+            "VALUES (?, ?, ?);",
+            [(m_rel_id, key, catno) for key, catno in release["catnos"]],
+            raise_err=True,
+        )
+        return self.executemany_sql(
+            "INSERT OR IGNORE INTO mb_track (m_rel_id, medium_pos, track_pos, "
+            "track_number, m_rec_id, m_rec_title) VALUES (?, ?, ?, ?, ?, ?);",
+            [(m_rel_id,) + track for track in release["tracks"]],
+            raise_err=True,
+        )
+
+    def update_mb_index_recordings(self, recordings):
+        """Updates recording titles in the local MusicBrainz index.
+
+        Expects a list of (m_rec_title, m_rec_id) tuples.
+        """
+        return self.executemany_sql(
+            "UPDATE mb_track SET m_rec_title = ? WHERE m_rec_id == ?;",
+            recordings, raise_err=True,
+        )
+
+    def get_mb_index_rec_mbids(self):
+        """Returns the set of recording MBIDs in the local MusicBrainz index."""
+        rows = self._select(
+            "SELECT DISTINCT m_rec_id FROM mb_track WHERE m_rec_id IS NOT NULL;"
+        )
+        return {row[0] for row in rows or []}
+
+    def get_mb_index_candidates(self, d_release_id, catno_keys, limit=10):
+        """Returns releases of the local MusicBrainz index linking to a
+        Discogs release or having any of the catalog number keys. Linked ones
+        come first."""
+        catno_keys = list(catno_keys)
+        rows = self._select(
+            """SELECT mb_release.m_rel_id, m_rel_title FROM mb_release
+               INNER JOIN mb_release_discogs
+               ON mb_release.m_rel_id == mb_release_discogs.m_rel_id
+               WHERE d_release_id == ?;""",
+            values_tuple=(d_release_id,),
+        ) or []
+        if catno_keys:
+            rows += self._select(
+                f"""SELECT DISTINCT mb_release.m_rel_id, m_rel_title
+                    FROM mb_release INNER JOIN mb_release_catno
+                    ON mb_release.m_rel_id == mb_release_catno.m_rel_id
+                    WHERE catno_key IN ({', '.join('?' * len(catno_keys))})
+                    ORDER BY mb_release.m_rel_id;""",
+                values_tuple=tuple(catno_keys),
+            ) or []
+        candidates = {}
+        for row in rows:
+            candidates.setdefault(row["m_rel_id"], row)
+        return list(candidates.values())[:limit]
+
+    def get_mb_index_release(self, m_rel_id):
+        """Returns a release of the local MusicBrainz index as a dict of its
+        title, Discogs release IDs, catalog numbers and tracks, or None."""
+        release = self._select(
+            "SELECT m_rel_id, m_rel_title FROM mb_release WHERE m_rel_id == ?;",
+            fetchone=True, values_tuple=(m_rel_id,),
+        )
+        if not release:
+            return None
+        values = (m_rel_id,)
+        return {
+            "m_rel_id": release["m_rel_id"],
+            "m_rel_title": release["m_rel_title"],
+            "d_release_ids": [row[0] for row in self._select(
+                "SELECT d_release_id FROM mb_release_discogs WHERE m_rel_id == ?;",
+                values_tuple=values) or []],
+            "catnos": sorted({row[0] for row in self._select(
+                "SELECT m_catno FROM mb_release_catno WHERE m_rel_id == ?;",
+                values_tuple=values) or []}),
+            "tracks": self._select(
+                "SELECT medium_pos, track_pos, track_number, m_rec_id, "
+                "m_rec_title FROM mb_track WHERE m_rel_id == ? "
+                "ORDER BY medium_pos, track_pos;", values_tuple=values) or [],
+        }
+
     def get_track_for_brainz_update(self, rel_id, track_no):
         log.info("MODEL: Getting track. Preparing *Brainz update.")
-        where = 'track.d_release_id == {} AND track.d_track_no == "{}"'.format(
-            rel_id, track_no)
+        where = {'track.d_release_id': rel_id, 'track.d_track_no': track_no}
         tables = '''release
                       LEFT OUTER JOIN track
                       ON release.discogs_id = track.d_release_id
@@ -816,32 +1255,59 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
     def upsert_track_brainz(self, release_id, track_no, rec_id,
                             match_method, key, chords_key, bpm):
         track_no = track_no.upper()  # always save uppercase track numbers
+        return self.execute_sql(
+            self.SQL_UPSERT_TRACK_BRAINZ,
+            (release_id, track_no, rec_id, match_method, key, chords_key, bpm)
+        )
+
+    def upsert_tracks_brainz(self, tracks):
+        """Batched upsert_track_brainz. Expects a list of tuples in the same
+        order as upsert_track_brainz's arguments."""
+        return self.executemany_sql(
+            self.SQL_UPSERT_TRACK_BRAINZ,
+            [(release_id, track_no.upper(), *details)
+             for release_id, track_no, *details in tracks]
+        )
+
+    def get_known_rec_mbids(self):
+        """Returns the set of all (lowercase) recording MBIDs in the DiscoBASE,
+        matched ones and user overrides."""
+        rows = self._select(
+            """SELECT m_rec_id FROM track WHERE m_rec_id IS NOT NULL
+               UNION
+               SELECT m_rec_id_override FROM track_ext
+               WHERE m_rec_id_override IS NOT NULL;"""
+        )
+        return {row[0].strip().lower() for row in rows or [] if row[0]}
+
+    def upsert_accbr_features(self, features):
+        """Stores AcousticBrainz features of recordings in the local index.
+
+        Expects a list of (rec_mbid, key, chords_key, bpm) tuples.
+        """
+        return self.executemany_sql(
+            self._build_upsert(
+                "accbr_features",
+                ["m_rec_id", "a_key", "a_chords_key", "a_bpm"], ["m_rec_id"]
+            ),
+            features, raise_err=True,
+        )
+
+    def get_accbr_features(self, rec_mbid):
+        """Returns key, chords key and BPM of a recording from the local
+        AcousticBrainz index as a dict, or None if it's not in there."""
         try:
-            sql_i = '''INSERT INTO track(d_release_id, d_track_no,
-                  m_rec_id, m_match_method, m_match_time, a_key, a_chords_key, a_bpm)
-                  VALUES(?, ?, ?, ?, datetime('now', 'localtime'), ?, ?, ?);'''
-            tuple_i = (release_id, track_no, rec_id, match_method, key,
-                       chords_key, bpm)
-            return self.execute_sql(sql_i, tuple_i, raise_err=True)
-        except sqlerr as e:
-            if "UNIQUE constraint failed" in e.args[0]:
-                log.debug("Track already in DiscoBASE, updating ...")
-                try:
-                    sql_u = ''' UPDATE track SET
-                          m_rec_id=?, m_match_method=?,
-                          m_match_time=datetime('now', 'localtime'),
-                          a_key=?, a_chords_key=?, a_bpm=?
-                          WHERE d_release_id=? AND d_track_no=?;
-                          '''
-                    tuple_u = (rec_id, match_method, key, chords_key, bpm,
-                               release_id, track_no)
-                    return self.execute_sql(sql_u, tuple_u)
-                except sqlerr as e:
-                    log.error("MODEL: create_release: %s", e.args[0])
-                    return False
-            else:
-                log.error("MODEL: %s", e.args[0])
-                return False
+            row = self._select(
+                "SELECT a_key, a_chords_key, a_bpm FROM accbr_features "
+                "WHERE m_rec_id == ?;",
+                fetchone=True, values_tuple=(rec_mbid.lower(),),
+            )
+        except sqlerr as e:  # Table missing, run 'dsc setup'
+            log.debug("MODEL: get_accbr_features: %s", e.args[0])
+            return None
+        if not row:
+            return None
+        return {"key": row[0], "chords_key": row[1], "bpm": row[2]}
 
     def update_release_brainz(self, release_id, mbid, match_method):
         sql_upd = '''UPDATE release SET (m_rel_id, m_match_method,
@@ -859,12 +1325,32 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         # filter_cols are defined in ViewCommon and passed via the controller call.
         replace_cols = filter_cols
 
+        # Columns searchable via the FTS5 search index, others use LIKE
+        fts_cols = {
+            "d_artist": "artist", "release.d_artist": "artist",
+            "discogs_title": "title", "release.discogs_title": "title",
+            "d_catno": "catno", "release.d_catno": "catno",
+        }
+        search_index = self.search_index_available()
         conditions = []
+        values = []
         for k, v in search_key_value.items():
             column_name = replace_cols.get(k, k)
-            conditions.append(f'{column_name} LIKE "%{v}%"')
+            match = None
+            if search_index and column_name in fts_cols:
+                match = fts_match_expr(v, [fts_cols[column_name]])
+            if match:
+                conditions.append(
+                    "release.discogs_id IN (SELECT rowid FROM release_fts "
+                    "WHERE release_fts MATCH ?)"
+                )
+                values.append(match)
+            else:
+                conditions.append(f'{column_name} LIKE "%{v}%"')
 
         where = " OR ".join(conditions) if standalone_only else " AND ".join(conditions)
+        if where:
+            where = f"({where})"
 
         join = [
             ("LEFT OUTER", "sales", "discogs_id = sales.d_sales_release_id"),
@@ -944,6 +1430,8 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             union=union if sales_extra else None,
             reverse_order=reverse_order,
             limit=limit,
+            # Placeholders appear in the main and the union SELECT's condition
+            values_tuple=tuple(values) * (2 if sales_extra else 1),
         )
         return rows
 
@@ -954,7 +1442,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
 
         Returns the same fields as key_value_search_release!
         """
-        where = f"d_sales_release_id == {release_id}"
+        where = {"d_sales_release_id": release_id}
         join = [("LEFT", "sales", "discogs_id = d_sales_release_id")]
 
         rows = self._select_simple(
@@ -1008,9 +1496,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
 
         Always returns a dict, not Row.
         """
-        if not listing_id:
-            listing_id = "NULL"
-        where = f"d_sales_listing_id == {listing_id}"
+        where = {"d_sales_listing_id": listing_id if listing_id else None}
 
         tui_first =["d_sales_listing_id"]
         fields = [
@@ -1089,7 +1575,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         instances = self._select_simple(
             ["d_coll_release_id", "d_coll_instance_id", "d_catno"],
             "collection",
-            f"d_coll_release_id = {release_id}",
+            {"d_coll_release_id": release_id},
             join=[("LEFT", "release", "d_coll_release_id = discogs_id")],
             as_dict=True,
         )
@@ -1126,14 +1612,14 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
             (sold, release_id),
         )
 
-    def get_sales_inventory(self, offset=0):
+    def get_sales_inventory(self, offset=0, iterate=False):
         """Get all Marketplace listing details from DB if already imported.
 
-        Always returns a dict, not Row.
+        Always returns a dict, not Row. With iterate=True a generator
+        streaming the rows is returned.
         """
-        if offset > 0:
-            offset = offset - 1
-        rows =  self._select_simple(
+        select = self.iter_rows if iterate else self._select_simple
+        rows = select(
             [
                 "d_sales_listing_id",
                 "d_sales_release_id",
@@ -1152,8 +1638,7 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
                 "d_sales_posted",
             ],
             "sales",
-            fetchone=False, condition=None, as_dict=True, offset=offset,
-            orderby="d_sales_listing_id DESC"
+            as_dict=True, offset=offset, orderby="d_sales_listing_id DESC"
         )
         return rows
 
@@ -1161,10 +1646,3 @@ class Collection (Database, DiscogsMixin):  # pylint: disable=too-many-public-me
         return self.execute_sql(
             "DELETE FROM sales WHERE d_sales_listing_id == ?", (listing_id,)
         )
-
-    def stats_sales_items_total(self):
-        sql_stats = '''
-                    SELECT COUNT(*) FROM sales;
-                    '''
-        stats = self._select(sql_stats, fetchone=True)
-        return stats[0] if stats else 0
@@ -1,17 +1,89 @@
 import logging
 # import pprint
+from contextlib import contextmanager
 from sqlite3 import Error as sqlerr
 import sqlite3
+from time import time
 
 log = logging.getLogger('discodos')
 
 
 class Database():
     """Shared database backend methods."""
+    # Prepared statements kept per connection by sqlite3 (default is 128).
+    # Conditions passed as bound values keep the SQL strings identical between
+    # calls, thus the compiled statements are reused.
+    STATEMENT_CACHE_SIZE = 256
+    # Defaults for batch(): Commit after this many rows or seconds.
+    BATCH_FLUSH_ROWS = 500
+    BATCH_FLUSH_SECONDS = 5
+    # Default number of rows fetched at once by _select_iter() and iter_rows()
+    ITER_CHUNK_SIZE = 500
+    # PRAGMA performance profiles. "default" is safe for interactive use,
+    # "bulk_import" trades durability of the very last transactions on power
+    # loss (never consistency) for speed. Settings are applied in this order,
+    # busy_timeout first, so switching journal_mode can wait for other
+    # connections. Overridable via config.yaml, see Config.db_profile().
+    DB_PROFILES = {
+        "default": {
+            "busy_timeout": 5000,
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "cache_size": -16000,  # negative values are KiB
+            "mmap_size": 0,
+            "temp_store": "DEFAULT",
+        },
+        "bulk_import": {
+            "busy_timeout": 10000,
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -64000,
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+    }
 
-    def __init__(self, db_conn=False, db_file=False, setup=False):
+    # DiscoBASE counters shown by `dsc stats`: column name -> (table, per row
+    # expression). Summing up the expression over all rows gives the counter.
+    # {row} is replaced by the table name in aggregate queries and by NEW/OLD
+    # in the triggers maintaining the optional stats_cache table.
+    STATS_COUNTERS = {
+        "releases_total": ("release", "1"),
+        "releases_matched": ("release", "{row}.m_match_time IS NOT NULL"),
+        "tracks_total": ("track", "1"),
+        "tracks_matched": ("track", "{row}.m_match_time IS NOT NULL"),
+        "tracks_key_brainz": ("track", "{row}.a_key IS NOT NULL"),
+        "tracks_bpm_brainz": ("track", "{row}.a_bpm IS NOT NULL"),
+        "tracks_key_manual": ("track_ext", "{row}.key IS NOT NULL"),
+        "tracks_bpm_manual": ("track_ext", "{row}.bpm IS NOT NULL"),
+        "collection_items_discobase": (
+            "collection", "{row}.coll_orphaned = 0"),
+        "sales_listings_discobase": ("sales", "1"),
+        "sales_listings_forsale": (
+            "sales", "{row}.d_sales_status IN ('forsale', 'expired')"),
+        "sales_listings_sold": ("sales", "{row}.d_sales_status = 'sold'"),
+        "sales_price_sum": (
+            "sales", "CASE WHEN {row}.d_sales_status IN ('forsale', 'expired') "
+                     "THEN COALESCE({row}.d_sales_price, 0) ELSE 0 END"),
+        "sales_price_count": (
+            "sales", "{row}.d_sales_status IN ('forsale', 'expired') "
+                     "AND {row}.d_sales_price IS NOT NULL"),
+        "sales_price_lower_sum": (
+            "sales", "CASE WHEN {row}.d_sales_status IN ('forsale', 'expired') "
+                     "AND {row}.d_sales_price < 15 "
+                     "THEN {row}.d_sales_price ELSE 0 END"),
+        "sales_price_lower_count": (
+            "sales", "{row}.d_sales_status IN ('forsale', 'expired') "
+                     "AND {row}.d_sales_price < 15"),
+        "mixtracks_total": ("mix_track", "1"),
+    }
+
+    def __init__(self, db_conn=False, db_file=False, setup=False,
+                 pragmas=None):
         self.db_not_found = False
         self.lastrowid = None
+        self._batch = None  # Unit of work state while in a batch() block
+        self.batch_failed_rows = 0  # Rolled back in the last batch() block
         if db_conn:
             log.debug("DB: db_conn argument was handed over.")
             self.db_conn = db_conn
@@ -32,6 +104,9 @@ class Database():
         self.cur = (
             self.db_conn.cursor()
         )  # we had this in each db function before
+        self.pragmas = (
+            pragmas if pragmas is not None else self.DB_PROFILES["default"]
+        )
         self.configure_db()  # set PRAGMA options
 
     def create_conn(self, db_file, setup=False):
@@ -39,10 +114,14 @@ class Database():
         # non-existent
         try:
             if setup:
-                conn = sqlite3.connect("file:{}".format(db_file), uri=True)
+                conn = sqlite3.connect(
+                    "file:{}".format(db_file), uri=True,
+                    cached_statements=self.STATEMENT_CACHE_SIZE
+                )
             else:
                 conn = sqlite3.connect(
-                    "file:{}?mode=rw".format(db_file), uri=True
+                    "file:{}?mode=rw".format(db_file), uri=True,
+                    cached_statements=self.STATEMENT_CACHE_SIZE
                 )
             return conn
         except sqlerr as e:
@@ -61,6 +140,8 @@ class Database():
     def execute_sql(self, sql, values_tuple=False, raise_err=False):
         """used for eg. creating tables or inserts"""
         log.info("DB: execute_sql: %s", sql)
+        if self._batch is not None:
+            return self._execute_sql_batched(sql, values_tuple, raise_err)
         try:
             with self.db_conn:  # auto commits and auto rolls back on exceptions
                 c = (
@@ -85,9 +166,240 @@ class Database():
             log.error("DB: %s", e.args[0])
             return False
 
+    def executemany_sql(self, sql, values_list, raise_err=False):
+        """Executes one statement for a list of value tuples.
+
+        Within a batch() block rows are queued and written via executemany
+        when the batch is flushed, errors surface then (see _flush_batch).
+        Outside a batch they are written and committed immediately. Returns
+        the number of rows handed over, or False on errors.
+        """
+        values_list = list(values_list)
+        log.info("DB: executemany_sql: %s (%s rows)", sql, len(values_list))
+        if self._batch is not None:
+            queued = self._batch["queue"].setdefault((sql, raise_err), [])
+            queued.extend(values_list)
+            self._batch["rows"] += len(values_list)
+            self._flush_batch_if_due()
+            return len(values_list)
+        try:
+            with self.db_conn:
+                self.cur.executemany(sql, values_list)
+            return len(values_list)
+        except sqlerr as e:
+            if raise_err:
+                log.debug("DB: Raising error to upper level.")
+                raise e
+            log.error("DB: %s", e.args[0])
+            return False
+
+    @contextmanager
+    def batch(self, flush_rows=None, flush_seconds=None):
+        """Unit of work: Defers commits of all writes within the block.
+
+        execute_sql statements are executed right away (rowcount, lastrowid
+        and errors work as usual) but only committed every flush_rows rows or
+        flush_seconds seconds. Rows handed to executemany_sql are queued and
+        written in one go on each flush (thus they are not visible to reads
+        before that). Everything pending is flushed and committed when the
+        block is left, also on exceptions - what has been done so far is kept,
+        just like without batching. If a queued statement fails, the pending
+        transaction is rolled back instead, see _flush_batch(). Nested batch()
+        blocks join the outer one.
+        """
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = {
+            "rows": 0,
+            "since": time(),
+            "queue": {},  # (sql, raise_err) -> list of value tuples
+            "failed_rows": 0,
+            "flush_rows": flush_rows or self.BATCH_FLUSH_ROWS,
+            "flush_seconds": flush_seconds or self.BATCH_FLUSH_SECONDS,
+        }
+        log.info("DB: Entering batch mode.")
+        try:
+            yield self
+        finally:
+            try:
+                self._flush_batch()
+            finally:
+                self.batch_failed_rows = self._batch["failed_rows"]
+                if self.batch_failed_rows:
+                    log.error("DB: Batch mode: %s rows were rolled back.",
+                              self.batch_failed_rows)
+                self._batch = None
+                log.info("DB: Left batch mode.")
+
+    def _execute_sql_batched(self, sql, values_tuple=False, raise_err=False):
+        """execute_sql variant without commit. SQLite rolls back failing
+        statements only, not the whole pending batch."""
+        try:
+            if values_tuple:
+                log.info("DB: ...with tuple: %s", values_tuple)
+                self.cur.execute(sql, values_tuple)
+            else:
+                self.cur.execute(sql)
+        except sqlerr as e:
+            if raise_err:
+                log.debug("DB: Raising error to upper level.")
+                raise e
+            log.error("DB: %s", e.args[0])
+            return False
+        self.lastrowid = self.cur.lastrowid
+        rowcount = self.cur.rowcount
+        self._batch["rows"] += 1
+        self._flush_batch_if_due()
+        return rowcount
+
+    def _flush_batch_if_due(self):
+        if (
+            self._batch["rows"] >= self._batch["flush_rows"]
+            or time() - self._batch["since"] >= self._batch["flush_seconds"]
+        ):
+            self._flush_batch()
+
+    def _flush_batch(self):
+        """Writes queued executemany rows and commits.
+
+        If a queued statement fails, the whole pending transaction is rolled
+        back, thus eg. a job item is never marked done without its data. The
+        error is raised if the statement was queued with raise_err, else
+        logged.
+        """
+        error = None
+        for (sql, raise_err), values_list in self._batch["queue"].items():
+            try:
+                self.db_conn.executemany(sql, values_list)
+            except sqlerr as e:
+                error = (e, raise_err)
+                break
+        self._batch["queue"] = {}
+        rows = self._batch["rows"]
+        self._batch["rows"] = 0
+        self._batch["since"] = time()
+        if error is None:
+            log.debug("DB: Committing batch of %s rows NOW", rows)
+            self.db_conn.commit()
+            return
+        e, raise_err = error
+        self.db_conn.rollback()
+        self._batch["failed_rows"] += rows
+        log.error("DB: Batch executemany: %s. Rolled back %s rows.",
+                  e.args[0], rows)
+        if raise_err:
+            log.debug("DB: Raising error to upper level.")
+            raise e
+
     def configure_db(self):
         settings = "PRAGMA foreign_keys = ON;"
         self.execute_sql(settings)
+        # Rows removed by REPLACE conflict resolution (release table) fire
+        # DELETE triggers only with this, required by stats_cache triggers.
+        self.execute_sql("PRAGMA recursive_triggers = ON;")
+        self.apply_pragmas(self.pragmas)
+
+    def apply_pragmas(self, pragmas):
+        """Applies a dict of PRAGMA performance settings to the connection.
+
+        Only settings of the known profiles are accepted (see DB_PROFILES),
+        unknown names or malformed values are logged and skipped. Returns a
+        dict of the values SQLite reports back after setting them.
+        """
+        applied = {}
+        known = self.DB_PROFILES["default"].keys()
+        for name, value in pragmas.items():
+            if name not in known or not str(value).lstrip("-").isalnum():
+                log.warning("DB: Ignoring PRAGMA setting %s = %s", name, value)
+                continue
+            try:
+                self.cur.execute(f"PRAGMA {name} = {value};")
+                self.cur.execute(f"PRAGMA {name};")
+                row = self.cur.fetchone()
+                applied[name] = row[0] if row else None
+            except sqlerr as e:  # eg. journal_mode while db is locked
+                log.warning("DB: PRAGMA %s = %s failed: %s", name, value, e)
+        log.debug("DB: PRAGMA settings in effect: %s", applied)
+        return applied
+
+    def get_db_file(self):
+        """Returns the path of the database file, None if in memory."""
+        row = self._select("PRAGMA database_list;", fetchone=True)
+        return (row["file"] or None) if row else None
+
+    def checkpoint(self):
+        """Writes back the WAL file into the database file.
+
+        Required before the database file is copied, eg. in backups.
+        """
+        try:
+            self.cur.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            busy = self.cur.fetchone()[0]
+            return not busy
+        except sqlerr as e:
+            log.error("DB: WAL checkpoint failed: %s", e)
+            return False
+
+    @staticmethod
+    def _build_upsert(table, columns, conflict_columns, values=None):
+        """Builds an INSERT ... ON CONFLICT DO UPDATE statement.
+
+        Args:
+            table (str): Table to write to.
+            columns (list): Columns to insert, including conflict_columns.
+            conflict_columns (list): Columns of the unique/primary key.
+            values (list, optional): SQL expressions per column, default is a
+                ? placeholder for each.
+
+        Returns:
+            str: The statement. All columns except conflict_columns are
+                updated with the new values on conflict.
+        """
+        values = values or ["?"] * len(columns)
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in columns
+            if column not in conflict_columns
+        )
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(values)}) "
+            f"ON CONFLICT({', '.join(conflict_columns)}) {action};"
+        )
+
+    @staticmethod
+    def _build_condition(conditions):
+        """Builds an AND-combined WHERE condition with ? placeholders.
+
+        Args:
+            conditions (dict): Column names as keys, optionally followed by a
+                comparison operator (eg. "track_pos >="), default is "==".
+
+        Returns:
+            tuple: condition string and a tuple of values to bind.
+        """
+        parts = []
+        for key in conditions:
+            column, _, operator = key.partition(" ")
+            parts.append(f"{column} {operator or '=='} ?")
+        return " AND ".join(parts), tuple(conditions.values())
+
+    def _stats_aggregate_sql(self):
+        """Builds one SELECT computing all STATS_COUNTERS.
+
+        Each table is scanned once, its counters are conditional SUMs.
+        """
+        tables = {}
+        for column, (table, expr) in self.STATS_COUNTERS.items():
+            tables.setdefault(table, []).append(
+                f"COALESCE(SUM({expr.format(row=table)}), 0) AS {column}"
+            )
+        subselects = [
+            f"(SELECT {', '.join(sums)} FROM {table})"
+            for table, sums in tables.items()
+        ]
+        return f"SELECT * FROM {', '.join(subselects)};"
 
     def _select_simple(
         self,
@@ -102,14 +414,16 @@ class Database():
         as_dict=False,
         union=None,
         reverse_order=False,
-        limit=None
+        limit=None,
+        values_tuple=None
     ):
         """Wrapper around the _select method. Puts together SELECT as string.
 
         Args:
             fields_list (list): Rields to select.
             table (str): Primary table.
-            condition (str, optional): WHERE clause condition.
+            condition (str or dict, optional): WHERE clause condition. A dict
+                is turned into bound conditions via _build_condition.
             offset (int, optional): Offset for pagination.
             fetchone (bool, optional): Fetch only one row.
             orderby (str, optional): ORDER BY clause.
@@ -120,11 +434,59 @@ class Database():
             union (list, optional): List of dicts representing UNION statements.
                 Each dict has keys: fields_list, table, condition, join.
             limit (int, optional): limit results.
+            values_tuple (tuple, optional): Values bound to ? placeholders in
+                conditions.
 
         Returns:
             Query results from _select.
         """
         log.debug("DB: _select_simple: fetchone = %s", fetchone)
+        select_str, values_tuple = self._build_select(
+            fields_list, table, condition=condition, offset=offset,
+            orderby=orderby, distinct=distinct, join=join, union=union,
+            reverse_order=reverse_order, limit=limit, values_tuple=values_tuple
+        )
+        return self._select(
+            select_str, fetchone, as_dict=as_dict, values_tuple=values_tuple
+        )
+
+    def iter_rows(self, fields_list, table, as_dict=False, chunk_size=None,
+                  **select_args):
+        """Streaming variant of _select_simple. Yields rows one by one.
+
+        Accepts the same keyword arguments as _select_simple (except
+        fetchone) and hands over to _select_iter.
+        """
+        select_str, values_tuple = self._build_select(
+            fields_list, table, **select_args
+        )
+        return self._select_iter(
+            select_str, as_dict=as_dict, values_tuple=values_tuple,
+            chunk_size=chunk_size
+        )
+
+    def _build_select(
+        self,
+        fields_list,
+        table,
+        condition=False,
+        offset=0,
+        orderby=False,
+        distinct=False,
+        join=None,
+        union=None,
+        reverse_order=False,
+        limit=None,
+        values_tuple=None
+    ):
+        """Puts together a SELECT statement, see _select_simple for args.
+
+        Returns:
+            tuple: SELECT string and a tuple of values to bind (or None).
+        """
+        if isinstance(condition, dict):
+            condition, condition_values = self._build_condition(condition)
+            values_tuple = condition_values + tuple(values_tuple or ())
         fields_str = ", ".join(fields_list)
         join_clause = ""
         limit_clause = ""
@@ -136,12 +498,11 @@ class Database():
         orderby_clause = f"ORDER BY {orderby}" if orderby else ""
         orderby_clause += " DESC" if reverse_order else ""
         select = "SELECT DISTINCT" if distinct else "SELECT"
-        if offset and limit:
-            limit_clause = f"LIMIT {limit} OFFSET {offset}"
-        elif offset:
-            limit_clause = f"LIMIT -1 OFFSET {offset}"
-        elif limit:
-            limit_clause = f"LIMIT {limit}"
+        if offset or limit:  # Bound too, to reuse statements when paging
+            limit_clause = "LIMIT ? OFFSET ?"
+            values_tuple = tuple(values_tuple or ()) + (
+                limit if limit else -1, offset if offset else 0
+            )
 
         # Build the main SELECT query
         main_select = (
@@ -174,15 +535,15 @@ class Database():
             if union_queries
             else f"{main_select} {orderby_clause} {limit_clause}"
         )
-        return self._select(select_str, fetchone, as_dict=as_dict)
+        return select_str, values_tuple
 
-    def _select(self, sql_select, fetchone=False, as_dict=False):
+    def _select(self, sql_select, fetchone=False, as_dict=False, values_tuple=None):
         """Executes sql selects in two possible ways: fetchone or fetchall
-           It's completely string based and not aware of tuple based
-           values substitution in sqlite3 cursor objects.
+           Values can optionally be bound to ? placeholders via values_tuple.
 
         @param sql_select (string): the complete sql select statement
         @param fetchone (bool): defaults to False (return multiple rows)
+        @param values_tuple (tuple): optional values bound to ? placeholders
         @return (type is depending on running mode)
             fetchone = True:
                 something found: sqlite3.Row (dict-like) object
@@ -195,7 +556,11 @@ class Database():
                 enabled! Silently ignored if fetchone is False.
         """
         log.info("DB: _select: %s", sql_select)
-        self.cur.execute(sql_select)
+        if values_tuple:
+            log.info("DB: ...with tuple: %s", values_tuple)
+            self.cur.execute(sql_select, values_tuple)
+        else:
+            self.cur.execute(sql_select)
         try:
             rows = self.cur.fetchone() if fetchone else self.cur.fetchall()
             log.debug("DB: _select: fetchone() or fetchall() successful.",)
@@ -232,6 +597,38 @@ class Database():
             return dict_rows
         return rows
 
+    def _select_iter(self, sql_select, as_dict=False, values_tuple=None,
+                     chunk_size=None):
+        """Executes a select and yields the resulting rows one by one.
+
+        In contrast to _select, rows are fetched in chunks via fetchmany(),
+        thus memory usage stays flat no matter how many rows are found. A
+        separate cursor is used, writes while iterating are fine.
+
+        @param sql_select (string): the complete sql select statement
+        @param as_dict (bool): yield dicts instead of sqlite3.Row objects
+        @param values_tuple (tuple): optional values bound to ? placeholders
+        @param chunk_size (int): rows per fetchmany(), default ITER_CHUNK_SIZE
+        @return generator of sqlite3.Row (dict-like) objects or dicts
+        """
+        log.info("DB: _select_iter: %s", sql_select)
+        cursor = self.db_conn.cursor()
+        try:
+            if values_tuple:
+                log.info("DB: ...with tuple: %s", values_tuple)
+                cursor.execute(sql_select, values_tuple)
+            else:
+                cursor.execute(sql_select)
+            while True:
+                rows = cursor.fetchmany(chunk_size or self.ITER_CHUNK_SIZE)
+                if not rows:
+                    break
+                log.debug("DB: _select_iter: Fetched %s rows.", len(rows))
+                for row in rows:
+                    yield {**row} if as_dict else row
+        finally:
+            cursor.close()
+
     def debug_db(self, db_return):
         # print(dbr.keys())
         print()
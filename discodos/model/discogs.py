@@ -1,4 +1,3 @@
-import time
 import logging
 from socket import gaierror
 import discogs_client
@@ -7,6 +6,8 @@ from discogs_client import Release
 import requests.exceptions
 import urllib3.exceptions
 
+from discodos.model.discogs_cache import CachingFetcher
+from discodos.model.discogs_ratelimit import RateLimiter
 from discodos.utils import (
     is_number,
     RECORD_CHOICES_RADIO,
@@ -29,12 +30,16 @@ class NoListingIDError(Exception):
 class DiscogsMixin:
     """Discogs connection, fetchers and helpers."""
     def discogs_connect(self, user_token=None, app_identifier=None,
-                        discogs=None):
+                        discogs=None, cache=None):
         """Discogs connect try,except wrapper sets attributes d, me and ONLINE.
+
+        All requests are paced by a RateLimiter (attribute rate_limiter). If a
+        DiscogsCache is passed, GET requests are answered from it.
         """
         self.d = None
         self.me = None
         self.ONLINE = False
+        self.rate_limiter = None
         try:
             if discogs:
                 self.d = discogs
@@ -45,6 +50,13 @@ class DiscogsMixin:
             self.d = discogs_client.Client(
                 app_identifier, user_token=user_token
             )
+            # Pace all requests, cache hits don't cost a token.
+            self.rate_limiter = RateLimiter()
+            self.rate_limiter.install(self.d._fetcher)  # pylint: disable=protected-access
+            if cache is not None:
+                self.d._fetcher = CachingFetcher(  # pylint: disable=protected-access
+                    self.d._fetcher, cache  # pylint: disable=protected-access
+                )
             self.me = self.d.identity()
             self.ONLINE = True
         except Exception:  # pylint: disable=broad-exception-caught
@@ -496,21 +508,22 @@ class DiscogsMixin:
             log.error("Exception while trying to remove Marketplace listing: %s", Exc)
             return False
 
-    def rate_limit_slow_downer(self, remaining=10, sleep=2):
-        '''Discogs util: stay in 60/min rate limit'''
-        if int(self.d._fetcher.rate_limit_remaining) < remaining:  # pylint: disable=protected-access
-            log.info(
-                "Discogs request rate limit is about to exceed, "
-                "let's wait a little: %s",
-                self.d._fetcher.rate_limit_remaining  # pylint: disable=protected-access
-            )
-            # while int(self.d._fetcher.rate_limit_remaining) < remaining:
-            time.sleep(sleep)
-        else:
+    def log_rate_limit_stats(self):
+        '''Discogs util: logs the rate limiter stats
+
+        Requests are paced by the RateLimiter installed in discogs_connect.
+        Without one (a client handed over to discogs_connect), only the
+        remaining quota Discogs reported last is logged.
+        '''
+        if self.rate_limiter:
+            stats = self.rate_limiter.stats
             log.info(
-                "Discogs rate limit: %s remaining.",
-                self.d._fetcher.rate_limit_remaining  # pylint: disable=protected-access
+                "Discogs rate limiter: %s requests, %.1fs waited, %s throttled.",
+                stats["requests"], stats["wait_seconds"], stats["throttled"]
             )
+            return
+        left = getattr(self.d._fetcher, "rate_limit_remaining", None)  # pylint: disable=protected-access
+        log.info("Discogs rate limit: %s remaining.", left)
 
     # Discogs data helpers
 
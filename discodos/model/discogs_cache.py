@@ -0,0 +1,205 @@
+import logging
+import sqlite3
+import threading
+from time import time
+from urllib.parse import urlsplit
+
+log = logging.getLogger('discodos')
+
+
+class DiscogsCache():
+    """Persistent response cache for Discogs API GET requests.
+
+    Responses are stored in a small SQLite database next to the DiscoBASE,
+    keyed by endpoint (eg. releases), resource ID and query string. Each
+    endpoint has its own time to live; requests to endpoints with a TTL of 0
+    (collection, marketplace, identity, search, ...) are never cached.
+    Expired entries are revalidated via If-None-Match/If-Modified-Since if
+    Discogs sent an ETag or Last-Modified header before.
+    """
+    # Time to live in seconds per endpoint. Overridable via config.yaml, see
+    # Config.discogs_cache_ttls().
+    TTLS = {
+        "releases": 30 * 86400,
+        "masters": 30 * 86400,
+        "artists": 7 * 86400,
+        "labels": 7 * 86400,
+    }
+
+    def __init__(self, cache_file, ttls=None, refresh=False):
+        self.ttls = ttls if ttls is not None else dict(self.TTLS)
+        self.refresh = refresh  # Ignore fresh entries, always re-download
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0}
+        self._lock = threading.Lock()
+        self.db_conn = sqlite3.connect(str(cache_file), check_same_thread=False)
+        self.db_conn.execute("PRAGMA journal_mode = WAL")
+        self.db_conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                endpoint TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                query TEXT NOT NULL DEFAULT '',
+                content BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (endpoint, resource_id, query)
+            )""")
+        self.db_conn.commit()
+        log.debug("DiscogsCache: Using %s, TTLs: %s", cache_file, self.ttls)
+
+    @staticmethod
+    def cache_key(url):
+        """Splits an API URL into (endpoint, resource_id, query).
+
+        Only plain resource URLs like /releases/123 are cacheable, sub-resources
+        like /releases/123/rating/user return None.
+        """
+        parts = urlsplit(url)
+        path = parts.path.strip("/").split("/")
+        if len(path) != 2 or not path[1]:
+            return None
+        return path[0], path[1], parts.query
+
+    def ttl(self, endpoint):
+        return int(self.ttls.get(endpoint, 0) or 0)
+
+    def count(self, stat):
+        """Increments a stats counter, fetches run in several threads."""
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key):
+        """Returns (content, etag, last_modified, fresh) or None."""
+        with self._lock:
+            row = self.db_conn.execute(
+                "SELECT content, etag, last_modified, fetched_at FROM http_cache "
+                "WHERE endpoint = ? AND resource_id = ? AND query = ?",
+                key
+            ).fetchone()
+        if row is None:
+            return None
+        content, etag, last_modified, fetched_at = row
+        fresh = (not self.refresh
+                 and time() - fetched_at < self.ttl(key[0]))
+        return content, etag, last_modified, fresh
+
+    def store(self, key, content, etag=None, last_modified=None):
+        with self._lock:
+            self.db_conn.execute(
+                "INSERT INTO http_cache (endpoint, resource_id, query, content, "
+                "etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(endpoint, resource_id, query) DO UPDATE SET "
+                "content = excluded.content, etag = excluded.etag, "
+                "last_modified = excluded.last_modified, "
+                "fetched_at = excluded.fetched_at",
+                (*key, content, etag, last_modified, time())
+            )
+            self.db_conn.commit()
+
+    def touch(self, key):
+        """Marks a revalidated entry fresh again."""
+        with self._lock:
+            self.db_conn.execute(
+                "UPDATE http_cache SET fetched_at = ? "
+                "WHERE endpoint = ? AND resource_id = ? AND query = ?",
+                (time(), *key)
+            )
+            self.db_conn.commit()
+
+    def invalidate(self, endpoint, resource_id):
+        """Drops all entries of a resource, eg. after a POST or DELETE."""
+        with self._lock:
+            self.db_conn.execute(
+                "DELETE FROM http_cache WHERE endpoint = ? AND resource_id = ?",
+                (endpoint, resource_id)
+            )
+            self.db_conn.commit()
+
+    def purge_expired(self):
+        """Deletes entries that are expired and can't be revalidated."""
+        now = time()
+        with self._lock:
+            rows = self.db_conn.execute(
+                "SELECT endpoint, resource_id, query, fetched_at FROM http_cache "
+                "WHERE etag IS NULL AND last_modified IS NULL"
+            ).fetchall()
+            expired = [row[:3] for row in rows
+                       if now - row[3] >= self.ttl(row[0])]
+            self.db_conn.executemany(
+                "DELETE FROM http_cache "
+                "WHERE endpoint = ? AND resource_id = ? AND query = ?",
+                expired
+            )
+            self.db_conn.commit()
+        return len(expired)
+
+
+class CachingFetcher():
+    """Wraps a discogs_client fetcher and answers GETs from a DiscogsCache.
+
+    Attributes not defined here (rate_limit_remaining, backoff_enabled, ...)
+    are looked up on and set on the wrapped fetcher.
+    """
+    def __init__(self, fetcher, cache):
+        self.fetcher = fetcher
+        self.cache = cache
+        self._local = threading.local()  # Response headers per thread
+        # Fetchers only return content and status code, we need the headers
+        # of the underlying requests response for ETag/Last-Modified.
+        request = fetcher.request
+
+        def recording_request(*args, **kwargs):
+            resp = request(*args, **kwargs)
+            self._local.headers = resp.headers
+            return resp
+        fetcher.request = recording_request
+
+    def __getattr__(self, name):
+        return getattr(self.fetcher, name)
+
+    def __setattr__(self, name, value):
+        # Client sets eg. backoff_enabled and timeouts on its _fetcher.
+        if name in ("fetcher", "cache", "_local"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.fetcher, name, value)
+
+    def fetch(self, client, method, url, data=None, headers=None,
+              json_format=True):
+        key = self.cache.cache_key(url)
+        if key is None or self.cache.ttl(key[0]) <= 0:
+            return self.fetcher.fetch(client, method, url, data, headers,
+                                      json_format)
+        if method != "GET":
+            self.cache.invalidate(key[0], key[1])
+            return self.fetcher.fetch(client, method, url, data, headers,
+                                      json_format)
+
+        cached = self.cache.get(key)
+        headers = dict(headers or {})
+        if cached:
+            content, etag, last_modified, fresh = cached
+            if fresh:
+                self.cache.count("hits")
+                log.debug("DiscogsCache: Hit %s", url)
+                return content, 200
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        self._local.headers = {}
+        content, status_code = self.fetcher.fetch(
+            client, method, url, data, headers, json_format
+        )
+        if status_code == 304 and cached:
+            self.cache.count("revalidated")
+            log.debug("DiscogsCache: Not modified %s", url)
+            self.cache.touch(key)
+            return cached[0], 200
+        self.cache.count("misses")
+        if status_code == 200:
+            resp_headers = self._local.headers
+            self.cache.store(key, content, resp_headers.get("ETag"),
+                             resp_headers.get("Last-Modified"))
+        return content, status_code
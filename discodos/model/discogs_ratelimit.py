@@ -0,0 +1,113 @@
+import logging
+import random
+import threading
+from time import monotonic, sleep
+
+from discogs_client.fetchers import RequestsFetcher
+
+log = logging.getLogger('discodos')
+
+
+class RateLimiter():
+    """Token bucket pacing all requests of a discogs_client fetcher.
+
+    Tokens refill at the rate Discogs allows (60 requests per minute
+    authenticated, 25 unauthenticated). Each request takes one token or waits
+    for the next one. The X-Discogs-Ratelimit* response headers recalibrate
+    the rate and drain the bucket if the quota was used up elsewhere (eg. by
+    another DiscoDOS session). HTTP 429 responses are retried with exponential
+    back-off instead of discogs_client's own back-off, so retries are paced
+    too.
+    """
+    RATE_LIMIT_AUTHENTICATED = 60  # requests per minute
+    RATE_LIMIT_UNAUTHENTICATED = 25
+    BURST = 1  # Bucket size, 1 means strict pacing
+    JITTER = 0.1  # Max. seconds added randomly to each wait
+    BACKOFF_BASE = 2  # Seconds to wait after the first 429, doubled on each
+    BACKOFF_MAX = 60
+    MAX_ATTEMPTS = 6
+
+    def __init__(self, rate_limit=RATE_LIMIT_AUTHENTICATED, burst=BURST):
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = monotonic()
+        self.stats = {"requests": 0, "waits": 0, "wait_seconds": 0.0,
+                      "throttled": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Tokens per second."""
+        return self.rate_limit / 60
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def acquire(self):
+        """Takes a token, sleeps until it is available. Returns seconds waited.
+
+        The token is reserved before sleeping, so concurrent callers queue up
+        behind each other instead of waking up all at once.
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.stats["requests"] += 1
+        if wait > 0:
+            wait += random.uniform(0, self.JITTER)
+            with self._lock:
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += wait
+            log.debug("RateLimiter: Waiting %.2fs", wait)
+            sleep(wait)
+        return wait
+
+    def update(self, headers):
+        """Calibrates rate and bucket from Discogs response headers."""
+        limit = headers.get("X-Discogs-Ratelimit")
+        remaining = headers.get("X-Discogs-Ratelimit-Remaining")
+        with self._lock:
+            if limit and str(limit).isdigit() and int(limit) > 0:
+                self.rate_limit = int(limit)
+            if remaining is not None and str(remaining).isdigit():
+                self._refill()
+                # Discogs knows best what is left in the current window.
+                self.tokens = min(self.tokens, int(remaining) - 1)
+
+    def backoff(self, attempt):
+        """Sleeps after a 429 response, empties the bucket."""
+        wait = min(self.BACKOFF_BASE * 2 ** attempt, self.BACKOFF_MAX)
+        wait += random.uniform(0, self.JITTER)
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0)
+            self.stats["throttled"] += 1
+            self.stats["wait_seconds"] += wait
+        log.info("Discogs rate limit exceeded, backing off %.1fs", wait)
+        sleep(wait)
+
+    def install(self, fetcher):
+        """Wraps the request method of a discogs_client fetcher."""
+        if isinstance(fetcher, RequestsFetcher):
+            self.rate_limit = self.RATE_LIMIT_UNAUTHENTICATED
+        fetcher.backoff_enabled = False  # We do it ourselves
+        request = fetcher.request
+
+        def paced_request(*args, **kwargs):
+            for attempt in range(self.MAX_ATTEMPTS):
+                self.acquire()
+                resp = request(*args, **kwargs)
+                self.update(resp.headers)
+                if resp.status_code != 429:
+                    return resp
+                if attempt < self.MAX_ATTEMPTS - 1:
+                    self.backoff(attempt)
+            return resp
+        fetcher.request = paced_request
+        return fetcher
@@ -10,8 +10,8 @@ log = logging.getLogger('discodos')
 # mix model class
 class Mix (Database):
 
-    def __init__(self, db_conn, mix_name_or_id, db_file=False):
-        super(Mix, self).__init__(db_conn, db_file)
+    def __init__(self, db_conn, mix_name_or_id, db_file=False, pragmas=None):
+        super(Mix, self).__init__(db_conn, db_file, pragmas=pragmas)
         # figuring out names and IDs, just logs and sets instance
         # attributes, no exits here!
         self.name_or_id = mix_name_or_id
@@ -145,9 +145,7 @@ class Mix (Database):
         log.info("MODEL: Returning track {} from mix {}.".format(
             track_id, self.id)
         )
-        _where = 'mix_track.mix_id == {} AND mix_track.track_pos == {}'.format(
-            self.id, track_id
-        )
+        _where = {'mix_track.mix_id': self.id, 'mix_track.track_pos': track_id}
         _join = '''mix_track INNER JOIN mix
                      ON mix.mix_id = mix_track.mix_id
                        INNER JOIN release
@@ -178,10 +176,7 @@ class Mix (Database):
         track_ext_cols=['key', 'bpm', 'key_notes', 'notes', 'm_rec_id_override']
         values_mix_track = ''  # mix_track update
         values_list_mix_track = []
-        values_track_ext = ''  # track_ext update
-        values_list_track_ext = []
-        cols_insert_track_ext = ''  # track_ext insert
-        values_insert_track_ext = ''  # (the tuple is the same obviously)
+        values_list_track_ext = []  # track_ext upsert
 
         mix_track_edit = False  # decide if it's table mix_track or track_ext
         track_ext_edit = False
@@ -193,112 +188,71 @@ class Mix (Database):
             if key in track_ext_cols:
                 track_ext_edit = True
 
-        if mix_track_edit:
-            # save current track order if pos-edit included
-            if 'track_pos' in edit_answers:
-                move_to = int(edit_answers['track_pos'])
-                # when moving the track "up"
-                if move_to < track_details['track_pos']:
-                    all_after_dest_pos = self.get_tracks_from_position(
-                        edit_answers['track_pos'])
-                    # shift all those tracks "down" +1
-                    self.reorder_tracks_squeeze_in(
-                        edit_answers['track_pos'],
-                        all_after_dest_pos
-                    )
-                # when moving the track "down"
-                elif move_to > track_details['track_pos']:
-                    # we set dest pos to be one further down to really be the
-                    # chosen destination after reorder_pos (see below db update)
-                    edit_answers['track_pos'] = move_to + 1
-                    all_after_dest_pos = self.get_tracks_from_position(
-                        edit_answers['track_pos'])
-                    # shift all those tracks "down" +1
-                    self.reorder_tracks_squeeze_in(
-                        edit_answers['track_pos'],
-                        all_after_dest_pos)
-                # no else: nothing to do if track_pos stays the same
-                # FIXME somehow we should user inform like this:
-                # this track will be put in after/bevore track "name" ok?
-
-            update_mix_track = 'UPDATE mix_track SET '
-            where_mix_track = 'WHERE mix_track_id == {}'.format(
-                track_details['mix_track_id'])
-            for key, answer in edit_answers.items():
-                log.debug('key: {}, value: {}'.format(key, answer))
-                if key in mix_track_cols:
-                    if values_mix_track == '':
-                        values_mix_track += "{} = ? ".format(key)
-                    else:
-                        values_mix_track += ", {} = ? ".format(key)
-                    values_list_mix_track.append(answer)
-            final_update_mix_track = update_mix_track + values_mix_track + where_mix_track
-            # debug
-            # log.info('MODEL: {}'.format(final_update_mix_track))
-            # log.info(log.info('MODEL: {}'.format(tuple(values_list_mix_track))))
-
-            log.info("MODEL: Now really executing mix_track update...")
-            updated_mix_track = self.execute_sql(
-                final_update_mix_track, tuple(values_list_mix_track))
-
-            # finish "track moving":
-            # after original track_pos was edited we fill in the gap
-            if 'track_pos' in edit_answers:
-                self.reorder_tracks(int(track_details['track_pos']) - 1)
-            # FIXME no sanity check if this was ok
+        # Squeeze in, update and reorder in one transaction
+        with self.batch():
+            if mix_track_edit:
+                # save current track order if pos-edit included
+                if 'track_pos' in edit_answers:
+                    move_to = int(edit_answers['track_pos'])
+                    # when moving the track "up"
+                    if move_to < track_details['track_pos']:
+                        # shift all tracks from dest pos on "down" +1
+                        self.reorder_tracks_squeeze_in(edit_answers['track_pos'])
+                    # when moving the track "down"
+                    elif move_to > track_details['track_pos']:
+                        # we set dest pos to be one further down to really be the
+                        # chosen destination after reorder_pos (see below db update)
+                        edit_answers['track_pos'] = move_to + 1
+                        # shift all tracks from dest pos on "down" +1
+                        self.reorder_tracks_squeeze_in(edit_answers['track_pos'])
+                    # no else: nothing to do if track_pos stays the same
+                    # FIXME somehow we should user inform like this:
+                    # this track will be put in after/bevore track "name" ok?
+
+                update_mix_track = 'UPDATE mix_track SET '
+                where_mix_track = 'WHERE mix_track_id == {}'.format(
+                    track_details['mix_track_id'])
+                for key, answer in edit_answers.items():
+                    log.debug('key: {}, value: {}'.format(key, answer))
+                    if key in mix_track_cols:
+                        if values_mix_track == '':
+                            values_mix_track += "{} = ? ".format(key)
+                        else:
+                            values_mix_track += ", {} = ? ".format(key)
+                        values_list_mix_track.append(answer)
+                final_update_mix_track = update_mix_track + values_mix_track + where_mix_track
+                # debug
+                # log.info('MODEL: {}'.format(final_update_mix_track))
+                # log.info(log.info('MODEL: {}'.format(tuple(values_list_mix_track))))
+
+                log.info("MODEL: Now really executing mix_track update...")
+                updated_mix_track = self.execute_sql(
+                    final_update_mix_track, tuple(values_list_mix_track))
+
+                # finish "track moving":
+                # after original track_pos was edited we fill in the gap
+                if 'track_pos' in edit_answers:
+                    self.reorder_tracks(int(track_details['track_pos']) - 1)
+                # FIXME no sanity check if this was ok
 
         if track_ext_edit:
-            update_track_ext = 'UPDATE track_ext SET '
-            insert_track_ext = 'INSERT INTO track_ext'
-            where_track_ext = 'WHERE d_release_id == {} AND d_track_no == \"{}\"'.format(
-                track_details['d_release_id'], track_details['d_track_no'])
+            cols_track_ext = []
             for key, answer in edit_answers.items():
                 log.debug('key: {}, value: {}'.format(key, answer))
                 if key in track_ext_cols:
-                    if values_track_ext == '':
-                        values_track_ext += "{} = ? ".format(key)
-                    else:
-                        values_track_ext += ", {} = ? ".format(key)
+                    cols_track_ext.append(key)
                     values_list_track_ext.append(answer)
-
-                    if values_insert_track_ext == '':
-                        cols_insert_track_ext += "{}".format(key)
-                        values_insert_track_ext += "?"
-                    else:
-                        cols_insert_track_ext += ", {}".format(key)
-                        values_insert_track_ext += ", ?"
-                    # the list is the same as with update
-
-            final_update_track_ext = update_track_ext + values_track_ext + where_track_ext
-            final_insert_track_ext = "{} ({}, d_release_id, d_track_no) VALUES ({}, ?, ?)".format(
-                insert_track_ext, cols_insert_track_ext, values_insert_track_ext)
-
-            # debug
-            # log.info('MODEL: {}'.format(final_update_track_ext))
-            # log.info('MODEL: {}'.format(tuple(values_list_track_ext)))
-
-            # log.info('MODEL: {}'.format(final_insert_track_ext))
-            values_insert_list_track_ext = values_list_track_ext[:]
-            values_insert_list_track_ext.append(track_details['d_release_id'])
-            values_insert_list_track_ext.append(track_details['d_track_no'])
-            # log.info('MODEL: {}'.format(tuple(values_insert_list_track_ext)))
-
-            log.info("MODEL: Now really executing track_ext update/insert...")
-            # log.info(values_list_track_ext)
-            # log.info(tuple(values_list_track_ext))
-
-            dbret = self.execute_sql(
-                final_update_track_ext,
-                tuple(values_list_track_ext)
+            upsert_track_ext = self._build_upsert(
+                'track_ext',
+                ['d_release_id', 'd_track_no', *cols_track_ext],
+                ['d_release_id', 'd_track_no'],
+            )
+            log.info("MODEL: Now really executing track_ext upsert...")
+            updated_track_ext = self.execute_sql(
+                upsert_track_ext,
+                (track_details['d_release_id'], track_details['d_track_no'],
+                 *values_list_track_ext)
             )
-            if dbret == 0:  # checks rowcount
-                log.info("MODEL: UPDATE didn't change anything, "
-                         "trying INSERT...")
-                dbret = self.execute_sql(
-                    final_insert_track_ext,
-                    tuple(values_insert_list_track_ext)
-                )
-            updated_track_ext = dbret
 
         # finally update mix table with current timestamp (only if changed)
         if updated_mix_track or updated_track_ext:
@@ -319,94 +273,74 @@ class Mix (Database):
         # return db.get_tracks_from_position(self.db_conn, self.id, pos)
         return self._select_simple(
             ['mix_track_id', 'track_pos'], 'mix_track',
-            condition="mix_id = {} AND track_pos >= {}".format(self.id, pos),
+            condition={"mix_id": self.id, "track_pos >=": pos},
             orderby='track_pos ASC'
         )
 
     def reorder_tracks(self, pos):
+        """Renumbers all tracks from pos on gaplessly, starting at pos.
+
+        A single UPDATE, each track's new position is pos plus the number of
+        tracks sorting before it. Uses a correlated subquery rather than
+        UPDATE ... FROM, which requires SQLite 3.33.
+        """
         log.info("MODEL: Reordering tracks in mix, "
                  "starting at pos {}".format(pos))
-        tracks_to_shift = self.get_tracks_from_position(pos)
-        if not tracks_to_shift:
-            return False
-        for t in tracks_to_shift:
-            log.info("MODEL: Shifting mix_track_id %i from pos %i to %i",
-                     t['mix_track_id'], t['track_pos'], pos)
-            sql_upd = '''
-                UPDATE mix_track SET track_pos = ?
-                  WHERE mix_track_id == ?'''
-            ids_tuple = (pos, t['mix_track_id'])
-            if not self.execute_sql(sql_upd, ids_tuple):
-                return False
-            pos = pos + 1
+        sql_upd = '''
+            UPDATE mix_track SET track_pos = ? + (
+                SELECT COUNT(*) FROM mix_track AS prev
+                WHERE prev.mix_id == mix_track.mix_id
+                AND prev.track_pos >= ?
+                AND (prev.track_pos < mix_track.track_pos
+                     OR (prev.track_pos == mix_track.track_pos
+                         AND prev.mix_track_id < mix_track.mix_track_id))
+            )
+            WHERE mix_id == ? AND track_pos >= ?'''
+        if not self.execute_sql(sql_upd, (pos, pos, self.id, pos)):
+            return False  # no tracks to reorder or error
         return self._updated_timestamp()
 
-    def reorder_tracks_squeeze_in(self, pos, tracks_to_shift):
+    def reorder_tracks_squeeze_in(self, pos, tracks_to_shift=None):
+        """Shifts tracks one position down to make room at pos.
+
+        Shifts the given tracks (rows containing mix_track_id), or if None,
+        all tracks from pos on. A single UPDATE statement.
+        """
         log.info("MODEL: Reordering because a track was squeezed in at pos "
                  "{}.".format(pos))
-        if not tracks_to_shift:
+        if tracks_to_shift is None:
+            sql_upd = '''UPDATE mix_track SET track_pos = track_pos + 1
+                         WHERE mix_id == ? AND track_pos >= ?'''
+            values = (self.id, pos)
+        elif not tracks_to_shift:
+            return False
+        else:
+            placeholders = ", ".join(["?"] * len(tracks_to_shift))
+            sql_upd = f'''UPDATE mix_track SET track_pos = track_pos + 1
+                          WHERE mix_track_id IN ({placeholders})'''
+            values = tuple(t['mix_track_id'] for t in tracks_to_shift)
+        if not self.execute_sql(sql_upd, values):
             return False
-        for t in tracks_to_shift:
-            new_pos = t['track_pos'] + 1
-            log.info("MODEL: Shifting mix_track_id %i from pos %i to %i",
-                     t['mix_track_id'], t['track_pos'], new_pos)
-            sql_upd = 'UPDATE mix_track SET track_pos = ? WHERE mix_track_id == ?'
-            ids_tuple = (new_pos, t['mix_track_id'])
-            if not self.execute_sql(sql_upd, ids_tuple):
-                return False
         return self._updated_timestamp()
 
     def shift_track(self, pos, direction):
+        """Swaps the track at pos with its neighbour above or below.
+
+        A single UPDATE, only executed if both tracks exist.
+        """
         if direction != 'up' and direction != 'down':
             log.error('MODEL: shift_track: wrong usage.')
             return False
-        # get mix_track_id of track to shift, the one before and the one after
-        tr_before = self._select_simple(
-            ['mix_track_id'], 'mix_track', fetchone=True,
-            condition="mix_id = {} AND track_pos == {}".format(self.id, pos - 1)
-        )
-        tr = self._select_simple(
-            ['mix_track_id'], 'mix_track', fetchone=True,
-            condition="mix_id = {} AND track_pos == {}".format(self.id, pos)
-        )
-        tr_after = self._select_simple(
-            ['mix_track_id'], 'mix_track', fetchone=True,
-            condition="mix_id = {} AND track_pos == {}".format(self.id, pos + 1)
-        )
-        log.debug('before: {}, shift_track: {}, after: {}'.format(
-            tr_before['mix_track_id'], tr['mix_track_id'],
-            tr_after['mix_track_id'])
-        )
-
-        if direction == 'up':
-            tr_before_pos = pos       # is now the same as the orig track
-            tr_pos = pos - 1          # is now one less than before
-            # tr_after_pos = pos + 1  # stays the same
-
-            sql_upd_tr_bef = 'UPDATE mix_track SET track_pos = ? WHERE mix_track_id == ?'
-            ids_tr_bef = (tr_before_pos, tr_before['mix_track_id'])
-            sql_upd_tr = 'UPDATE mix_track SET track_pos = ? WHERE mix_track_id == ?'
-            ids_tr = (tr_pos, tr['mix_track_id'])
-
-            ret_tr = self.execute_sql(sql_upd_tr, ids_tr)
-            ret_tr_bef = self.execute_sql(sql_upd_tr_bef, ids_tr_bef)
-            ret_tr_aft = True
-
-        elif direction == 'down':
-            # tr_before_pos = pos - 1  # stays the same
-            tr_pos = pos + 1           # is now one more than before
-            tr_after_pos = pos         # is now the same as the orig track
-
-            sql_upd_tr = 'UPDATE mix_track SET track_pos = ? WHERE mix_track_id == ?'
-            ids_tr = (tr_pos, tr['mix_track_id'])
-            sql_upd_tr_aft = 'UPDATE mix_track SET track_pos = ? WHERE mix_track_id == ?'
-            ids_tr_aft = (tr_after_pos, tr_after['mix_track_id'])
-
-            ret_tr_bef = True
-            ret_tr = self.execute_sql(sql_upd_tr, ids_tr)
-            ret_tr_aft = self.execute_sql(sql_upd_tr_aft, ids_tr_aft)
-
-        if not ret_tr and ret_tr_bef and ret_tr_aft:
+        other_pos = pos - 1 if direction == 'up' else pos + 1
+        sql_upd = '''
+            UPDATE mix_track SET track_pos = CASE track_pos
+                WHEN ? THEN ? ELSE ? END
+            WHERE mix_id == ? AND track_pos IN (?, ?)
+            AND (SELECT COUNT(*) FROM mix_track
+                 WHERE mix_id == ? AND track_pos IN (?, ?)) == 2'''
+        values = (pos, other_pos, pos, self.id, pos, other_pos,
+                  self.id, pos, other_pos)
+        if self.execute_sql(sql_upd, values) != 2:
             log.error('MODEL: shift_track: one or more track updates failed.')
             return False
         log.info(
@@ -458,9 +392,9 @@ class Mix (Database):
                               LEFT OUTER JOIN track_ext
                               ON mix_track.d_release_id = track_ext.d_release_id
                               AND mix_track.d_track_no = track_ext.d_track_no
-                        WHERE mix_track.mix_id == {}
-                        {}'''.format(self.id, order_clause)
-        return self._select(sql_sel, fetchone=False)
+                        WHERE mix_track.mix_id == ?
+                        {}'''.format(order_clause)
+        return self._select(sql_sel, fetchone=False, values_tuple=(self.id, ))
 
     def add_track(self, release_id, track_no, track_pos, trans_rating='', trans_notes=''):
         log.info('MODEL: Adding track to current mix.')
@@ -480,15 +414,15 @@ class Mix (Database):
         log.info('MODEL: Getting last track in current mix')
         return self._select_simple(
             ['MAX(track_pos)'], 'mix_track',
-            condition="mix_id = {}".format(self.id), fetchone=True
+            condition={"mix_id": self.id}, fetchone=True
         )
 
     def get_tracks_of_one_mix(self, start_pos=False):
         log.info("MODEL: Getting tracks of a mix, from mix_track_table only)")
         if not start_pos:
-            where = "mix_id == {}".format(self.id)
+            where = {"mix_id": self.id}
         else:
-            where = "mix_id == {} and track_pos >= {}".format(self.id, start_pos)
+            where = {"mix_id": self.id, "track_pos >=": start_pos}
         return self._select_simple(
             ['*'], 'mix_track', where, fetchone=False, orderby='track_pos'
         )
@@ -507,7 +441,7 @@ class Mix (Database):
         @author
         """
         self.mix_info = self._select_simple(
-            ['*'], 'mix', "mix_id == {}".format(self.id), fetchone=True)
+            ['*'], 'mix', {"mix_id": self.id}, fetchone=True)
         return self.mix_info
 
     def update_mix_info(self, mix_details, edit_answers):
@@ -541,10 +475,9 @@ class Mix (Database):
     def get_mix_tracks_for_brainz_update(self, start_pos=False):
         log.info("MODEL: Getting tracks of a mix. Preparing for Discogs or AcousticBrainz update.")
         if not start_pos:
-            where = "mix_id == {}".format(self.id)
+            where = {"mix_id": self.id}
         else:
-            where = "mix_id == {} and track_pos >= {}".format(
-                self.id, start_pos)
+            where = {"mix_id": self.id, "track_pos >=": start_pos}
         tables = '''mix_track
                       INNER JOIN release
                       ON mix_track.d_release_id = release.discogs_id
@@ -563,9 +496,6 @@ class Mix (Database):
 
     def get_all_mix_tracks_for_brainz_update(self, offset=0):
         log.info("MODEL: Getting all tracks of all mix. Preparing for Discogs or AcousticBrainz update.")
-        if offset > 0:
-            log.info('MODEL: Add 1 to offset (FIXME why?)')
-            offset = offset - 1
         tables = '''mix_track
                       INNER JOIN release
                       ON mix_track.d_release_id = release.discogs_id
@@ -152,3 +152,24 @@ def extract_discogs_id_regex(release_id):
 
 def timestamp_now():
     return datetime.today().isoformat(" ", "seconds")
+
+
+def fts_match_expr(term, columns=None):
+    """Returns an FTS5 MATCH expression for a user search term or None.
+
+    Every word is searched as a prefix and all words have to match. A term
+    enclosed in double quotes is searched as an exact phrase. Words are
+    delimited by whitespace or % (the wildcard used in LIKE based searches).
+    """
+    term = str(term).strip()
+    if len(term) > 1 and term.startswith('"') and term.endswith('"'):
+        words = [w for w in term[1:-1].replace('"', '').split() if re.search(r"\w", w)]
+        expr = '"{}"'.format(" ".join(words)) if words else ""
+    else:
+        words = [w.replace('"', '') for w in re.split(r"[\s%]+", term)]
+        expr = " ".join(f'"{w}"*' for w in words if re.search(r"\w", w))
+    if not expr:
+        return None
+    if columns:
+        return "{{{}}} : ({})".format(" ".join(columns), expr)
+    return expr
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from discodos.config import Db_setup
+
+SQL_TABLES = "SELECT name FROM sqlite_master WHERE type == 'table' ORDER BY rowid;"
+
+
+def apply_schema_upgrades(test, db_path, *versions):
+    """Runs the tasks of schema upgrades on a test's DiscoBASE.
+
+    The fixture DiscoBASE is shared by all tests of a class, thus the tables
+    created are dropped again when the test is done, also if it fails.
+    Returns the Db_setup instance.
+    """
+    setup = Db_setup(db_path)
+    existing = {row["name"] for row in setup._select(SQL_TABLES) or []}
+    for upgrade in setup.sql_upgrades:
+        if upgrade["schema_version"] in versions:
+            for task in upgrade["tasks"].values():
+                setup.execute_sql(task, raise_err=True)
+    created = [row["name"] for row in setup._select(SQL_TABLES) or []
+               if row["name"] not in existing]
+    for table in created:  # Added last, dropped first (foreign keys)
+        test.addCleanup(setup.execute_sql, f"DROP TABLE {table};")
+    return setup
+
+
+def remove_db_files(path):
+    """Removes an SQLite database file and the WAL files left over by open
+    connections."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
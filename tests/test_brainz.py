@@ -1,12 +1,35 @@
 from pprint import pprint
 import inspect
+import json
 import os
 import unittest
 from pathlib import Path
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from shutil import copy2
+from threading import Thread, current_thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+from unittest.mock import MagicMock, Mock, patch
 
 from discodos.config import Config
-from discodos.model import Brainz, Brainz_match
+from discodos.ctrl import CollectionControlCommandline
+from discodos.model import (AcousticBrainzCache, Brainz, Brainz_match,
+                            CatnoNormalizer, Collection, MusicBrainzCache,
+                            MusicBrainzIndex)
+from tests.helpers import apply_schema_upgrades, remove_db_files
+
+
+class ImmediatePool():
+    """Stands in for a worker lane, runs submitted calls right away."""
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(func(*args))
+        return future
 
 
 class TestBrainz(unittest.TestCase):
@@ -170,23 +193,297 @@ class TestBrainz(unittest.TestCase):
             self.assertFalse(ab_return)
         print("{} - {} - END".format(self.clname, name))
 
+    def test_get_accbr_features_fetched_once(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        cache_path = self.db_path.parent / 'acousticbrainz_cache.db'
+        low_level = {
+            'rhythm': {'bpm': 108.1},
+            'tonal': {'key_key': 'A#', 'key_scale': 'minor',
+                      'chords_key': 'F', 'chords_scale': 'major'},
+        }
+        with patch.object(Brainz, 'musicbrainz_connect', return_value=False):
+            self.brainz = Brainz(self.mb_user, self.mb_pass, self.mb_appid,
+                                 accbr_cache=AcousticBrainzCache(cache_path))
+        with patch.object(Brainz, '_get_accbr_low_level',
+                          return_value=low_level) as fetch:
+            mb_id = 'fa9b7b2d-e9bb-4122-a725-4f865dd4648a'
+            self.assertEqual(self.brainz.get_accbr_key(mb_id), 'A#m')
+            self.assertEqual(self.brainz.get_accbr_chords_key(mb_id), 'F')
+            self.assertEqual(self.brainz.get_accbr_bpm(mb_id), 108.1)
+            self.assertEqual(fetch.call_count, 1)
+            # A new session finds it on disk
+            self.brainz.accbr_cache = AcousticBrainzCache(cache_path)
+            self.assertEqual(self.brainz.get_accbr_bpm(mb_id), 108.1)
+            self.assertEqual(fetch.call_count, 1)
+            # Unless refreshing
+            self.brainz.accbr_cache = AcousticBrainzCache(cache_path,
+                                                          refresh=True)
+            self.assertEqual(self.brainz.get_accbr_bpm(mb_id), 108.1)
+            self.assertEqual(fetch.call_count, 2)
+        remove_db_files(cache_path)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_fetch_accbr_features_bulk(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        requests_seen = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            """Local AcousticBrainz stub, knows every MBID but 'missing-*'."""
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                mb_ids = query['recording_ids'][0].split(';')
+                requests_seen.append(mb_ids)
+                body = {mb_id: {'0': {'rhythm': {'bpm': 120 + num}}}
+                        for num, mb_id in enumerate(mb_ids)
+                        if not mb_id.startswith('missing')}
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        with patch.object(Brainz, 'musicbrainz_connect', return_value=False):
+            self.brainz = Brainz(self.mb_user, self.mb_pass, self.mb_appid)
+        self.brainz.ACCBR_URL = 'http://127.0.0.1:{}'.format(server.server_port)
+        mb_ids = ['rec-{}'.format(num) for num in range(30)] + ['missing-1']
+        self.assertEqual(self.brainz.fetch_accbr_features_bulk(mb_ids), 30)
+        self.assertEqual([len(ids) for ids in requests_seen], [25, 6])
+        self.assertEqual(self.brainz.get_accbr_bpm('rec-1'), 121)
+        self.assertIsNone(self.brainz.get_accbr_bpm('missing-1'))
+        self.assertIsNone(self.brainz.get_accbr_key('rec-1'))  # not in stub data
+        self.assertEqual(len(requests_seen), 2)  # all answered from cache
+        # Paced by the AcousticBrainz lane's own rate limiter
+        self.assertEqual(self.brainz.accbr_rate_limiter.stats['requests'], 2)
+        server.shutdown()
+        server.server_close()
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_mb_release_lookup_cached(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        cache_path = self.db_path.parent / 'musicbrainz_cache.db'
+        mb_id = 'c4b619f1-5ae2-45e5-b848-71290e97eb69'
+        mb_release = {'release': {'id': mb_id, 'title': 'The Crane'}}
+        with patch.object(Brainz, 'musicbrainz_connect', return_value=False), \
+                patch('discodos.model.brainz.m.get_release_by_id',
+                      return_value=mb_release) as lookup:
+            mb_cache = MusicBrainzCache(cache_path)
+            brainz = Brainz(self.mb_user, self.mb_pass, self.mb_appid,
+                            mb_cache=mb_cache)
+            other = Brainz(self.mb_user, self.mb_pass, self.mb_appid,
+                           mb_cache=mb_cache)
+            self.assertEqual(brainz.get_mb_release_by_id(mb_id), mb_release)
+            self.assertEqual(other.get_mb_release_by_id(mb_id), mb_release)
+            self.assertEqual(lookup.call_count, 1)
+            # The next run finds it on disk, unless refreshing
+            brainz.mb_cache = MusicBrainzCache(cache_path)
+            self.assertEqual(brainz.get_mb_release_by_id(mb_id), mb_release)
+            self.assertEqual(lookup.call_count, 1)
+            brainz.mb_cache = MusicBrainzCache(cache_path, refresh=True)
+            brainz.get_mb_release_by_id(mb_id)
+            self.assertEqual(lookup.call_count, 2)
+        remove_db_files(cache_path)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_match_recording_set_track(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        with patch.object(Brainz, 'musicbrainz_connect', return_value=False):
+            bmatch = Brainz_match(self.mb_user, self.mb_pass, self.mb_appid,
+                  8620643, 'The Crane', 'NONPLUS034',
+                  'Source Direct', 'The Crane', 'A', 1)
+        bmatch.mb_matched_rel = {'release': {'medium-list': [{'track-list': [
+            {'number': 'A', 'position': '1',
+             'recording': {'id': 'rec-a', 'title': 'The Crane'}},
+            {'number': 'AA', 'position': '2',
+             'recording': {'id': 'rec-aa', 'title': 'The Crane (Remix)'}},
+        ]}]}}
+        self.assertEqual(bmatch.match_recording(), 'rec-a')
+        bmatch.set_track('The Crane (Remix)', 'AA', 2)  # same release
+        self.assertEqual(bmatch.match_recording(), 'rec-aa')
+        self.assertEqual(bmatch.rec_match_method, 'Track Name')
+        print("{} - {} - END".format(self.clname, name))
+
     def test_catno_match_cutter_var_2(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
-        print(self.mb_appid)
-        bmatch = Brainz_match(self.mb_user, self.mb_pass, self.mb_appid, 
-              6762725, 'Imperial Propaganda', 'MONNOM BLACK 005',
-              'Dax J', 'Imperial Propaganda', 'A1', 1)
-        # no auto-ws-stripping here, in reality done after fetch mb_releases
-        cutter_return = bmatch._catno_cutter('MONNOMBLACK005', 'BLACK')
-        self.assertEqual(cutter_return['before'], 'MONNOM')
-        self.assertEqual(cutter_return['term'], 'BLACK')
-        self.assertEqual(cutter_return['after'], '005')
+        with patch.object(Brainz, 'musicbrainz_connect', return_value=False):
+            bmatch = Brainz_match(self.mb_user, self.mb_pass, self.mb_appid,
+                  6762725, 'Imperial Propaganda', 'MONNOM005',
+                  'Dax J', 'Imperial Propaganda', 'A1', 1)
+        bmatch.mb_releases = {'release-list': [
+            {'id': 'rel-other', 'title': 'Other'},
+            {'id': 'rel-monnom', 'title': 'Imperial Propaganda'},
+        ]}
+        label_infos = {
+            'rel-other': [{'catalog-number': 'OTHER 005'}, {}],
+            'rel-monnom': [{'catalog-number': 'MONNOM BLACK 005'}],
+        }
+        with patch.object(Brainz_match, 'get_mb_release_by_id', side_effect=(
+                lambda mbid: {'release': {'label-info-list': label_infos[mbid]}})):
+            self.assertFalse(bmatch.catno_match())  # no exact match
+            self.assertEqual(bmatch.catno_match(variations=True), 'rel-monnom')
+        self.assertEqual(bmatch.release_match_method, 'CatNo (var 2)')
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_local_mb_index(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        apply_schema_upgrades(self, self.db_path, 12)
+        collection = Collection(False, self.db_path)
+        normalizer = CatnoNormalizer()
+        rec_mbid = '1c0ea4bc-2f4b-4da0-9d2c-4d0a6b2e1e11'
+        doc = {
+            'id': 'rel-url', 'title': 'Material Love',
+            'relations': [{'type': 'discogs', 'url': {
+                'resource': 'https://www.discogs.com/release/123456'}}],
+            'label-info': [{'catalog-number': 'RAW 623'}],
+            'media': [{'position': 1, 'tracks': [
+                {'position': 1, 'number': 'A', 'title': 'Material Love',
+                 'recording': {'id': rec_mbid, 'title': 'Material Love'}}]}],
+        }
+        release = MusicBrainzIndex.parse_release(doc, normalizer)
+        self.assertEqual(release['d_release_ids'], [123456])
+        collection.upsert_mb_index_release(release)
+        collection.upsert_mb_index_release(MusicBrainzIndex.parse_release(
+            {'id': 'rel-catno', 'title': 'Material Love',
+             'label-info': [{'catalog-number': 'RAW623CD'}], 'media': []},
+            normalizer))
+        mb_index = MusicBrainzIndex(collection)
+        found = mb_index.search_releases(123456, normalizer.keys('Raw 623'))
+        self.assertEqual([rel['id'] for rel in found['release-list']],
+                         ['rel-url', 'rel-catno'])  # linked first
+        self.assertEqual(mb_index.get_release('missing'), {})
+
+        with patch.object(Brainz, 'musicbrainz_connect') as connect:
+            bmatch = Brainz_match(self.mb_user, self.mb_pass, self.mb_appid,
+                  123456, 'Material Love', 'Raw 623', 'Cafe Del Mar',
+                  'Material Love', 'A', 1, mb_index=mb_index)
+            bmatch.fetch_mb_releases(detail=2)
+            self.assertEqual(bmatch.match_release(), 'rel-url')
+            self.assertEqual(bmatch.release_match_method, 'Discogs URL')
+            bmatch.fetch_mb_matched_rel()
+            self.assertEqual(bmatch.match_recording(), rec_mbid)
+            # Other Discogs release, same catalog number
+            bmatch = Brainz_match(self.mb_user, self.mb_pass, self.mb_appid,
+                  999, 'Material Love', 'RAW623', 'Cafe Del Mar',
+                  'Material Love', 'A', 1, mb_index=mb_index)
+            bmatch.fetch_mb_releases(detail=1)
+            self.assertEqual(bmatch.match_release(), 'rel-url')
+            self.assertEqual(bmatch.release_match_method, 'CatNo (exact)')
+        connect.assert_not_called()  # offline
+        print("{} - {} - END".format(self.clname, name))
+
+    def offline_ctrl(self):
+        """Returns a controller using the test DiscoBASE, offline."""
+        user = Mock(WANTS_ONLINE=False)
+        user.conf.db_profile.return_value = Collection.DB_PROFILES['default']
+        return CollectionControlCommandline(False, user, None, None,
+                                            self.db_path)
+
+    def brainz_ctrl(self):
+        """Returns an offline controller with *Brainz and DiscoBASE writes
+        mocked."""
+        ctrl = self.offline_ctrl()
+        ctrl.collection = MagicMock()
+        ctrl.brainz = Mock()
+        ctrl.cli = Mock()
+        return ctrl
+
+    def test_lane_collection(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        ctrl = self.offline_ctrl()
+        lane = ctrl.lane_collection()  # File of the main connection
+        self.assertIsNot(lane.db_conn, ctrl.collection.db_conn)
+        self.assertEqual(Path(lane.get_db_file()), self.db_path)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_prefetch_accbr_features_window(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        ctrl = self.brainz_ctrl()
+        pool = ImmediatePool()
+        consumed = []
+
+        def matches():  # Every 20th track matched a recording
+            for track_id in range(60):
+                consumed.append(track_id)
+                rec_mbid = f'rec-{track_id}' if track_id % 20 == 0 else None
+                yield {'id': track_id}, {'rec_mbid': rec_mbid}
+
+        prefetched = ctrl.prefetch_accbr_features(matches(), pool)
+        first = next(prefetched)
+        # Not held back until 25 recordings came together
+        self.assertEqual(len(consumed), ctrl.BRAINZ_ACCBR_WINDOW)
+        tracks = [first] + list(prefetched)
+        self.assertEqual([track['id'] for track, _ in tracks], list(range(60)))
+        self.assertEqual(pool.submitted,
+                         [(['rec-0', 'rec-20'],), (['rec-40'],)])
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_update_tracks_from_brainz_pipeline(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        ctrl = self.brainz_ctrl()
+        threads = {'discogs': set(), 'musicbrainz': set(),
+                   'acousticbrainz': set(), 'writes': set()}
+        leads, written = [], []
+
+        def fetch_discogs_release(discogs_id):
+            threads['discogs'].add(current_thread().name)
+            return f'd_rel-{discogs_id}'
+
+        def match_track_brainz(track, d_rel, detail, memo):
+            threads['musicbrainz'].add(current_thread().name)
+            leads.append(track['discogs_id'] - len(written))
+            sleep(0.001 * (track['discogs_id'] % 3))  # Uneven pace
+            matched = track['discogs_id'] % 20 == 0  # 5% recordings found
+            return {
+                'skip': None, 'error': None, 'notes': [], 'discogs_fetches': 0,
+                'release_mbid': f'rel-{track["discogs_id"]}',
+                'rec_mbid': f'rec-{track["discogs_id"]}' if matched else None,
+                'd_artist': 'Artist', 'd_track_name': 'Title',
+                'release_match_method': 'Discogs URL',
+                'rec_match_method': 'Track No' if matched else None,
+            }
+
+        def upsert_track_brainz(discogs_id, *args):
+            threads['writes'].add(current_thread().name)
+            written.append(discogs_id)
+            return 1
+
+        ctrl.collection.fetch_discogs_release.side_effect = fetch_discogs_release
+        ctrl.match_track_brainz = match_track_brainz
+        ctrl.brainz.fetch_accbr_features_bulk.side_effect = (
+            lambda mb_ids: threads['acousticbrainz'].add(current_thread().name))
+        ctrl.brainz.get_accbr_features.return_value = {
+            'key': 'Am', 'chords_key': 'C', 'bpm': 120.0}
+        ctrl.collection.upsert_track_brainz.side_effect = upsert_track_brainz
+        tracks = [{'discogs_id': discogs_id, 'd_track_no': 'A1',
+                   'discogs_title': 'Title', 'm_rec_id_override': None}
+                  for discogs_id in range(300)]
+        self.assertTrue(ctrl.update_tracks_from_brainz(tracks))
+        self.assertEqual(written, list(range(300)))  # In order
+        # Tracks are written steadily, not once the stream ended. Matching
+        # runs at most the lane windows ahead of writing.
+        self.assertLess(max(leads), 100)
+        # One lane per service, writes in this thread only
+        self.assertEqual(threads['writes'], {current_thread().name})
+        for service in ('discogs', 'musicbrainz', 'acousticbrainz'):
+            self.assertEqual(len(threads[service]), 1)
+            self.assertTrue(threads[service].pop().startswith(service))
         print("{} - {} - END".format(self.clname, name))
 
     @classmethod
     def tearDownClass(self):
-        os.remove(self.db_path)
+        remove_db_files(self.db_path)
         print("\nTestBrainz.teardownClass: done")
 
 if __name__ == '__main__':
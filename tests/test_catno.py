@@ -0,0 +1,62 @@
+import inspect
+import unittest
+
+from discodos.model.catno import CatnoNormalizer
+
+
+class TestCatnoNormalizer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        name = inspect.currentframe().f_code.co_name
+        cls.clname = cls.__name__  # Classname, used in test output
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        print("{} - {} - END\n".format(cls.clname, name))
+
+    def test_keys(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        normalizer = CatnoNormalizer()
+        self.assertEqual(normalizer.canonical(' nonplus 034 '), 'NONPLUS034')
+        keys = normalizer.keys('mon nom black 005')
+        self.assertEqual(next(iter(keys)), 'MONNOMBLACK005')  # canonical first
+        self.assertEqual(keys['MONNOM005'], 'CatNo (var 2)')
+        self.assertEqual(normalizer.keys('ABC123CD')['ABC123'], 'CatNo (var 3)')
+        self.assertEqual(normalizer.keys('ABC123D')['ABC123'], 'CatNo (var 1)')
+        self.assertEqual(normalizer.keys('ABC-D-123')['ABC123'], 'CatNo (var 2)')
+        self.assertEqual(normalizer.keys(''), {})
+        self.assertEqual(normalizer.keys(None), {})
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_match(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        normalizer = CatnoNormalizer()
+        d_keys = normalizer.keys('MONNOM BLACK 005')
+        self.assertEqual(
+            normalizer.match(d_keys, normalizer.keys('monnomblack005'),
+                             variations=False),
+            'CatNo (exact)'
+        )
+        self.assertIsNone(normalizer.match(
+            d_keys, normalizer.keys('MONNOM005'), variations=False))
+        self.assertEqual(
+            normalizer.match(d_keys, normalizer.keys('MONNOM005')),
+            'CatNo (var 2)'
+        )
+        self.assertIsNone(normalizer.match(d_keys, normalizer.keys('OTHER005')))
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_rules(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        normalizer = CatnoNormalizer({'suffixes': ['lp'], 'middle_terms': []})
+        self.assertEqual(normalizer.keys('ABC123LP'),
+                         {'ABC123LP': 'CatNo (exact)', 'ABC123': 'CatNo (var 1)'})
+        self.assertEqual(normalizer.keys('ABC123D'),
+                         {'ABC123D': 'CatNo (exact)'})
+        self.assertNotEqual(normalizer.rules_id, CatnoNormalizer().rules_id)
+        print("{} - {} - END\n".format(self.clname, name))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
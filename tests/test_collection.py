@@ -4,11 +4,13 @@ import os
 import unittest
 from pathlib import Path
 from shutil import copy2
-from sqlite3 import Row
+from sqlite3 import IntegrityError, Row
 from unittest.mock import Mock
 
-from discodos.config import Config
-from discodos.model import Collection
+from discodos.config import Config, Db_setup
+from discodos.ctrl import CollectionControlCommandline
+from discodos.model import CatnoNormalizer, Collection
+from tests.helpers import apply_schema_upgrades, remove_db_files
 
 
 class TestCollection(unittest.TestCase):
@@ -172,6 +174,352 @@ class TestCollection(unittest.TestCase):
         self.assertEqual(db_return[1]['chosen_bpm'], 125)
         print("{} - {} - END".format(self.clname, name))
 
+    def test_select_simple_bound_condition(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        condition, values = collection._build_condition(
+            {'mix_id': 1, 'track_pos >=': 3}
+        )
+        self.assertEqual(condition, 'mix_id == ? AND track_pos >= ?')
+        self.assertEqual(values, (1, 3))
+        # Quotes in values don't break the statement
+        db_return = collection._select_simple(
+            ['discogs_id'], 'release', {'discogs_title': 'Foley "Room\''}
+        )
+        self.assertEqual(db_return, [])
+        db_return = collection._select_simple(
+            ['discogs_id'], 'release', {'discogs_id >': 0},
+            orderby='discogs_id', limit=2, offset=1
+        )
+        self.assertEqual(len(db_return), 2)
+        self.assertEqual(db_return[0]['discogs_id'], 123456)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_batch(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        other_conn = Collection(False, self.db_path)
+        with collection.batch(flush_rows=1000, flush_seconds=600):
+            collection.create_release(1001, 'Batch Title', 'Batch Artist', 'BA 1')
+            collection.executemany_sql(
+                'UPDATE release SET d_catno = ? WHERE discogs_id == ?',
+                [('BA 2', 1001)]
+            )
+            # Visible in this connection already, not committed yet though.
+            self.assertEqual(
+                collection.get_release_by_id(1001)['d_catno'], 'BA 1'
+            )
+            self.assertIsNone(other_conn.get_release_by_id(1001))
+        # Flushed and committed when leaving the block
+        self.assertEqual(other_conn.get_release_by_id(1001)['d_catno'], 'BA 2')
+        # Work done so far is kept on exceptions
+        with self.assertRaises(ValueError):
+            with collection.batch():
+                collection.delete_release(1001)
+                raise ValueError
+        self.assertIsNone(other_conn.get_release_by_id(1001))
+        # A failing queued statement rolls back the pending transaction
+        with collection.batch():
+            collection.create_release(1001, 'Batch Title', 'Batch Artist', 'BA 1')
+            collection.executemany_sql(
+                'INSERT INTO release (discogs_id) VALUES (?)', [(None,)]
+            )
+        self.assertIsNone(other_conn.get_release_by_id(1001))
+        self.assertEqual(collection.batch_failed_rows, 2)
+        # ...and raises if it was queued with raise_err
+        with self.assertRaises(IntegrityError):
+            with collection.batch():
+                collection.executemany_sql(
+                    'INSERT INTO release (discogs_id) VALUES (?)', [(None,)],
+                    raise_err=True,
+                )
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_pragma_profiles(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        self.assertEqual(
+            collection._select("PRAGMA journal_mode;", fetchone=True)[0], 'wal'
+        )
+        bulk = Collection(
+            False, self.db_path, pragmas=Collection.DB_PROFILES['bulk_import']
+        )
+        self.assertEqual(  # 1 = NORMAL
+            bulk._select("PRAGMA synchronous;", fetchone=True)[0], 1
+        )
+        applied = bulk.apply_pragmas(
+            {'cache_size': -2000, 'user_version': 0, 'temp_store': '1; DROP'}
+        )
+        self.assertEqual(applied, {'cache_size': -2000})
+        self.assertTrue(bulk.checkpoint())
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_mark_orphaned_collection_items(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        orphaned = collection.mark_orphaned_collection_items(
+            [26575804, 26576730, 187706087]
+        )
+        self.assertEqual(orphaned, [1922242509])
+        with collection.batch():  # Works within a unit of work as well
+            self.assertEqual(  # already marked ones are not returned again
+                collection.mark_orphaned_collection_items([26575804]),
+                [26576730, 187706087]
+            )
+        # Release 919698 is still used in a mix
+        self.assertNotIn(919698, [
+            release['discogs_id'] for release in collection.get_orphaned_releases()
+        ])
+        collection.execute_sql("UPDATE collection SET coll_orphaned = 0")
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_get_orphaned_releases(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        collection.create_release(1003, 'Orphan', 'Artist', 'OR 1')
+        orphaned = collection.get_orphaned_releases()
+        self.assertIn(1003, [release['discogs_id'] for release in orphaned])
+        self.assertNotIn(123456, [release['discogs_id'] for release in orphaned])
+        self.assertEqual(
+            list(collection.get_orphaned_releases(iterate=True)), orphaned
+        )
+        collection.delete_release(1003)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_metadata_and_collection_state(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        # Table missing in schema v4 fixture
+        self.assertEqual(collection.get_metadata('collection_count', 0), 0)
+        apply_schema_upgrades(self, self.db_path, 7)
+        state = collection.get_collection_state()
+        self.assertEqual(
+            state['collection_count'],
+            len(collection.get_collection_instance_ids())
+        )
+        self.assertEqual(collection.set_metadata(state), len(state))
+        self.assertEqual(
+            collection.get_metadata('collection_ids_hash'),
+            state['collection_ids_hash']
+        )
+        self.assertEqual(
+            collection.get_metadata('collection_count'),
+            str(state['collection_count'])
+        )
+        collection.set_metadata({'collection_count': None})
+        self.assertIsNone(collection.get_metadata('collection_count', 0))
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_accbr_features(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        mb_id = 'e8bfb39b-36f1-4d65-be3c-61b05b3f67de'
+        self.assertIn(mb_id, collection.get_known_rec_mbids())
+        # Table missing in schema v4 fixture
+        self.assertIsNone(collection.get_accbr_features(mb_id))
+        apply_schema_upgrades(self, self.db_path, 9)
+        self.assertEqual(
+            collection.upsert_accbr_features([(mb_id, 'Am', 'C', 123.4)]), 1
+        )
+        self.assertEqual(
+            collection.get_accbr_features(mb_id.upper()),
+            {'key': 'Am', 'chords_key': 'C', 'bpm': 123.4}
+        )
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_brainz_attempt_backoff(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        backoff = Collection.BRAINZ_BACKOFF
+        collection = Collection(False, self.db_path)
+        # Table missing in schema v4 fixture, nothing is skipped
+        self.assertFalse(collection.record_brainz_attempt(
+            123456, 'a1', 1, 'no_mb_release'))
+        total = collection.count_all_tracks_for_brainz_update()
+        self.assertEqual(
+            collection.count_all_tracks_for_brainz_update(backoff=backoff), total
+        )
+        setup = apply_schema_upgrades(self, self.db_path, 10)
+        collection = Collection(False, self.db_path)
+        collection.record_brainz_attempt(123456, 'a1', 1, 'no_mb_release')
+        collection.record_brainz_attempt(123456, 'A1', 1, 'no_mb_recording')
+        attempt = collection.get_brainz_attempt(123456, 'a1')
+        self.assertEqual(attempt['attempt_failures'], 2)
+        self.assertEqual(attempt['attempt_reason'], 'no_mb_recording')
+        self.assertEqual(  # Failed recently
+            collection.count_all_tracks_for_brainz_update(backoff=backoff),
+            total - 1
+        )
+        self.assertEqual(  # Higher detail level tries again
+            collection.count_all_tracks_for_brainz_update(backoff=backoff,
+                                                          detail=2), total
+        )
+        # Second failure backs off 48 hours
+        setup.execute_sql(
+            "UPDATE brainz_attempt SET attempt_time = "
+            "datetime('now', 'localtime', '-47 hours');")
+        self.assertEqual(
+            collection.count_all_tracks_for_brainz_update(backoff=backoff),
+            total - 1
+        )
+        setup.execute_sql(
+            "UPDATE brainz_attempt SET attempt_time = "
+            "datetime('now', 'localtime', '-49 hours');")
+        self.assertEqual(
+            collection.count_all_tracks_for_brainz_update(backoff=backoff), total
+        )
+        collection.record_brainz_attempt(123456, 'A1', 1)  # Matched
+        self.assertEqual(
+            collection.get_brainz_attempt(123456, 'A1')['attempt_failures'], 0
+        )
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_catno_keys(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        normalizer = CatnoNormalizer()
+        collection = Collection(False, self.db_path)
+        # Table missing in schema v4 fixture
+        self.assertIsNone(collection.update_catno_keys(normalizer))
+        apply_schema_upgrades(self, self.db_path, 7, 11)
+        processed = collection.update_catno_keys(normalizer)
+        self.assertGreater(processed, 0)
+        self.assertEqual(collection.update_catno_keys(normalizer), 0)  # done
+        release = collection.get_release_by_id(123456)
+        keys = normalizer.keys(release['d_catno'])
+        self.assertLessEqual(set(keys), collection.get_catno_keys())
+        # Other rules, all keys are outdated
+        self.assertEqual(collection.update_catno_keys(
+            CatnoNormalizer({'suffixes': []})), processed)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_job_journal(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        # Tables missing in schema v4 fixture
+        self.assertIsNone(collection.create_job('import_test', '{}', [1, 2]))
+        apply_schema_upgrades(self, self.db_path, 8)
+        job_id = collection.create_job('import_test', '{}', [1, 2, 3])
+        self.assertIsNotNone(job_id)
+        with collection.batch():
+            collection.set_job_item_done(job_id, 2)
+        job = collection.get_unfinished_job('import_test', '{}')
+        self.assertEqual(job['job_id'], job_id)
+        self.assertEqual(job['job_items'], 3)
+        self.assertEqual(collection.get_job_pending_keys(job_id), {'1', '3'})
+        # Other parameters, other job
+        self.assertIsNone(collection.get_unfinished_job('import_test', '{"a": 1}'))
+        collection.finish_job(job_id)
+        self.assertIsNone(collection.get_unfinished_job('import_test', '{}'))
+        self.assertEqual(collection.get_job_pending_keys(job_id), set())
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_job_journal_resume(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        apply_schema_upgrades(self, self.db_path, 8)
+        user = Mock(WANTS_ONLINE=False)
+        user.conf.db_profile.return_value = Collection.DB_PROFILES['default']
+        ctrl = CollectionControlCommandline(False, user, None, None,
+                                            self.db_path)
+        ctrl.cli = Mock()
+        items = [{'id': item_id} for item_id in range(1, 7)]
+        processed = []
+
+        def run(resume):
+            job_id, pending, done = ctrl.start_job(
+                'import_test', (item['id'] for item in items), resume)
+            with ctrl.collection.batch():
+                for item in ctrl.journal_items(
+                    job_id, pending, items, lambda item: item['id']
+                ):
+                    if item['id'] == 4 and not resume:
+                        raise KeyboardInterrupt
+                    processed.append(item['id'])
+            return job_id, done
+
+        with self.assertRaises(KeyboardInterrupt):
+            run(resume=False)
+        self.assertEqual(processed, [1, 2, 3])
+        processed.clear()
+        job_id, done = run(resume=True)
+        self.assertEqual(done, 3)
+        self.assertEqual(processed, [4, 5, 6])  # Exactly the remaining ones
+        job = ctrl.collection._select(
+            "SELECT job_status FROM job WHERE job_id == ?;", fetchone=True,
+            values_tuple=(job_id,))
+        self.assertEqual(job['job_status'], 'done')
+        self.assertIsNone(ctrl.collection.get_unfinished_job('import_test', '{}'))
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_upsert_tracks(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        self.assertEqual(collection.upsert_track(1002, 'a1', 'Name', 'Artist'), 1)
+        self.assertEqual(  # existing track is updated
+            collection.upsert_track(1002, 'A1', 'New Name', 'Artist'), 1
+        )
+        self.assertEqual(collection.upsert_tracks([
+            (1002, 'a2', 'Name 2', 'Artist'), (1002, 'b1', 'Name 3', 'Artist')
+        ]), 2)
+        collection.upsert_track_brainz(1002, 'b1', 'rec-id', 'method', 'Am',
+                                       'Am', 126.5)
+        self.assertTrue(collection.upsert_track_ext(
+            {'d_release_id': 1002, 'd_track_no': 'b1'}, {'bpm': 127}
+        ))
+        self.assertTrue(collection.upsert_track_ext(
+            {'d_release_id': 1002, 'd_track_no': 'b1'}, {'key': 'Am'}
+        ))
+        tracks = collection._select_simple(
+            ['d_track_no'], 'track', condition={'d_release_id': 1002},
+            orderby='d_track_no'
+        )
+        self.assertEqual(
+            [track['d_track_no'] for track in tracks], ['A1', 'A2', 'B1']
+        )
+        self.assertEqual(collection.get_track(1002, 'a1')['d_track_name'], 'New Name')
+        track = collection.get_track(1002, 'b1')
+        self.assertEqual(track['d_track_name'], 'Name 3')  # kept by brainz upsert
+        self.assertEqual(track['a_bpm'], 126.5)
+        self.assertEqual(track['bpm'], 127)  # kept by second track_ext upsert
+        self.assertEqual(track['key'], 'Am')
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_iter_rows(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        releases = collection.get_all_db_releases(as_dict=True)
+        streamed = collection.get_all_db_releases(as_dict=True, iterate=True)
+        self.assertNotIsInstance(streamed, list)
+        self.assertEqual(list(streamed), releases)
+        chunked = collection._select_iter(
+            "SELECT discogs_id FROM release ORDER BY discogs_id", chunk_size=2
+        )
+        self.assertEqual(
+            [row['discogs_id'] for row in chunked],
+            sorted(release['discogs_id'] for release in releases)
+        )
+        tracks = collection.get_all_tracks_for_brainz_update(offset=3)
+        self.assertEqual(
+            [tuple(row) for row in tracks],
+            [tuple(row) for row in collection.get_all_tracks_for_brainz_update(
+                offset=3, iterate=True)]
+        )
+        self.assertEqual(  # offset is the number of tracks skipped
+            len(tracks) + 3, collection.count_all_tracks_for_brainz_update()
+        )
+        print("{} - {} - END".format(self.clname, name))
+
     def test_search_release_track_offline_artist(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
@@ -329,22 +677,42 @@ class TestCollection(unittest.TestCase):
         self.assertEqual(catno, 'ZEN 70')
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_releases_total(self):
-        name = inspect.currentframe().f_code.co_name
-        print("\n{} - {} - BEGIN".format(self.clname, name))
-        collection = Collection(False, self.db_path)
-        db_return = collection.stats_releases_total()
-        # self.debug_db(db_return)
-        self.assertEqual(db_return, 4)  # should be 4 releases in coll.
-        print("{} - {} - END".format(self.clname, name))
-
-    def test_stats_tracks_total(self):
-        name = inspect.currentframe().f_code.co_name
-        print("\n{} - {} - BEGIN".format(self.clname, name))
-        collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_total()
-        # self.debug_db(db_return)
-        self.assertEqual(db_return, 5)  # should be 5 tracks in coll.
+    def test_stats_overview(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        collection = Collection(False, self.db_path)
+        sales = [  # listing id, release id, price, status
+            (901, 69092, 10.0, 'forsale'),
+            (902, 123456, 20.0, 'expired'),
+            (903, 919698, 8.0, 'sold'),
+        ]
+        for listing in sales:
+            collection.execute_sql(
+                """INSERT INTO sales (d_sales_listing_id, d_sales_release_id,
+                   d_sales_price, d_sales_status) VALUES (?, ?, ?, ?);""",
+                listing, raise_err=True)
+        self.addCleanup(
+            collection.execute_sql,
+            "DELETE FROM sales WHERE d_sales_listing_id IN (901, 902, 903);")
+        stats = collection.stats_overview()
+        self.assertEqual(stats, {
+            'releases_total': 4,
+            'releases_matched': 2,
+            'tracks_total': 5,
+            'tracks_matched': 1,
+            'tracks_key_brainz': 1,
+            'tracks_bpm_brainz': 1,
+            'tracks_key_manual': 4,
+            'tracks_bpm_manual': 5,
+            'collection_items_discobase': 4,
+            'sales_listings_discobase': 3,
+            'sales_listings_forsale': 2,
+            'sales_listings_sold': 1,
+            'sales_price_average': '15.0 €',
+            'sales_price_average_lower': '10.0 €',
+            'mixtracks_total': 49,
+            'mixtracks_unique': 7,
+        })
         print("{} - {} - END".format(self.clname, name))
 
     def test_stats_tracks_total_ext(self):
@@ -365,124 +733,182 @@ class TestCollection(unittest.TestCase):
         self.assertEqual(db_return, 0)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_releases_matched(self):
+    def test_stats_mixtracks_unique(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_releases_matched()
-        self.assertEqual(db_return, 2)  # should be 2 matched releases
+        db_return = collection.stats_mixtracks_unique()
+        # self.debug_db(db_return)
+        self.assertEqual(db_return, 7)  # 7 unique tracks
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_tracks_matched(self):
+    def test_set_collection_item_folder(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_matched()
-        self.assertEqual(db_return, 1)  # should be 1 matched tracks
+        db_return = collection.set_collection_item_folder(
+            instance_id=26575804,
+            folder_id=123,
+            sold_folder_id=456,
+            timestamp="2025-02-28 07:29:56",
+        )
+        self.assertEqual(db_return, 1)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_releases_d_collection_flag(self):
+    def test_set_collection_item_folder_misconfigured_str(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_collection_items_discobase()
-        self.assertEqual(db_return, 4)
+        db_return = collection.set_collection_item_folder(
+            instance_id=26575804,
+            folder_id=1,
+            sold_folder_id="abc",
+            timestamp="2025-02-28 07:29:56",
+        )
+        self.assertEqual(db_return, 1)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_mixtracks_total(self):
+    def test_set_collection_item_folder_misconfigured_emtpy_str(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_mixtracks_total()
-        # self.debug_db(db_return)
-        self.assertEqual(db_return, 49)
+        db_return = collection.set_collection_item_folder(
+            instance_id=26575804,
+            folder_id=1,
+            sold_folder_id="",
+            timestamp="2025-02-28 07:29:56",
+        )
+        self.assertEqual(db_return, 1)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_mixtracks_unique(self):
+    @classmethod
+    def tearDownClass(cls):
         name = inspect.currentframe().f_code.co_name
-        print("\n{} - {} - BEGIN".format(self.clname, name))
-        collection = Collection(False, self.db_path)
-        db_return = collection.stats_mixtracks_unique()
-        # self.debug_db(db_return)
-        self.assertEqual(db_return, 7)  # 7 unique tracks
-        print("{} - {} - END".format(self.clname, name))
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        remove_db_files(cls.db_path)
+        print("{} - {} - END\n".format(cls.clname, name))
 
-    def test_stats_tracks_key_brainz(self):
-        name = inspect.currentframe().f_code.co_name
-        print("\n{} - {} - BEGIN".format(self.clname, name))
-        collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_key_brainz()
-        self.assertEqual(db_return, 1)  # should be 1 track with ab_key
-        print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_tracks_key_manual(self):
+class TestCollectionSearchIndex(unittest.TestCase):
+    """Tests offline searches via the FTS5 search index."""
+    @classmethod
+    def setUpClass(cls):
         name = inspect.currentframe().f_code.co_name
-        print("\n{} - {} - BEGIN".format(self.clname, name))
+        cls.clname = cls.__name__  # Classname, used in test output
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        discodos_tests = Path(os.path.dirname(os.path.abspath(__file__)))
+        empty_db_path = discodos_tests / 'fixtures' / 'discobase_empty.db'
+        cls.db_path = discodos_tests / 'discobase_fts.db'
+        print('Database: {}'.format(copy2(empty_db_path, cls.db_path)))
+        Db_setup(cls.db_path).upgrade_schema()
+        print("{} - {} - END\n".format(cls.clname, name))
+
+    def setUp(self):
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_key_manual()
-        self.assertEqual(db_return, 4)  # should be 4 tracks with manual key
-        print("{} - {} - END".format(self.clname, name))
+        if not collection.search_index_available():
+            self.skipTest("SQLite without FTS5 support.")
 
-    def test_stats_tracks_bpm_brainz(self):
+    def test_search_release_offline(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_bpm_brainz()
-        self.assertEqual(db_return, 1)  # should be 1 track with ab_bpm
+        dbr = collection.search_release_offline('amon')
+        self.assertEqual(len(dbr), 2)
+        self.assertEqual(dbr[0]['d_artist'], 'Amon Tobin')
+        dbr = collection.search_release_offline('"foley room"')
+        self.assertEqual(len(dbr), 1)
+        self.assertEqual(dbr[0]['discogs_id'], 919698)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_stats_tracks_bpm_manual(self):
+    def test_search_release_track_offline(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.stats_tracks_bpm_manual()
-        self.assertEqual(db_return, 5)  # should be 5 tracks with manual bpm
+        dbr = collection.search_release_track_offline(
+            artist='Märtini', release='material', track='cab')
+        self.assertEqual(len(dbr), 1)
+        self.assertEqual(dbr[0]['d_track_name'], 'Material Love (Cab Drivers Remix)')
+        dbr = collection.search_release_track_offline(
+            artist='', release='', track='Hedup!')
+        self.assertEqual(len(dbr), 1)
+        self.assertEqual(dbr[0]['discogs_title'], 'Material Love')
         print("{} - {} - END".format(self.clname, name))
 
-    def test_set_collection_item_folder(self):
+    def test_key_value_search_releases(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.set_collection_item_folder(
-            instance_id=26575804,
-            folder_id=123,
-            sold_folder_id=456,
-            timestamp="2025-02-28 07:29:56",
+        dbr = collection.key_value_search_releases(
+            search_key_value={'artist': 'amon', 'title': 'fol'},
+            filter_cols={'artist': 'd_artist', 'title': 'discogs_title'},
         )
-        self.assertEqual(db_return, 1)
+        self.assertEqual(len(dbr), 1)
+        self.assertEqual(dbr[0]['discogs_id'], 919698)
         print("{} - {} - END".format(self.clname, name))
 
-    def test_set_collection_item_folder_misconfigured_str(self):
+    def test_search_index_triggers(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.set_collection_item_folder(
-            instance_id=26575804,
-            folder_id=1,
-            sold_folder_id="abc",
-            timestamp="2025-02-28 07:29:56",
+        collection.create_release(1, 'Fresh Title', 'Some Artist', 'CAT 1')
+        self.assertEqual(len(collection.search_release_offline('fresh')), 1)
+        collection.execute_sql(
+            'UPDATE release SET discogs_title = "Renamed" WHERE discogs_id == 1'
         )
-        self.assertEqual(db_return, 1)
+        self.assertIsNone(collection.search_release_offline('fresh'))
+        self.assertEqual(len(collection.search_release_offline('renamed')), 1)
+        collection.delete_release(1)
+        self.assertIsNone(collection.search_release_offline('renamed'))
         print("{} - {} - END".format(self.clname, name))
 
-    def test_set_collection_item_folder_misconfigured_emtpy_str(self):
+    def test_search_index_survives_renumbering(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
         collection = Collection(False, self.db_path)
-        db_return = collection.set_collection_item_folder(
-            instance_id=26575804,
-            folder_id=1,
-            sold_folder_id="",
-            timestamp="2025-02-28 07:29:56",
-        )
-        self.assertEqual(db_return, 1)
+        collection.create_release(2, 'Vacuum Title', 'Vacuum Artist', 'VA 1')
+        for track_no, track_name in [('A1', 'Gone'), ('A2', 'Stays')]:
+            collection.upsert_track(2, track_no, track_name, 'Vacuum Artist')
+        collection.execute_sql(
+            "DELETE FROM track WHERE d_release_id == 2 AND d_track_no == 'A1'")
+        # Tracks have no INTEGER PRIMARY KEY, VACUUM may renumber them
+        collection.execute_sql("UPDATE track SET rowid = rowid + 1000;")
+        collection.execute_sql("VACUUM;")
+        dbr = collection.search_release_track_offline(
+            artist='', release='', track='stays')
+        self.assertEqual([row['d_track_no'] for row in dbr], ['A2'])
+        self.assertFalse(collection.search_release_track_offline(
+            artist='', release='', track='gone'))
+        collection.execute_sql("DELETE FROM track WHERE d_release_id == 2")
+        collection.delete_release(2)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_upgrade_search_index(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        setup = Db_setup(self.db_path)
+        # Outdated layout, track_fts without track_search_key
+        setup.execute_sql("DROP TABLE track_search_key;")
+        # Missing, eg. SQLite lacked FTS5 when the schema was upgraded
+        missing = ["DROP TABLE track_search_key;", "DROP TABLE release_fts;"] + [
+            task for task in setup.sql_search_index_outdated.values()]
+        for tasks in ([], missing):
+            for task in tasks:
+                setup.execute_sql(task)
+            self.assertFalse(
+                Collection(False, self.db_path).search_index_available())
+            setup.upgrade_schema()  # Schema is up to date already
+            collection = Collection(False, self.db_path)
+            self.assertTrue(collection.search_index_available())
+            dbr = collection.search_release_track_offline(
+                artist='', release='', track='Hedup!')
+            self.assertEqual(len(dbr), 1)
         print("{} - {} - END".format(self.clname, name))
 
     @classmethod
     def tearDownClass(cls):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(cls.clname, name))
-        os.remove(cls.db_path)
+        remove_db_files(cls.db_path)
         print("{} - {} - END\n".format(cls.clname, name))
 
 
@@ -47,6 +47,17 @@ class TestConfig(unittest.TestCase):
                 print('Skipping discogs_token check, not a gh-actions run.')
         print("{} - {} - END\n".format(self.clname, name))
 
+    def test_db_profile(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        conf = Config.__new__(Config)  # Skip reading config.yaml
+        conf.sqlite_profiles = {'bulk_import': {'cache_size': -128000}}
+        profile = conf.db_profile('bulk_import')
+        self.assertEqual(profile['cache_size'], -128000)
+        self.assertEqual(profile['synchronous'], 'NORMAL')
+        self.assertEqual(conf.db_profile('unknown')['synchronous'], 'FULL')
+        print("{} - {} - END\n".format(self.clname, name))
+
     @classmethod
     def tearDownClass(self):
         name = inspect.currentframe().f_code.co_name
@@ -0,0 +1,110 @@
+import inspect
+import os
+import unittest
+from pathlib import Path
+from shutil import copy2
+
+from discodos.config import Db_setup
+from discodos.model import Collection
+from tests.helpers import remove_db_files
+
+
+class TestDbSetup(unittest.TestCase):
+    """Tests DiscoBASE schema upgrades."""
+    @classmethod
+    def setUpClass(cls):
+        name = inspect.currentframe().f_code.co_name
+        cls.clname = cls.__name__  # Classname, used in test output
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        discodos_tests = Path(os.path.dirname(os.path.abspath(__file__)))
+        empty_db_path = discodos_tests / 'fixtures' / 'discobase_empty.db'
+        cls.db_path = discodos_tests / 'discobase_setup.db'
+        print('Database: {}'.format(copy2(empty_db_path, cls.db_path)))
+        print("{} - {} - END\n".format(cls.clname, name))
+
+    def test_upgrade_schema(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        setup = Db_setup(self.db_path)
+        setup.upgrade_schema()
+        self.assertEqual(
+            setup.get_current_schema_version(),
+            setup.get_latest_schema_version()
+        )
+        indexes = [
+            row['name'] for row in setup._select(
+                "SELECT name FROM sqlite_master WHERE type == 'index'"
+            )
+        ]
+        self.assertIn('idx_mix_track_mix_pos', indexes)
+        self.assertIn('idx_collection_release', indexes)
+        self.assertIn('idx_sales_release', indexes)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_analyze_and_query_plans(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        setup = Db_setup(self.db_path)
+        setup.upgrade_schema()
+        self.assertTrue(setup.analyze())
+        plans = setup.get_query_plans()
+        self.assertEqual(len(plans), len(setup.sql_explain_queries))
+        mix_plan = ' '.join(plans['Mix tracklist (Mix.get_full_mix)'])
+        self.assertIn('idx_mix_track_mix_pos', mix_plan)
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_stats_cache(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        setup = Db_setup(self.db_path)
+        setup.upgrade_schema()
+        self.assertTrue(setup.create_stats_cache())
+        collection = Collection(False, self.db_path)
+
+        def live_counters():
+            return collection._select(
+                collection._stats_aggregate_sql(), fetchone=True, as_dict=True
+            )
+
+        def cached_counters():
+            cached = collection._select(
+                "SELECT * FROM stats_cache", fetchone=True, as_dict=True
+            )
+            cached.pop('stats_id')
+            return cached
+
+        before = collection.stats_overview()
+        collection.create_release(42, 'Title', 'Artist', 'CAT 1')
+        collection.create_release(42, 'Title 2', 'Artist', 'CAT 1')  # update
+        collection.execute_sql(  # ON CONFLICT REPLACE
+            "INSERT INTO release (discogs_id, discogs_title) VALUES (43, 'T')"
+        )
+        collection.execute_sql(
+            "INSERT INTO release (discogs_id, discogs_title) VALUES (43, 'T')"
+        )
+        collection.upsert_track(42, 'a1', 'Track', 'Artist')
+        collection.upsert_track(42, 'a2', 'Track 2', 'Artist')
+        collection.upsert_track_brainz(42, 'A1', 'rec-id', 'method', 'C',
+                                       'C', 120.0)
+        collection.delete_release(43)
+        collection.execute_sql(
+            "INSERT INTO sales (d_sales_listing_id, d_sales_release_id, "
+            "d_sales_status, d_sales_price) VALUES (1, 42, 'forsale', 10.5)"
+        )
+        self.assertEqual(cached_counters(), live_counters())
+        stats = collection.stats_overview()
+        self.assertEqual(stats['releases_total'], before['releases_total'] + 1)
+        self.assertEqual(
+            stats['tracks_key_brainz'], before['tracks_key_brainz'] + 1
+        )
+        self.assertEqual(stats['sales_price_average_lower'], "10.5 €")
+        self.assertTrue(setup.drop_stats_cache())
+        self.assertEqual(collection.stats_overview(), stats)
+        print("{} - {} - END".format(self.clname, name))
+
+    @classmethod
+    def tearDownClass(cls):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        remove_db_files(cls.db_path)
+        print("{} - {} - END\n".format(cls.clname, name))
@@ -0,0 +1,149 @@
+import inspect
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from discodos.model import DiscogsCache
+from discodos.model.discogs_cache import CachingFetcher
+from tests.helpers import remove_db_files
+
+
+class FakeResponse():
+    def __init__(self, content, status_code, headers):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeFetcher():
+    """Mimics a discogs_client fetcher, answers from a dict of URLs."""
+    backoff_enabled = True
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None, params=None):
+        self.requests.append((method, url, dict(headers or {})))
+        etag = self.responses[url][1]
+        if headers and headers.get("If-None-Match") == etag:
+            return FakeResponse(b"", 304, {"ETag": etag})
+        return FakeResponse(self.responses[url][0], 200, {"ETag": etag})
+
+    def fetch(self, client, method, url, data=None, headers=None,
+              json_format=True):
+        resp = self.request(method, url, data=data, headers=headers)
+        self.rate_limit_remaining = "59"
+        return resp.content, resp.status_code
+
+
+class TestDiscogsCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        name = inspect.currentframe().f_code.co_name
+        cls.clname = cls.__name__  # Classname, used in test output
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        discodos_tests = Path(os.path.dirname(os.path.abspath(__file__)))
+        cls.cache_path = discodos_tests / 'discogs_cache.db'
+        print("{} - {} - END\n".format(cls.clname, name))
+
+    def setUp(self):
+        self.release_url = "https://api.discogs.com/releases/123456"
+        self.fetcher = FakeFetcher({
+            self.release_url: (b'{"id": 123456}', '"v1"'),
+            "https://api.discogs.com/users/me/collection/folders/0/releases": (
+                b'{"releases": []}', None),
+        })
+        self.cache = DiscogsCache(self.cache_path)
+        self.caching = CachingFetcher(self.fetcher, self.cache)
+
+    def test_cache_key(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.assertEqual(
+            DiscogsCache.cache_key("https://api.discogs.com/releases/1?a=b"),
+            ("releases", "1", "a=b")
+        )
+        self.assertIsNone(
+            DiscogsCache.cache_key("https://api.discogs.com/releases/1/rating")
+        )
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_fetch_cached(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        first = self.caching.fetch(None, "GET", self.release_url)
+        second = self.caching.fetch(None, "GET", self.release_url)
+        self.assertEqual(first, (b'{"id": 123456}', 200))
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.fetcher.requests), 1)
+        self.assertEqual(self.caching.rate_limit_remaining, "59")
+        # Collection listings are never cached
+        url = "https://api.discogs.com/users/me/collection/folders/0/releases"
+        self.caching.fetch(None, "GET", url)
+        self.caching.fetch(None, "GET", url)
+        self.assertEqual(len(self.fetcher.requests), 3)
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_fetch_revalidated(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.caching.fetch(None, "GET", self.release_url)
+        self.cache.refresh = True  # Entries are considered stale
+        content, status = self.caching.fetch(None, "GET", self.release_url)
+        self.assertEqual((content, status), (b'{"id": 123456}', 200))
+        self.assertEqual(
+            self.fetcher.requests[-1][2].get("If-None-Match"), '"v1"'
+        )
+        self.assertEqual(self.cache.stats["revalidated"], 1)
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_fetch_threads(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(
+                lambda _: self.caching.fetch(None, "GET", self.release_url),
+                range(200)
+            ))
+        self.assertEqual(
+            self.cache.stats["hits"] + self.cache.stats["misses"], 200)
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_purge_expired(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.cache.store(("releases", "1", ""), b"{}")
+        self.cache.store(("releases", "2", ""), b"{}", etag='"v2"')
+        self.cache.store(("artists", "3", ""), b"{}")
+        self.cache.db_conn.execute(
+            "UPDATE http_cache SET fetched_at = fetched_at - ?",
+            (10 * 86400,))
+        # Only artists expired, releases live for 30 days
+        self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertIsNotNone(self.cache.get(("releases", "1", "")))
+        self.assertIsNone(self.cache.get(("artists", "3", "")))
+        self.cache.db_conn.execute(
+            "UPDATE http_cache SET fetched_at = fetched_at - ?",
+            (30 * 86400,))
+        # Entries with an ETag are kept, they can still be revalidated
+        self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertIsNone(self.cache.get(("releases", "1", "")))
+        self.assertIsNotNone(self.cache.get(("releases", "2", "")))
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_setattr_forwarded(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.caching.backoff_enabled = False
+        self.assertFalse(self.fetcher.backoff_enabled)
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def tearDown(self):
+        self.cache.db_conn.close()
+        remove_db_files(self.cache_path)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
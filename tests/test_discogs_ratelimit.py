@@ -0,0 +1,83 @@
+import inspect
+import unittest
+from unittest.mock import patch
+
+from discodos.model.discogs_ratelimit import RateLimiter
+
+
+class FakeResponse():
+    def __init__(self, status_code, remaining):
+        self.status_code = status_code
+        self.headers = {
+            "X-Discogs-Ratelimit": "60",
+            "X-Discogs-Ratelimit-Remaining": str(remaining),
+        }
+
+
+class FakeFetcher():
+    """Mimics a discogs_client fetcher, answers with the given status codes."""
+    backoff_enabled = True
+
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.calls = 0
+
+    def request(self, method, url, data=None, headers=None, params=None):
+        self.calls += 1
+        return FakeResponse(self.status_codes.pop(0), 60 - self.calls)
+
+
+class TestRateLimiter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        name = inspect.currentframe().f_code.co_name
+        cls.clname = cls.__name__  # Classname, used in test output
+        print("\n{} - {} - BEGIN".format(cls.clname, name))
+        print("{} - {} - END\n".format(cls.clname, name))
+
+    @patch('discodos.model.discogs_ratelimit.sleep')
+    def test_acquire_paced(self, sleep):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        limiter = RateLimiter(rate_limit=60)
+        self.assertEqual(limiter.acquire(), 0)  # Bucket starts full
+        wait = limiter.acquire()
+        # Second token is due after one second, plus jitter
+        self.assertGreater(wait, 0.9)
+        self.assertLessEqual(wait, 1 + RateLimiter.JITTER)
+        sleep.assert_called_once()
+        self.assertEqual(limiter.stats["requests"], 2)
+        self.assertEqual(limiter.stats["waits"], 1)
+        print("{} - {} - END\n".format(self.clname, name))
+
+    def test_update_from_headers(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        limiter = RateLimiter(rate_limit=60)
+        limiter.update({
+            "X-Discogs-Ratelimit": "25",
+            "X-Discogs-Ratelimit-Remaining": "0",
+        })
+        self.assertEqual(limiter.rate_limit, 25)
+        self.assertLessEqual(limiter.tokens, -1)  # Quota used up elsewhere
+        print("{} - {} - END\n".format(self.clname, name))
+
+    @patch('discodos.model.discogs_ratelimit.sleep')
+    def test_install_backoff(self, sleep):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        fetcher = FakeFetcher([429, 429, 200])
+        limiter = RateLimiter()
+        limiter.install(fetcher)
+        self.assertFalse(fetcher.backoff_enabled)
+        resp = fetcher.request("GET", "https://api.discogs.com/releases/1")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(fetcher.calls, 3)
+        self.assertEqual(limiter.stats["throttled"], 2)
+        self.assertGreaterEqual(limiter.stats["wait_seconds"],
+                                RateLimiter.BACKOFF_BASE * 3)
+        print("{} - {} - END\n".format(self.clname, name))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
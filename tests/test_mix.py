@@ -6,6 +6,7 @@ from shutil import copy2
 
 # from discodos.config import Config
 from discodos.model import Mix  # , log
+from tests.helpers import remove_db_files
 
 
 class TestMix(unittest.TestCase):
@@ -180,6 +181,27 @@ class TestMix(unittest.TestCase):
             'Material Love (Cab Drivers Remix)')  # pos 5 should be this track now
         print("{} - {} - END".format(self.clname, name))
 
+    def test_reorder_tracks_gaps_and_duplicates(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.mix = Mix(False, "reorder test mix", self.db_path)
+        self.mix.create("2020-01-01", "test venue")
+        self.addCleanup(self.mix.delete)
+        for track_pos in (1, 4, 4, 9):
+            self.mix.add_track(8620643, "A", track_pos=track_pos)
+        ids_before = [
+            track['mix_track_id']
+            for track in self.mix.get_tracks_from_position(1)
+        ]
+        self.assertEqual(self.mix.reorder_tracks(3), 1)
+        tracks = self.mix.get_tracks_from_position(1)
+        self.assertEqual(
+            [track['track_pos'] for track in tracks], [1, 3, 4, 5])
+        # Duplicates keep their order, pos 1 before the start is untouched
+        self.assertEqual(
+            [track['mix_track_id'] for track in tracks], sorted(ids_before))
+        print("{} - {} - END".format(self.clname, name))
+
     def test_reorder_tracks_squeeze_in(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
@@ -202,6 +224,32 @@ class TestMix(unittest.TestCase):
             'Material Love (Cab Drivers Remix)')  # should be cab driver remix
         print("{} - {} - END".format(self.clname, name))
 
+    def test_reorder_tracks_squeeze_in_all(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.mix = Mix(False, 131, self.db_path)  # mix 131 contains 5 tracks
+        with self.mix.batch():  # squeeze in, add and reorder in one transaction
+            self.assertEqual(self.mix.reorder_tracks_squeeze_in(2), 1)
+            self.mix.add_track(8620643, "A", track_pos=2)
+            self.mix.delete_track(4)
+            self.assertEqual(self.mix.reorder_tracks(1), 1)
+        positions = [
+            track['track_pos'] for track in self.mix.get_tracks_from_position(1)
+        ]
+        self.assertEqual(positions, [1, 2, 3, 4, 5])
+        self.assertEqual(self.mix.get_one_mix_track(2)['d_track_name'], 'The Crane')
+        print("{} - {} - END".format(self.clname, name))
+
+    def test_shift_track_missing_neighbour(self):
+        name = inspect.currentframe().f_code.co_name
+        print("\n{} - {} - BEGIN".format(self.clname, name))
+        self.mix = Mix(False, 134, self.db_path)
+        self.assertFalse(self.mix.shift_track(1, 'up'))
+        self.assertFalse(self.mix.shift_track(5, 'down'))
+        self.assertEqual(self.mix.get_one_mix_track(0), None)  # nothing moved
+        self.assertEqual(self.mix.get_one_mix_track(6), None)
+        print("{} - {} - END".format(self.clname, name))
+
     def test_get_tracks_from_position(self):
         name = inspect.currentframe().f_code.co_name
         print("\n{} - {} - BEGIN".format(self.clname, name))
@@ -354,7 +402,7 @@ class TestMix(unittest.TestCase):
 
     @classmethod
     def tearDownClass(self):
-        os.remove(self.db_path)
+        remove_db_files(self.db_path)
         print("\nTestMix.teardownClass: done")
 
 